@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
 
+from pipeline import cache
+
 
 class BaseAuthenticatedTests(TestCase):
     def setUp(self):
@@ -8,3 +10,6 @@ class BaseAuthenticatedTests(TestCase):
         self.user.set_password("password")
         self.user.save()
         self.client.login(username="test", password="password")
+        # User ids are re-used across tests, but cached video lists are not
+        # rolled back
+        cache.invalidate_owner(self.user.id)
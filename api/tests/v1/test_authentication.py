@@ -0,0 +1,90 @@
+from base64 import b64encode
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache as shared_cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework import authentication
+from rest_framework.authtoken.models import Token
+
+from api.v1.authentication import token_cache
+from pipeline.tests.test_cache import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        shared_cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create(username="test", is_active=True)
+        self.user.set_password("password")
+        self.user.save()
+        self.url = reverse("api:v1:playlist-list")
+
+    def get_with_password(self, password):
+        credentials = b64encode("test:{}".format(password).encode()).decode()
+        return self.client.get(self.url, HTTP_AUTHORIZATION="Basic " + credentials)
+
+    def get_with_token(self, key):
+        return self.client.get(self.url, HTTP_AUTHORIZATION="Token " + key)
+
+    def test_basic_authentication_is_cached(self):
+        with patch(
+            "rest_framework.authentication.authenticate",
+            wraps=authentication.authenticate,
+        ) as authenticate:
+            self.assertEqual(200, self.get_with_password("password").status_code)
+            self.assertEqual(200, self.get_with_password("password").status_code)
+        authenticate.assert_called_once()
+
+    def test_basic_authentication_with_invalid_password(self):
+        self.assertEqual(200, self.get_with_password("password").status_code)
+        self.assertEqual(401, self.get_with_password("invalid").status_code)
+
+    def test_basic_authentication_after_password_change(self):
+        self.get_with_password("password")
+        self.user.set_password("newpassword")
+        self.user.save()
+
+        self.assertEqual(401, self.get_with_password("password").status_code)
+        self.assertEqual(200, self.get_with_password("newpassword").status_code)
+
+    def test_basic_authentication_of_deactivated_user(self):
+        self.get_with_password("password")
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(401, self.get_with_password("password").status_code)
+
+    def test_token_authentication_is_cached(self):
+        with patch.object(
+            authentication.TokenAuthentication,
+            "authenticate_credentials",
+            autospec=True,
+            side_effect=authentication.TokenAuthentication.authenticate_credentials,
+        ) as authenticate_credentials:
+            self.assertEqual(
+                200, self.get_with_token(self.user.auth_token.key).status_code
+            )
+            self.assertEqual(
+                200, self.get_with_token(self.user.auth_token.key).status_code
+            )
+        authenticate_credentials.assert_called_once()
+
+    def test_token_rotation(self):
+        key = self.user.auth_token.key
+        self.get_with_token(key)
+        self.user.auth_token.delete()
+        new_token = Token.objects.create(user=self.user)
+
+        self.assertEqual(401, self.get_with_token(key).status_code)
+        self.assertEqual(200, self.get_with_token(new_token.key).status_code)
+
+    @override_settings(AUTHENTICATION_CACHE_TIMEOUT=0)
+    def test_token_cache_expiry(self):
+        key = self.user.auth_token.key
+        self.get_with_token(key)
+        Token.objects.filter(key=key).delete()
+
+        self.assertEqual(401, self.get_with_token(key).status_code)
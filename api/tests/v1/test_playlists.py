@@ -24,6 +24,22 @@ class PlaylistTests(BaseAuthenticatedTests):
         self.assertEqual("Funkadelic playlist", result["name"])
         self.assertEqual(playlist.public_id, result["id"])
 
+    def test_get_playlist_not_modified(self):
+        playlist = factories.PlaylistFactory(name="Funkadelic", owner=self.user)
+        url = reverse("api:v1:playlist-detail", kwargs={"id": playlist.public_id})
+        response = self.client.get(url)
+        response_not_modified = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        playlist.name = "Rockabilly"
+        playlist.save()
+        response_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(304, response_not_modified.status_code)
+        self.assertEqual(200, response_modified.status_code)
+        self.assertEqual("Rockabilly", response_modified.json()["name"])
+        self.assertIn("Last-Modified", response_modified)
+
     def test_search_playlist_by_name(self):
         factories.PlaylistFactory(
             name="Funkadelic", owner=self.user, public_id="funkid"
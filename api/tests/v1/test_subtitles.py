@@ -8,7 +8,7 @@ from django.test.utils import override_settings
 
 from pipeline import models
 from pipeline.tests import factories
-from pipeline.tests.utils import override_plugin_backend
+from pipeline.tests.utils import override_plugin_backend, run_on_commit_callbacks
 
 from .base import BaseAuthenticatedTests
 
@@ -153,15 +153,31 @@ Also I have utf8 characters: é û ë ï 你好."""
         self.assertEqual("subid", subtitle["id"])
         self.assertEqual("http://sub.vtt", subtitle["url"])
 
+    def test_get_subtitle_not_modified(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        factories.SubtitleFactory(video=video, public_id="subid", language="fr")
+        url = reverse("api:v1:subtitle-detail", kwargs={"id": "subid"})
+
+        with override_plugin_backend(subtitle_url=lambda *args: "http://sub.vtt"):
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            factories.SubtitleFactory(video=video, public_id="subid2", language="en")
+            response_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+        self.assertEqual(200, response_modified.status_code)
+
     def test_delete_subtitle(self):
         video = factories.VideoFactory(public_id="videoid", owner=self.user)
         factories.SubtitleFactory(video=video, public_id="subid", language="fr")
 
         mock_backend = Mock(return_value=Mock(delete_subtitle=Mock()))
         with override_settings(PLUGIN_BACKEND=mock_backend):
-            response = self.client.delete(
-                reverse("api:v1:subtitle-detail", kwargs={"id": "subid"})
-            )
+            with run_on_commit_callbacks():
+                response = self.client.delete(
+                    reverse("api:v1:subtitle-detail", kwargs={"id": "subid"})
+                )
 
         self.assertEqual(204, response.status_code)
         self.assertEqual(0, models.Subtitle.objects.count())
@@ -0,0 +1,56 @@
+from unittest.mock import Mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from pipeline import models
+from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend
+
+
+class TranscodingNotificationsTests(TestCase):
+    @override_settings(TRANSCODING_MONITORING="notifications")
+    def test_notification(self):
+        video = factories.VideoFactory(public_id="videoid")
+        models.TranscodingJob.objects.create(video=video, job_id="jobid", content="{}")
+        check_progress = Mock(return_value=(42, False))
+
+        with override_plugin_backend(
+            parse_notification=lambda request: ["jobid"], check_progress=check_progress
+        ):
+            response = self.client.post(
+                reverse("api:v1:transcodingnotification-list"),
+                data="{}",
+                content_type="text/plain",
+            )
+
+        self.assertEqual(204, response.status_code)
+        check_progress.assert_called_once_with({})
+        self.assertEqual(42, models.ProcessingState.objects.get().progress)
+
+    @override_settings(TRANSCODING_MONITORING="notifications")
+    def test_notification_for_unknown_job(self):
+        check_progress = Mock()
+
+        with override_plugin_backend(
+            parse_notification=lambda request: ["jobid"], check_progress=check_progress
+        ):
+            response = self.client.post(
+                reverse("api:v1:transcodingnotification-list"),
+                data="{}",
+                content_type="text/plain",
+            )
+
+        self.assertEqual(204, response.status_code)
+        check_progress.assert_not_called()
+
+    @override_settings(TRANSCODING_MONITORING="polling")
+    def test_notifications_are_disabled_with_polling(self):
+        response = self.client.post(
+            reverse("api:v1:transcodingnotification-list"),
+            data="{}",
+            content_type="text/plain",
+        )
+
+        self.assertEqual(404, response.status_code)
@@ -1,12 +1,16 @@
-from io import StringIO
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
 from time import time
 from unittest.mock import Mock
 
+from django.test.utils import override_settings
 from django.urls import reverse
 
 from pipeline import models
 from pipeline.tests import factories
-from pipeline.tests.utils import override_plugin_backend
+from pipeline.tests.utils import LocalUploadBackend, override_plugin_backend
 
 from .base import BaseAuthenticatedTests
 
@@ -85,6 +89,320 @@ class VideoUploadUrlTests(BaseAuthenticatedTests):
         self.assertNotEqual(self.user, playlist.owner)
         self.assertEqual(400, response.status_code)
 
+    @override_settings(DIRECT_UPLOAD_PART_SIZE=10)
+    def test_create_direct_videouploadurl(self):
+        create_upload = Mock(return_value={"id": "uploadid"})
+        get_upload_part_url = Mock(
+            side_effect=lambda upload, part_number, expires_in: "http://part{}".format(
+                part_number
+            )
+        )
+        with override_plugin_backend(
+            create_upload=create_upload, get_upload_part_url=get_upload_part_url
+        ):
+            response = self.client.post(
+                reverse("api:v1:videouploadurl-list"),
+                {"direct": True, "file_name": "video.mp4", "file_size": 21},
+            )
+
+        self.assertEqual(201, response.status_code)
+        upload_url = response.json()
+        create_upload.assert_called_once_with(upload_url["id"], "video.mp4")
+        self.assertEqual(10, upload_url["direct_upload"]["part_size"])
+        self.assertEqual(3, upload_url["direct_upload"]["part_count"])
+        self.assertEqual(
+            [
+                {"part_number": 1, "url": "http://part1"},
+                {"part_number": 2, "url": "http://part2"},
+                {"part_number": 3, "url": "http://part3"},
+            ],
+            upload_url["direct_upload"]["parts"],
+        )
+        video_upload_url = models.VideoUploadUrl.objects.get()
+        self.assertEqual({"id": "uploadid"}, video_upload_url.storage_upload)
+        self.assertEqual("video.mp4", video_upload_url.file_name)
+
+    @override_settings(DIRECT_UPLOAD_PART_SIZE=10)
+    def test_get_direct_videouploadurl_does_not_sign_parts(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid",
+            owner=self.user,
+            expires_at=time() + 3600,
+            file_name="video.mp4",
+            file_size=21,
+            upload='{"id": "uploadid"}',
+        )
+        get_upload_part_url = Mock()
+        with override_plugin_backend(get_upload_part_url=get_upload_part_url):
+            list_response = self.client.get(reverse("api:v1:videouploadurl-list"))
+            detail_response = self.client.get(
+                reverse("api:v1:videouploadurl-detail", kwargs={"id": "videoid"})
+            )
+
+        self.assertEqual(200, list_response.status_code)
+        self.assertEqual(200, detail_response.status_code)
+        self.assertEqual(
+            {"part_size": 10, "part_count": 3}, detail_response.json()["direct_upload"]
+        )
+        self.assertEqual(
+            {"part_size": 10, "part_count": 3}, list_response.json()[0]["direct_upload"]
+        )
+        get_upload_part_url.assert_not_called()
+
+    @override_settings(DIRECT_UPLOAD_PART_SIZE=10)
+    def test_get_direct_videouploadurl_parts(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid",
+            owner=self.user,
+            expires_at=time() + 3600,
+            file_name="video.mp4",
+            file_size=21,
+            upload='{"id": "uploadid"}',
+        )
+        url = reverse("api:v1:videouploadurl-parts", kwargs={"id": "videoid"})
+        get_upload_part_url = Mock(
+            side_effect=lambda upload, part_number, expires_in: "http://part{}".format(
+                part_number
+            )
+        )
+        with override_plugin_backend(get_upload_part_url=get_upload_part_url):
+            response = self.client.get(url, {"parts": "2-3"})
+            single_part_response = self.client.get(url, {"parts": "1"})
+            out_of_range_response = self.client.get(url, {"parts": "2-4"})
+            invalid_response = self.client.get(url, {"parts": "a-b"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {
+                "part_size": 10,
+                "part_count": 3,
+                "parts": [
+                    {"part_number": 2, "url": "http://part2"},
+                    {"part_number": 3, "url": "http://part3"},
+                ],
+            },
+            response.json(),
+        )
+        self.assertEqual(
+            [{"part_number": 1, "url": "http://part1"}],
+            single_part_response.json()["parts"],
+        )
+        self.assertEqual(400, out_of_range_response.status_code)
+        self.assertEqual(400, invalid_response.status_code)
+        self.assertEqual(3, get_upload_part_url.call_count)
+
+    def test_get_parts_without_direct_upload(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        response = self.client.get(
+            reverse("api:v1:videouploadurl-parts", kwargs={"id": "videoid"}),
+            {"parts": "1"},
+        )
+
+        self.assertEqual(404, response.status_code)
+
+    def test_create_direct_videouploadurl_missing_file_size(self):
+        response = self.client.post(
+            reverse("api:v1:videouploadurl-list"),
+            {"direct": True, "file_name": "video.mp4"},
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("file_size", response.json())
+        self.assertEqual(0, models.VideoUploadUrl.objects.count())
+
+    @override_plugin_backend()
+    def test_create_direct_videouploadurl_unsupported(self):
+        response = self.client.post(
+            reverse("api:v1:videouploadurl-list"),
+            {"direct": True, "file_name": "video.mp4", "file_size": 21},
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("direct", response.json())
+        self.assertEqual(0, models.VideoUploadUrl.objects.count())
+
+    def test_create_direct_videouploadurl_without_part_urls(self):
+        # Uploads are supported, but only from the server (e.g: local backend)
+        create_upload = Mock(return_value={"id": "uploadid"})
+        abort_upload = Mock()
+        with override_plugin_backend(
+            create_upload=create_upload, abort_upload=abort_upload
+        ):
+            response = self.client.post(
+                reverse("api:v1:videouploadurl-list"),
+                {"direct": True, "file_name": "video.mp4", "file_size": 21},
+            )
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn("direct", response.json())
+        self.assertEqual(0, models.VideoUploadUrl.objects.count())
+        abort_upload.assert_called_once_with({"id": "uploadid"})
+
+    def test_complete_direct_upload(self):
+        self.client.logout()
+        playlist = factories.PlaylistFactory(owner=self.user)
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid",
+            owner=self.user,
+            playlist=playlist,
+            expires_at=time() + 3600,
+            file_name="video.mp4",
+            file_size=21,
+            upload='{"id": "uploadid"}',
+        )
+        complete_upload = Mock()
+        start_transcoding = Mock(return_value=[])
+        with override_plugin_backend(
+            complete_upload=complete_upload,
+            start_transcoding=start_transcoding,
+            create_thumbnail=Mock(),
+            iter_formats=Mock(return_value=[]),
+        ):
+            response = self.client.post(
+                reverse("api:v1:video-complete", kwargs={"video_id": "videoid"})
+            )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("videoid", response.json()["id"])
+        complete_upload.assert_called_once_with({"id": "uploadid"})
+        start_transcoding.assert_called_once_with("videoid", "")
+        video = models.Video.objects.get()
+        self.assertEqual("video.mp4", video.title)
+        self.assertEqual([playlist], list(video.playlists.all()))
+        self.assertTrue(models.VideoUploadUrl.objects.get().was_used)
+
+    def test_complete_direct_upload_failure(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid",
+            owner=self.user,
+            expires_at=time() + 3600,
+            file_name="video.mp4",
+            file_size=21,
+            upload='{"id": "uploadid"}',
+        )
+        with override_plugin_backend(complete_upload=Mock(side_effect=ValueError)):
+            self.assertRaises(
+                ValueError,
+                self.client.post,
+                reverse("api:v1:video-complete", kwargs={"video_id": "videoid"}),
+            )
+
+        self.assertEqual(0, models.Video.objects.count())
+        self.assertFalse(models.VideoUploadUrl.objects.get().was_used)
+
+    def test_complete_upload_without_direct_upload(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        response = self.client.post(
+            reverse("api:v1:video-complete", kwargs={"video_id": "videoid"})
+        )
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(0, models.Video.objects.count())
+
+    @override_settings(RESUMABLE_UPLOAD_MIN_CHUNK_SIZE=10)
+    def test_resumable_upload(self):
+        self.client.logout()
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        url = reverse("api:v1:video-resumable", kwargs={"video_id": "videoid"})
+        chunks = []
+
+        def upload_part(upload, part_number, file_object, size):
+            chunks.append((part_number, file_object.read(size)))
+
+        create_upload = Mock(return_value={"id": "uploadid"})
+        complete_upload = Mock()
+        start_transcoding = Mock(return_value=[])
+        with override_plugin_backend(
+            create_upload=create_upload,
+            upload_part=upload_part,
+            complete_upload=complete_upload,
+            start_transcoding=start_transcoding,
+            create_thumbnail=Mock(),
+            iter_formats=Mock(return_value=[]),
+        ):
+            response1 = self.client.patch(
+                url,
+                data=b"0123456789",
+                content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET="0",
+                HTTP_UPLOAD_LENGTH="15",
+                HTTP_UPLOAD_METADATA="filename dmlkZW8ubXA0",  # "video.mp4"
+            )
+            response_head = self.client.get(url)
+            response_conflict = self.client.patch(
+                url,
+                data=b"56789",
+                content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET="5",
+            )
+            self.assertEqual(0, models.Video.objects.count())
+            response2 = self.client.patch(
+                url,
+                data=b"abcde",
+                content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET="10",
+            )
+
+        self.assertEqual(204, response1.status_code)
+        self.assertEqual("10", response1["Upload-Offset"])
+        create_upload.assert_called_once_with("videoid", "video.mp4")
+        self.assertEqual(204, response_head.status_code)
+        self.assertEqual("10", response_head["Upload-Offset"])
+        self.assertEqual("15", response_head["Upload-Length"])
+        self.assertEqual(409, response_conflict.status_code)
+        self.assertEqual(204, response2.status_code)
+        self.assertEqual("15", response2["Upload-Offset"])
+        self.assertEqual([(1, b"0123456789"), (2, b"abcde")], chunks)
+        complete_upload.assert_called_once_with({"id": "uploadid"})
+        start_transcoding.assert_called_once_with("videoid", "")
+        self.assertEqual("video.mp4", models.Video.objects.get().title)
+        self.assertTrue(models.VideoUploadUrl.objects.get().was_used)
+
+    @override_settings(RESUMABLE_UPLOAD_MIN_CHUNK_SIZE=10)
+    def test_resumable_upload_chunk_too_small(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid",
+            owner=self.user,
+            expires_at=time() + 3600,
+            file_name="video.mp4",
+            file_size=15,
+            upload='{"id": "uploadid"}',
+        )
+        upload_part = Mock()
+        with override_plugin_backend(upload_part=upload_part):
+            response = self.client.patch(
+                reverse("api:v1:video-resumable", kwargs={"video_id": "videoid"}),
+                data=b"01234",
+                content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET="0",
+            )
+
+        self.assertEqual(400, response.status_code)
+        upload_part.assert_not_called()
+        self.assertEqual(0, models.VideoUploadUrl.objects.get().upload_offset)
+
+    def test_resumable_upload_missing_headers(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        create_upload = Mock()
+        with override_plugin_backend(create_upload=create_upload):
+            response = self.client.patch(
+                reverse("api:v1:video-resumable", kwargs={"video_id": "videoid"}),
+                data=b"01234",
+                content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET="0",
+            )
+
+        self.assertEqual(400, response.status_code)
+        create_upload.assert_not_called()
+
     def test_send_file_to_upload_url(self):
         self.client.logout()  # upload should work even for non logged-in clients
         video_upload_url = factories.VideoUploadUrlFactory(
@@ -119,6 +437,65 @@ class VideoUploadUrlTests(BaseAuthenticatedTests):
         start_transcoding.assert_called_once_with("videoid")
         self.assertEqual("videoid", response.json()["id"])
 
+    @override_settings(STREAMING_UPLOAD_PART_SIZE=100 * 1024)
+    def test_stream_file_to_upload_url(self):
+        self.client.logout()
+        factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        content = os.urandom(250 * 1024)
+        video_file = BytesIO(content)
+        video_file.name = "video.mp4"
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        local_backend = LocalUploadBackend(directory)
+        local_backend.start_transcoding = Mock(return_value=[])
+        local_backend.upload_part = Mock(side_effect=local_backend.upload_part)
+        local_backend.upload_video = Mock()
+
+        with override_settings(PLUGIN_BACKEND=lambda: local_backend):
+            response = self.client.post(
+                reverse("api:v1:video-upload", kwargs={"video_id": "videoid"}),
+                {"file": video_file},
+            )
+
+        self.assertEqual(200, response.status_code)
+        local_backend.upload_video.assert_not_called()
+        # Django reads the request in chunks of 64kb
+        self.assertEqual(2, local_backend.upload_part.call_count)
+        with open(os.path.join(directory, "videoid-video.mp4"), "rb") as f:
+            self.assertEqual(content, f.read())
+        self.assertEqual("video.mp4", models.Video.objects.get().title)
+        local_backend.start_transcoding.assert_called_once_with("videoid", "")
+
+    def test_stream_file_to_upload_url_twice(self):
+        video_upload_url = factories.VideoUploadUrlFactory(
+            public_video_id="videoid", owner=self.user, expires_at=time() + 3600
+        )
+        video_upload_url.storage_upload = {"path": "previous"}
+        video_upload_url.save()
+        video_file = BytesIO(b"some video content")
+        video_file.name = "video.mp4"
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        local_backend = LocalUploadBackend(directory)
+        local_backend.start_transcoding = Mock(return_value=[])
+        local_backend.abort_upload = Mock()
+
+        with override_settings(PLUGIN_BACKEND=lambda: local_backend):
+            response = self.client.post(
+                reverse("api:v1:video-upload", kwargs={"video_id": "videoid"}),
+                {"file": video_file},
+            )
+
+        self.assertEqual(200, response.status_code)
+        # Parts of the previous upload are not orphaned
+        local_backend.abort_upload.assert_called_once_with({"path": "previous"})
+        self.assertEqual(
+            {"path": os.path.join(directory, "videoid-video.mp4")},
+            models.VideoUploadUrl.objects.get().storage_upload,
+        )
+
     def test_send_empty_file_to_upload_url(self):
         video_upload_url = factories.VideoUploadUrlFactory(
             public_video_id="videoid",
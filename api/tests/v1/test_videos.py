@@ -8,9 +8,9 @@ from django.test import TestCase
 from django.test.utils import override_settings
 from django.utils.timezone import datetime, get_current_timezone
 
-from pipeline import models
+from pipeline import cache, models
 from pipeline.tests import factories
-from pipeline.tests.utils import override_plugin_backend
+from pipeline.tests.utils import override_plugin_backend, run_on_commit_callbacks
 
 from .base import BaseAuthenticatedTests
 
@@ -33,11 +33,13 @@ class VideosTests(BaseAuthenticatedTests):
     # 1) django session
     # 2) user authentication
     VIDEOS_LIST_NUM_QUERIES_AUTH = 2
-    # 3) video + transcoding job
+    # 3) video snapshots
     VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT = VIDEOS_LIST_NUM_QUERIES_AUTH + 1
-    # 4) subtitles prefetch
-    # 5) formats prefetch
-    VIDEOS_LIST_NUM_QUERIES = VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT + 2
+    VIDEOS_LIST_NUM_QUERIES = VIDEOS_LIST_NUM_QUERIES_EMPTY_RESULT
+    # Video details also require an ownership check, before the conditional
+    # request preconditions are evaluated
+    VIDEO_DETAIL_NUM_QUERIES_AUTH = VIDEOS_LIST_NUM_QUERIES_AUTH + 1
+    VIDEO_DETAIL_NUM_QUERIES = VIDEOS_LIST_NUM_QUERIES + 1
 
     def test_list_videos(self):
         url = reverse("api:v1:video-list")
@@ -131,11 +133,11 @@ class VideosTests(BaseAuthenticatedTests):
 
     def test_get_video_with_cache(self):
         factories.VideoFactory(public_id="videoid", title="Some title", owner=self.user)
-        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+        with self.assertNumQueries(self.VIDEO_DETAIL_NUM_QUERIES):
             response1 = self.client.get(
                 reverse("api:v1:video-detail", kwargs={"id": "videoid"})
             )
-        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+        with self.assertNumQueries(self.VIDEO_DETAIL_NUM_QUERIES_AUTH):
             response2 = self.client.get(
                 reverse("api:v1:video-detail", kwargs={"id": "videoid"})
             )
@@ -143,6 +145,180 @@ class VideosTests(BaseAuthenticatedTests):
         self.assertEqual(200, response1.status_code)
         self.assertEqual(200, response2.status_code)
 
+    def test_get_video_not_modified(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(self.VIDEO_DETAIL_NUM_QUERIES_AUTH):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+
+    def test_get_video_of_other_user_with_precondition(self):
+        factories.VideoFactory(public_id="videoid")
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(404, response.status_code)
+        self.assertNotIn("ETag", response)
+
+    def test_get_unknown_video_with_precondition(self):
+        url = reverse("api:v1:video-detail", kwargs={"id": "unknown"})
+
+        with patch("pipeline.cache.get_validators") as get_validators:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(404, response.status_code)
+        get_validators.assert_not_called()
+
+    def test_get_modified_video(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        etag = self.client.get(url)["ETag"]
+        video.title = "New title"
+        video.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual("New title", response.json()["title"])
+
+    def test_get_video_not_modified_since(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(304, response.status_code)
+
+    def test_get_video_modified_since_progress_update(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        video.processing_state.status = models.ProcessingState.STATUS_PROCESSING
+        video.processing_state.save()
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        with patch("pipeline.cache.time", return_value=time() + 10):
+            cache.set_progress("videoid", 42)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(42, response.json()["processing"]["progress"])
+        self.assertNotEqual(last_modified, response["Last-Modified"])
+
+    @override_plugin_backend(
+        video_url=lambda video_id, format_name: "http://example.com/{}.mp4".format(
+            format_name
+        ),
+        manifest_url=lambda video_id, kind: "http://example.com/{}/index".format(kind),
+    )
+    def test_get_video_with_manifests(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        video.formats.create(name="SD", bitrate=128)
+        video.formats.create(name="HLS", bitrate=2000, kind="hls")
+
+        video = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        ).json()
+
+        self.assertEqual(
+            ["SD"], [video_format["name"] for video_format in video["formats"]]
+        )
+        self.assertEqual(
+            [{"kind": "hls", "url": "http://example.com/hls/index", "bitrate": 2000.0}],
+            video["manifests"],
+        )
+
+    @override_plugin_backend(
+        video_url=lambda video_id, format_name: "http://example.com/{}/{}.mp4".format(
+            video_id, format_name
+        ),
+        thumbnail_url=lambda video_id, thumb_id: "http://example.com/thumb.jpg",
+        sign_url=lambda url: url + "?signature=42",
+        get_url_signature_period=lambda: 1,
+    )
+    def test_get_video_with_signed_urls(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        video.formats.create(name="SD", bitrate=128)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+
+        response = self.client.get(url)
+        video = response.json()
+
+        self.assertEqual(
+            "http://example.com/videoid/SD.mp4?signature=42", video["formats"][0]["url"]
+        )
+        self.assertEqual(
+            "http://example.com/thumb.jpg?signature=42", video["thumbnail"]
+        )
+        self.assertTrue(response["ETag"].endswith('-s1"'))
+        self.assertNotIn("Last-Modified", response)
+        # Snapshots store unsigned urls
+        self.assertEqual(
+            "http://example.com/videoid/SD.mp4",
+            json.loads(models.Video.objects.get().snapshot)["formats"][0]["url"],
+        )
+
+    @override_plugin_backend(
+        video_url=lambda video_id, format_name: "http://example.com/{}.mp4".format(
+            format_name
+        ),
+        manifest_url=lambda video_id, kind: "http://example.com/{}/index".format(kind),
+        sign_url=lambda url: url + "?signature=42",
+        get_url_signature_period=lambda: 1,
+    )
+    def test_get_video_with_manifests_and_signed_urls(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        video.formats.create(name="SD", bitrate=128)
+        video.formats.create(name="HLS", bitrate=2000, kind="hls")
+
+        video = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        ).json()
+
+        self.assertEqual(
+            "http://example.com/SD.mp4?signature=42", video["formats"][0]["url"]
+        )
+        # Segments would not be signed: manifests are not served
+        self.assertEqual([], video["manifests"])
+        self.assertEqual(
+            "http://example.com/hls/index",
+            json.loads(models.Video.objects.get().snapshot)["manifests"][0]["url"],
+        )
+
+    def test_get_video_with_signed_urls_from_previous_period(self):
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        url = reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        with override_plugin_backend(get_url_signature_period=lambda: 1):
+            etag = self.client.get(url)["ETag"]
+
+        with override_plugin_backend(get_url_signature_period=lambda: 2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+
+    @override_plugin_backend(
+        video_url=lambda video_id, format_name: "http://example.com/{}.mp4".format(
+            format_name
+        ),
+        sign_url=lambda url: url + "?signature=42",
+        get_url_signature_period=lambda: 1,
+    )
+    def test_list_videos_with_signed_urls(self):
+        video = factories.VideoFactory(public_id="videoid", owner=self.user)
+        video.formats.create(name="SD", bitrate=128)
+
+        videos = self.client.get(reverse("api:v1:video-list")).json()
+
+        self.assertEqual(
+            "http://example.com/SD.mp4?signature=42", videos[0]["formats"][0]["url"]
+        )
+
     def test_list_failed_videos(self):
         video = factories.VideoFactory(
             public_id="videoid", title="videotitle", owner=self.user
@@ -159,7 +335,8 @@ class VideosTests(BaseAuthenticatedTests):
         self.assertEqual(405, response.status_code)  # method not allowed
 
     @override_plugin_backend(
-        start_transcoding=lambda video_id: [], iter_formats=lambda video_id: []
+        start_transcoding=lambda video_id: [],
+        iter_formats=lambda video_id, jobs=None: [],
     )
     def test_get_video_that_was_just_uploaded(self):
         factories.VideoUploadUrlFactory(
@@ -185,14 +362,31 @@ class VideosTests(BaseAuthenticatedTests):
         mock_delete_video = Mock()
         factories.VideoFactory(public_id="videoid", owner=self.user)
         with override_plugin_backend(delete_video=mock_delete_video):
-            response = self.client.delete(
-                reverse("api:v1:video-detail", kwargs={"id": "videoid"})
-            )
+            with run_on_commit_callbacks():
+                response = self.client.delete(
+                    reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+                )
 
         self.assertEqual(204, response.status_code)
         self.assertEqual(0, models.Video.objects.count())
         mock_delete_video.assert_called_once_with("videoid")
 
+    def test_delete_video_storage_failure(self):
+        mock_delete_video = Mock(side_effect=ValueError)
+        factories.VideoFactory(public_id="videoid", owner=self.user)
+        with override_plugin_backend(delete_video=mock_delete_video):
+            with run_on_commit_callbacks():
+                response = self.client.delete(
+                    reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+                )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(0, models.Video.objects.count())
+        mock_delete_video.assert_called_once_with("videoid")
+        self.assertEqual(
+            "videoid", models.StorageDeletion.objects.get().public_video_id
+        )
+
     @override_plugin_backend(
         subtitle_url=lambda vid, sid, lang: "http://example.com/{}.vtt".format(sid)
     )
@@ -201,7 +395,7 @@ class VideosTests(BaseAuthenticatedTests):
         video.subtitles.create(language="fr", public_id="subid1")
         video.subtitles.create(language="en", public_id="subid2")
 
-        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+        with self.assertNumQueries(self.VIDEO_DETAIL_NUM_QUERIES):
             video = self.client.get(
                 reverse("api:v1:video-detail", kwargs={"id": "videoid"})
             ).json()
@@ -226,14 +420,14 @@ class VideosTests(BaseAuthenticatedTests):
         video_url=lambda video_id, format_name: "http://example.com/{}/{}.mp4".format(
             video_id, format_name
         ),
-        iter_formats=lambda video_id: [],
+        iter_formats=lambda video_id, jobs=None: [],
     )
     def test_get_video_with_formats(self):
         video = factories.VideoFactory(public_id="videoid", owner=self.user)
         video.formats.create(name="SD", bitrate=128)
         video.formats.create(name="HD", bitrate=256)
 
-        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+        with self.assertNumQueries(self.VIDEO_DETAIL_NUM_QUERIES):
             video = self.client.get(
                 reverse("api:v1:video-detail", kwargs={"id": "videoid"})
             ).json()
@@ -272,6 +466,97 @@ class VideosTests(BaseAuthenticatedTests):
         self.assertEqual(1, len(videos))
         self.assertEqual(video_in_playlist.public_id, videos[0]["id"])
 
+    def test_list_videos_paginated(self):
+        video_ids = [
+            factories.VideoFactory(owner=self.user).public_id for _ in range(3)
+        ]
+
+        response = self.client.get(reverse("api:v1:video-list"), data={"page_size": 2})
+        page1 = response.json()
+        page2 = self.client.get(page1["next"]).json()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(video_ids[:2], [video["id"] for video in page1["results"]])
+        self.assertEqual(video_ids[2:], [video["id"] for video in page2["results"]])
+        self.assertIsNone(page2["next"])
+        self.assertIsNotNone(page2["previous"])
+
+    def test_list_videos_with_cache(self):
+        factories.VideoFactory(owner=self.user)
+        url = reverse("api:v1:video-list")
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+            response1 = self.client.get(url)
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES_AUTH):
+            response2 = self.client.get(url)
+
+        self.assertEqual(1, len(response1.json()))
+        self.assertEqual(response1.json(), response2.json())
+
+    def test_list_videos_from_snapshots(self):
+        factories.VideoFactory(public_id="videoid1", owner=self.user)
+        factories.VideoFactory(public_id="videoid2", owner=self.user)
+        video_detail = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid1"})
+        ).json()
+
+        with self.assertNumQueries(self.VIDEOS_LIST_NUM_QUERIES):
+            videos = self.client.get(reverse("api:v1:video-list")).json()
+
+        self.assertEqual(["videoid1", "videoid2"], [video["id"] for video in videos])
+        self.assertEqual(video_detail, videos[0])
+
+    def test_get_video_with_missing_snapshot(self):
+        factories.VideoFactory(public_id="videoid", title="Some title", owner=self.user)
+        models.Video.objects.update(snapshot="")
+
+        video = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        ).json()
+
+        self.assertEqual("Some title", video["title"])
+        self.assertNotEqual("", models.Video.objects.get().snapshot)
+
+    def test_get_video_of_other_owner(self):
+        factories.VideoFactory(public_id="videoid", owner=factories.UserFactory())
+
+        response = self.client.get(
+            reverse("api:v1:video-detail", kwargs={"id": "videoid"})
+        )
+
+        self.assertEqual(404, response.status_code)
+
+    def test_list_videos_cache_invalidated_on_video_update(self):
+        video = factories.VideoFactory(owner=self.user, title="title1")
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        video.title = "title2"
+        video.save()
+
+        videos = self.client.get(url).json()
+
+        self.assertEqual("title2", videos[0]["title"])
+
+    def test_list_videos_in_playlist_cache_invalidated_on_playlist_update(self):
+        playlist = factories.PlaylistFactory(owner=self.user)
+        video = factories.VideoFactory(owner=self.user)
+        url = reverse("api:v1:video-list")
+        data = {"playlist_id": playlist.public_id}
+        self.assertEqual([], self.client.get(url, data=data).json())
+        playlist.videos.add(video)
+
+        videos = self.client.get(url, data=data).json()
+
+        self.assertEqual([video.public_id], [v["id"] for v in videos])
+
+    def test_list_videos_cache_is_per_owner(self):
+        factories.VideoFactory(owner=self.user)
+        url = reverse("api:v1:video-list")
+        self.client.get(url)
+        other_user = factories.UserFactory()
+        self.client.force_login(other_user)
+
+        self.assertEqual([], self.client.get(url).json())
+
     @override_plugin_backend(
         thumbnail_url=lambda video_id, thumb_id: "http://imgur.com/{}/thumbs/{}.jpg".format(
             video_id, thumb_id
@@ -0,0 +1,111 @@
+"""
+Authentication classes that cache verified credentials, such that api clients
+do not pay for a password hash or a token lookup on every request.
+"""
+from copy import copy
+from time import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from pipeline.cache import LocalCache
+
+BASIC_AUTH_SALT = "api.v1.authentication.CachedBasicAuthentication"
+
+token_cache = LocalCache(max_size_setting="AUTHENTICATION_TOKEN_CACHE_SIZE")
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication that stores verified credentials in the shared cache
+    for AUTHENTICATION_CACHE_TIMEOUT seconds. Cache keys are keyed hashes of
+    the credentials, and entries store a keyed hash of the user's password
+    hash: entries are thus ignored as soon as the user's password changes.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = _basic_auth_cache_key(userid, password)
+        user = _get_cached_user(key)
+        if user is not None:
+            return (user, None)
+
+        user, auth = super().authenticate_credentials(userid, password, request=request)
+        cache.set(
+            key,
+            {"user_id": user.pk, "password": _password_fingerprint(user)},
+            settings.AUTHENTICATION_CACHE_TIMEOUT,
+        )
+        return (user, auth)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that stores the users of recently used tokens in
+    memory, for AUTHENTICATION_CACHE_TIMEOUT seconds. Entries are discarded
+    when a token is deleted, e.g: when it is rotated, or when a user is
+    modified. Note that other processes only discard their entries when they
+    expire.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is not None and entry["expires_at"] > time():
+            return (copy(entry["user"]), entry["token"])
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(
+            key,
+            {
+                "user": user,
+                "token": token,
+                "expires_at": time() + settings.AUTHENTICATION_CACHE_TIMEOUT,
+            },
+        )
+        return (copy(user), token)
+
+
+def _basic_auth_cache_key(userid, password):
+    digest = salted_hmac(BASIC_AUTH_SALT, userid + "\0" + password).hexdigest()
+    return "AUTH_BASIC:" + digest
+
+
+def _password_fingerprint(user):
+    return salted_hmac(BASIC_AUTH_SALT, user.password).hexdigest()
+
+
+def _get_cached_user(key):
+    """
+    Return the user of cached credentials, or None if the credentials are
+    missing or obsolete.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    user = get_user_model().objects.filter(pk=entry["user_id"]).first()
+    if (
+        user is None
+        or not user.is_active
+        or not constant_time_compare(entry["password"], _password_fingerprint(user))
+    ):
+        cache.delete(key)
+        return None
+    return user
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_token_cache_on_user_change(sender, **kwargs):
+    # Users are rarely modified: there is no need to find their tokens
+    token_cache.clear()
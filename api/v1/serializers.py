@@ -1,9 +1,11 @@
 from time import time
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from pipeline import models
+from pipeline import backend, models
+from pipeline import utils as pipeline_utils
 
 from . import utils
 
@@ -40,26 +42,145 @@ class VideoUploadUrlSerializer(serializers.ModelSerializer):
         def get_queryset(self):
             return models.Playlist.objects.filter(owner=self.context["request"].user)
 
+    # Maximum number of parts of direct uploads
+    MAX_UPLOAD_PARTS = 10000
+
     id = serializers.CharField(source="public_video_id", read_only=True)
     expires_at = serializers.IntegerField(read_only=True)
     owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
     playlist = RelatedPlaylistField(slug_field="public_id", required=False)
+    direct = serializers.BooleanField(
+        write_only=True,
+        default=False,
+        help_text="Upload the file directly to the storage",
+    )
+    direct_upload = serializers.SerializerMethodField()
 
     class Meta:
-        fields = ("id", "expires_at", "owner", "origin", "playlist")
+        fields = (
+            "id",
+            "expires_at",
+            "owner",
+            "origin",
+            "playlist",
+            "direct",
+            "file_name",
+            "file_size",
+            "direct_upload",
+        )
         model = models.VideoUploadUrl
+        extra_kwargs = {"file_size": {"min_value": 1}}
+
+    def validate_file_name(self, value):
+        if "/" in value:
+            raise serializers.ValidationError("Invalid file name")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get("direct"):
+            errors = {}
+            if not attrs.get("file_name"):
+                errors["file_name"] = "Required for direct uploads"
+            file_size = attrs.get("file_size")
+            if not file_size:
+                errors["file_size"] = "Required for direct uploads"
+            elif file_size > settings.DIRECT_UPLOAD_PART_SIZE * self.MAX_UPLOAD_PARTS:
+                errors["file_size"] = "File is too large"
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
 
     def create(self, validated_data):
         """
         Overloads the create method in order to set a valid "expires_at" value
-        before saving to database.
+        before saving to database. For direct uploads, the storage-side upload
+        is created as well.
         """
 
+        direct = validated_data.pop("direct", False)
         validated_data["expires_at"] = (
             time() + models.VideoUploadUrl.objects.EXPIRE_DELAY
         )
+        if direct:
+            validated_data["public_video_id"] = pipeline_utils.generate_random_id()
+            validated_data["storage_upload"] = self.create_direct_upload(
+                validated_data["public_video_id"], validated_data["file_name"]
+            )
         return super().create(validated_data)
 
+    @staticmethod
+    def create_direct_upload(public_video_id, file_name):
+        """
+        Create the storage-side upload of a direct upload. Backends that can
+        create uploads but cannot generate part urls do not support direct
+        uploads either: in that case, the upload is aborted before the url is
+        saved.
+        """
+        plugin_backend = backend.get()
+        try:
+            upload = plugin_backend.create_upload(public_video_id, file_name)
+        except NotImplementedError:
+            raise serializers.ValidationError(
+                {"direct": "Direct uploads are not supported"}
+            )
+        try:
+            plugin_backend.get_upload_part_url(
+                upload, 1, models.VideoUploadUrl.objects.EXPIRE_DELAY
+            )
+        except NotImplementedError:
+            plugin_backend.abort_upload(upload)
+            raise serializers.ValidationError(
+                {"direct": "Direct uploads are not supported"}
+            )
+        return upload
+
+    def get_direct_upload(self, obj):
+        """
+        Direct upload of the file, in `part_count` parts of `part_size` bytes.
+        Parts must be uploaded with HTTP PUT requests to their urls. Once all
+        parts are uploaded, the upload must be completed with a POST request to
+        the `complete` video endpoint.
+
+        Part urls are only returned on creation: afterwards, they are returned
+        by the `parts` endpoint.
+        """
+        if obj.storage_upload is None:
+            return None
+        part_count = self.get_part_count(obj)
+        direct_upload = {
+            "part_size": settings.DIRECT_UPLOAD_PART_SIZE,
+            "part_count": part_count,
+        }
+        if self.context.get("upload_parts"):
+            direct_upload["parts"] = self.get_parts(obj, 1, part_count)
+        return direct_upload
+
+    @staticmethod
+    def get_part_count(obj):
+        part_size = settings.DIRECT_UPLOAD_PART_SIZE
+        return max(1, (obj.file_size + part_size - 1) // part_size)
+
+    @staticmethod
+    def get_parts(obj, first, last):
+        """
+        Upload urls of the parts of a direct upload, from `first` to `last`
+        (inclusive).
+        """
+        upload = obj.storage_upload
+        # Urls must remain valid during the upload
+        expires_in = (
+            int(obj.expires_at - time()) + models.VideoUploadUrl.objects.EXPIRE_DELAY
+        )
+        return [
+            {
+                "part_number": part_number,
+                "url": backend.get().get_upload_part_url(
+                    upload, part_number, expires_in
+                ),
+            }
+            for part_number in range(first, last + 1)
+        ]
+
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, default=utils.random_password)
@@ -94,13 +215,80 @@ class VideoFormatSerializer(serializers.ModelSerializer):
         model = models.VideoFormat
 
 
+class ManifestSerializer(serializers.ModelSerializer):
+    url = serializers.CharField(read_only=True)
+    bitrate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        fields = ("kind", "url", "bitrate")
+        model = models.VideoFormat
+
+
 class VideoSerializer(serializers.ModelSerializer):
     id = serializers.CharField(source="public_id", read_only=True)
     processing = ProcessingStateSerializer(source="processing_state", read_only=True)
     subtitles = SubtitleSerializer(many=True, read_only=True)
-    formats = VideoFormatSerializer(many=True, read_only=True)
+    # Progressive video files
+    formats = VideoFormatSerializer(source="file_formats", many=True, read_only=True)
+    # Adaptive streaming (HLS, DASH) master playlists
+    manifests = ManifestSerializer(
+        source="streaming_formats", many=True, read_only=True
+    )
     thumbnail = serializers.CharField(source="thumbnail_url", read_only=True)
 
     class Meta:
-        fields = ("id", "title", "processing", "subtitles", "formats", "thumbnail")
+        fields = (
+            "id",
+            "title",
+            "processing",
+            "subtitles",
+            "formats",
+            "manifests",
+            "thumbnail",
+        )
         model = models.Video
+
+
+def sign_video_urls(videos):
+    """
+    Sign the playback urls of video api results, with the `sign_url` method of
+    the plugin backend. Cached content is not modified: videos are copied.
+    Adaptive streaming manifests are omitted from signed results.
+
+    Args:
+        videos (list): video api results
+
+    Returns:
+        videos (list)
+    """
+    plugin_backend = backend.get()
+    if plugin_backend.get_url_signature_period() is None:
+        return videos
+    signed_videos = []
+    for video in videos:
+        video = dict(video)
+        if "subtitles" in video:
+            video["subtitles"] = [
+                sign_subtitle_url(subtitle) for subtitle in video["subtitles"]
+            ]
+        if "formats" in video:
+            video["formats"] = [
+                dict(video_format, url=plugin_backend.sign_url(video_format["url"]))
+                for video_format in video["formats"]
+            ]
+        if "manifests" in video:
+            # Signatures would not apply to the variant playlists and segments
+            # referenced by manifests: adaptive streaming is not served with
+            # signed urls.
+            video["manifests"] = []
+        if "thumbnail" in video:
+            video["thumbnail"] = plugin_backend.sign_url(video["thumbnail"])
+        signed_videos.append(video)
+    return signed_videos
+
+
+def sign_subtitle_url(subtitle):
+    """
+    Sign the url of a subtitle api result. See `sign_video_urls`.
+    """
+    return dict(subtitle, url=backend.get().sign_url(subtitle["url"]))
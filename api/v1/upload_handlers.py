@@ -0,0 +1,106 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from pipeline import backend, tasks
+
+
+class StreamedUploadedFile(UploadedFile):
+    """
+    A file that was streamed to the storage backend during the upload. The
+    file content is not available locally: unless the file is empty, the
+    storage-side upload must be completed with `tasks.complete_upload`.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(
+            file=BytesIO(),
+            name=name,
+            content_type=content_type,
+            size=size,
+            charset=charset,
+            content_type_extra=content_type_extra,
+        )
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Upload handler that sends the uploaded video file to the storage backend
+    as it is received, instead of writing it to a temporary file. Received
+    data is buffered in memory until it reaches STREAMING_UPLOAD_PART_SIZE
+    bytes, and then sent to the backend as a part of a multipart upload.
+
+    If the backend does not support multipart uploads, the file is written to
+    a temporary file, as with the default upload handlers.
+    """
+
+    def __init__(self, video_upload_url, request=None):
+        super().__init__(request=request)
+        self.video_upload_url = video_upload_url
+        self.active = False
+        self.upload = None
+        self.file = None
+        self.part_number = 0
+        self.buffer = BytesIO()
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != "file" or self.active:
+            return
+        self.active = True
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.upload is None and self.file is None:
+            self.start_upload()
+        if self.file is not None:
+            self.file.write(raw_data)
+        else:
+            self.buffer.write(raw_data)
+            if self.buffer.tell() >= settings.STREAMING_UPLOAD_PART_SIZE:
+                self.upload_buffer()
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.file is not None:
+            self.file.seek(0)
+            self.file.size = file_size
+            return self.file
+        if self.buffer.tell() > 0:
+            self.upload_buffer()
+        return StreamedUploadedFile(
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def start_upload(self):
+        try:
+            self.upload = tasks.start_streamed_upload(
+                self.video_upload_url.public_video_id, self.file_name
+            )
+        except NotImplementedError:
+            self.file = TemporaryUploadedFile(
+                self.file_name,
+                self.content_type,
+                0,
+                self.charset,
+                self.content_type_extra,
+            )
+            return
+
+    def upload_buffer(self):
+        self.part_number += 1
+        size = self.buffer.tell()
+        self.buffer.seek(0)
+        backend.get().upload_part(self.upload, self.part_number, self.buffer, size)
+        self.buffer = BytesIO()
@@ -29,6 +29,11 @@ class Router(routers.DefaultRouter):
 router = Router()
 router.register(r"playlists", views.PlaylistViewSet, base_name="playlist")
 router.register(r"subtitles", views.SubtitleViewSet, base_name="subtitle")
+router.register(
+    r"transcodingnotifications",
+    views.TranscodingNotificationViewSet,
+    base_name="transcodingnotification",
+)
 router.register(r"users", views.UserViewSet)
 router.register(r"videos", views.VideoListViewSet, base_name="video")
 router.register(r"videos", views.VideoViewSet, base_name="video")
@@ -1,34 +1,85 @@
+from base64 import b64decode
+
 import django_filters
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
 from rest_framework import mixins
 from rest_framework import status as rest_status
 from rest_framework import viewsets
-from rest_framework.authentication import (
-    BasicAuthentication,
-    SessionAuthentication,
-    TokenAuthentication,
-)
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action, detail_route
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from pipeline import cache, exceptions, models, tasks
+from pipeline import backend, cache, exceptions, models, tasks
 from videofront.celery_videofront import send_task
 
-from . import serializers
+from . import serializers, upload_handlers
+from .authentication import CachedBasicAuthentication, CachedTokenAuthentication
 
 AUTHENTICATION_CLASSES = (
-    BasicAuthentication,
+    CachedBasicAuthentication,
     SessionAuthentication,
-    TokenAuthentication,
+    CachedTokenAuthentication,
 )
 PERMISSION_CLASSES = (IsAuthenticated,)
 
 
+class ConditionalGetMixin:
+    """
+    Support for conditional GET requests. Responses include the ETag and
+    Last-Modified headers returned by `get_validators`, and requests with
+    matching If-None-Match or If-Modified-Since headers get a 304 response,
+    before any serialization.
+
+    Responses that include signed urls change with the signature period of
+    the plugin backend: set `signed_urls` to True to include it in the etag.
+    In that case, the Last-Modified header is omitted.
+    """
+
+    signed_urls = False
+
+    def get_validators(self):
+        """
+        Returns:
+            (etag, last_modified) (str, float): etag and modification
+            timestamp of the response, which may be None if unknown. Return
+            None to disable conditional requests.
+        """
+        raise NotImplementedError
+
+    def conditional_response(self, request, get_response):
+        validators = self.get_validators()
+        if validators is None:
+            return get_response()
+        etag, last_modified = validators
+        if self.signed_urls:
+            signature_period = backend.get().get_url_signature_period()
+            if signature_period is not None:
+                etag = "{}-s{}".format(etag, signature_period)
+                last_modified = None
+        etag = quote_etag(etag)
+        if last_modified is not None:
+            # Http dates have a precision of one second
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = get_response()
+        if response.status_code in [200, 304]:
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
 class PlaylistFilter(FilterSet):
     """
     Filter playlists by name.
@@ -41,7 +92,7 @@ class PlaylistFilter(FilterSet):
         fields = ["name"]
 
 
-class PlaylistViewSet(viewsets.ModelViewSet):
+class PlaylistViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     List, update and create video playlists.
     """
@@ -60,6 +111,20 @@ class PlaylistViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return models.Playlist.objects.filter(owner=self.request.user)
 
+    def get_validators(self):
+        return cache.get_owner_validators(self.request.user.id)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda: super(PlaylistViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            lambda: super(PlaylistViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
     @detail_route(methods=["POST"])
     def add_video(self, request, **kwargs):
         """
@@ -125,7 +190,10 @@ class PlaylistViewSet(viewsets.ModelViewSet):
 
 
 class SubtitleViewSet(
-    mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+    ConditionalGetMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
 ):
     authentication_classes = AUTHENTICATION_CLASSES
     permission_classes = PERMISSION_CLASSES
@@ -135,6 +203,8 @@ class SubtitleViewSet(
     lookup_field = "public_id"
     lookup_url_kwarg = "id"
 
+    signed_urls = True
+
     def get_queryset(self):
         queryset = (
             models.Subtitle.objects.select_related("video")
@@ -145,6 +215,26 @@ class SubtitleViewSet(
         )
         return queryset
 
+    def get_validators(self):
+        # Subtitles are invalidated along with their video
+        public_video_id = (
+            self.get_queryset()
+            .filter(public_id=self.kwargs[self.lookup_url_kwarg])
+            .values_list("video__public_id", flat=True)
+            .first()
+        )
+        if public_video_id is None:
+            return None
+        return cache.get_validators(public_video_id)
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_response():
+            response = super(SubtitleViewSet, self).retrieve(request, *args, **kwargs)
+            response.data = serializers.sign_subtitle_url(response.data)
+            return response
+
+        return self.conditional_response(request, get_response)
+
     def perform_destroy(self, instance):
         super(SubtitleViewSet, self).perform_destroy(instance)
         tasks.delete_subtitle(instance.video.public_id, instance.public_id)
@@ -188,6 +278,19 @@ class VideoFilter(FilterSet):
         fields = ["playlist_id"]
 
 
+class VideoPagination(CursorPagination):
+    """
+    Cursor-based pagination of videos, in creation order. For backward
+    compatibility, pagination is only enabled when the `page_size` argument is
+    passed.
+    """
+
+    ordering = "id"
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
 # noinspection PyUnresolvedReferences
 class VideoQuerysetMixin:
     def get_queryset(self):
@@ -201,12 +304,22 @@ class VideoQuerysetMixin:
         return queryset
 
 
+def get_video_results(videos):
+    """
+    Video api results are cached without their latest transcoding progress
+    and with unsigned urls: both are added when the results are served.
+    """
+    return serializers.sign_video_urls(cache.merge_progress(videos))
+
+
 class VideoListViewSet(
     mixins.ListModelMixin, VideoQuerysetMixin, viewsets.GenericViewSet
 ):
     """
     List available videos. Note that you may obtain only the videos that belong
-    to a certain playlist by passing the argument `?playlist_id=xxxx`.
+    to a certain playlist by passing the argument `?playlist_id=xxxx`. Results
+    are paginated when the `?page_size=N` argument is passed: follow the `next`
+    url of each page to obtain the next one.
     """
 
     # Similar to a generic model viewset, but without creation features. Video
@@ -219,6 +332,7 @@ class VideoListViewSet(
 
     filter_backends = (DjangoFilterBackend,)
     filter_class = VideoFilter
+    pagination_class = VideoPagination
 
     def get_queryset(self):
         return (
@@ -227,8 +341,49 @@ class VideoListViewSet(
             .exclude(processing_state__status=models.ProcessingState.STATUS_FAILED)
         )
 
+    def list(self, request, *args, **kwargs):
+        # Results are cached for each owner and query (playlist, page). The
+        # cache is invalidated whenever the owner's videos or playlists are
+        # modified.
+        owner_id = request.user.id
+        query = request.build_absolute_uri()
+        version = cache.get_owner_version(owner_id)
+        response_data = cache.get_list(owner_id, query, version)
+        if response_data is None:
+            response_data = self.get_list_data()
+            cache.set_list(owner_id, query, response_data, version)
+        if isinstance(response_data, dict):
+            response_data = dict(
+                response_data, results=get_video_results(response_data["results"])
+            )
+        else:
+            response_data = get_video_results(response_data)
+        return Response(response_data)
+
+    def get_list_data(self):
+        """
+        Video lists are assembled from the video snapshots, which are fetched
+        with a single query.
+        """
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .order_by("id")
+            .values("id", "public_id", "snapshot")
+        )
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        results = [
+            models.get_snapshot(row["public_id"], row["snapshot"]) for row in rows
+        ]
+        results = [video for video in results if video is not None]
+        if page is None:
+            return results
+        return self.get_paginated_response(results).data
+
 
 class VideoViewSet(
+    ConditionalGetMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -251,17 +406,53 @@ class VideoViewSet(
     lookup_field = "public_id"
     lookup_url_kwarg = "id"
 
+    signed_urls = True
+
     def retrieve(self, request, *args, **kwargs):
         # We override the `retrieve` method in order to cache API results for
         # /video/<videoid> calls.
         public_video_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
-        response_data = cache.get(public_video_id)
-        if response_data is None:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            response_data = serializer.data
-            cache.set(public_video_id, response_data)
-        return Response(response_data)
+
+        def get_response():
+            response_data = cache.get_or_set(
+                public_video_id, lambda: self.get_video_data(public_video_id)
+            )
+            return Response(get_video_results([response_data])[0])
+
+        return self.conditional_response(request, get_response)
+
+    def update(self, request, *args, **kwargs):
+        response = super(VideoViewSet, self).update(request, *args, **kwargs)
+        response.data = serializers.sign_video_urls([response.data])[0]
+        return response
+
+    def get_validators(self):
+        # Preconditions are only evaluated for the videos of the current user:
+        # other requests get a 404 response.
+        public_video_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not self.get_queryset().filter(public_id=public_video_id).exists():
+            return None
+        return cache.get_validators(public_video_id)
+
+    def get_video_data(self, public_video_id):
+        """
+        Video content is read from its snapshot, with a single query.
+        """
+        video = (
+            models.Video.objects.filter(
+                owner=self.request.user, public_id=public_video_id
+            )
+            .values("public_id", "snapshot")
+            .first()
+        )
+        data = (
+            models.get_snapshot(video["public_id"], video["snapshot"])
+            if video
+            else None
+        )
+        if data is None:
+            raise Http404
+        return data
 
     def perform_destroy(self, instance):
         # Delete external resources
@@ -359,15 +550,69 @@ class VideoUploadUrlViewSet(viewsets.ModelViewSet):
     lookup_field = "public_video_id"
     lookup_url_kwarg = "id"
 
+    # Maximum number of part urls returned by the `parts` endpoint
+    MAX_PARTS_PER_REQUEST = 1000
+
     def get_queryset(self):
         return models.VideoUploadUrl.objects.available().filter(owner=self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Part urls of direct uploads are only generated on creation
+        context["upload_parts"] = self.action == "create"
+        return context
+
+    @action(detail=True, methods=["GET"])
+    def parts(self, request, **kwargs):
+        """
+        Upload urls of a range of parts of a direct upload. The range of part
+        numbers is defined by the `parts` argument, e.g: `?parts=1-100`.
+        """
+        video_upload_url = self.get_object()
+        if video_upload_url.storage_upload is None:
+            raise Http404
+        part_count = serializers.VideoUploadUrlSerializer.get_part_count(
+            video_upload_url
+        )
+        try:
+            first, _, last = request.query_params.get("parts", "").partition("-")
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            return Response(
+                {"parts": "Invalid part range"}, status=rest_status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= first <= last <= part_count:
+            return Response(
+                {"parts": "Part numbers must be between 1 and {}".format(part_count)},
+                status=rest_status.HTTP_400_BAD_REQUEST,
+            )
+        if last - first >= self.MAX_PARTS_PER_REQUEST:
+            return Response(
+                {
+                    "parts": "At most {} parts may be requested".format(
+                        self.MAX_PARTS_PER_REQUEST
+                    )
+                },
+                status=rest_status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {
+                "part_size": settings.DIRECT_UPLOAD_PART_SIZE,
+                "part_count": part_count,
+                "parts": serializers.VideoUploadUrlSerializer.get_parts(
+                    video_upload_url, first, last
+                ),
+            }
+        )
+
 
 class UploadViewset(viewsets.ViewSet):
     """
     Handles the upload and transcoding of videos
 
     - The `upload` detail action will receive a file
+    - The `complete` detail action will complete a direct upload to the backend
     - The `transcode` detail action will tanscode a file already in the backend
     """
 
@@ -388,6 +633,11 @@ class UploadViewset(viewsets.ViewSet):
             return Response({}, headers=cors_headers)
 
         # POST call
+        # Stream the file to the backend, when supported. Note that this must
+        # be done before the request body is parsed.
+        request.upload_handlers.insert(
+            0, upload_handlers.StreamingUploadHandler(video_upload_url, request)
+        )
         video_file = request.FILES.get("file")
         if video_file is None or video_file.size == 0:
             return Response(
@@ -395,9 +645,129 @@ class UploadViewset(viewsets.ViewSet):
                 status=rest_status.HTTP_400_BAD_REQUEST,
                 headers=cors_headers,
             )
-        tasks.upload_video(video_upload_url.public_video_id, video_file)
+        if isinstance(video_file, upload_handlers.StreamedUploadedFile):
+            tasks.complete_upload(video_upload_url.public_video_id)
+        else:
+            tasks.upload_video(video_upload_url.public_video_id, video_file)
         return Response({"id": video_upload_url.public_video_id}, headers=cors_headers)
 
+    @action(detail=True, methods=["POST", "OPTIONS"])
+    def complete(self, request, video_id=None):
+        """
+        Complete a direct upload to the storage, once all parts of the file
+        have been uploaded to the urls returned on upload url creation. The
+        video is then transcoded.
+        """
+
+        cors_headers, video_upload_url = self.prepare(video_id)
+
+        if request.method == "OPTIONS":
+            return Response({}, headers=cors_headers)
+
+        if video_upload_url.storage_upload is None:
+            return Response(
+                {"direct": "Not a direct upload"},
+                status=rest_status.HTTP_400_BAD_REQUEST,
+                headers=cors_headers,
+            )
+        tasks.complete_upload(video_upload_url.public_video_id)
+        return Response({"id": video_upload_url.public_video_id}, headers=cors_headers)
+
+    @action(detail=True, methods=["GET", "HEAD", "PATCH", "OPTIONS"])
+    def resumable(self, request, video_id=None):
+        """
+        Resumable upload of a video file, in chunks, inspired by the tus
+        protocol (https://tus.io):
+
+        - `HEAD` (or `GET`) returns the number of bytes already received in the
+          `Upload-Offset` header.
+        - `PATCH` appends a chunk of the file, sent as the request body. The
+          `Upload-Offset` header must be equal to the number of bytes already
+          received. The first request must also include the `Upload-Length`
+          header, with the total size of the file, and the `Upload-Metadata`
+          header, with the base64-encoded file name: "filename <base64 name>".
+
+        All chunks except the last one must be at least
+        RESUMABLE_UPLOAD_MIN_CHUNK_SIZE bytes large. Once the last chunk is
+        received, the video is transcoded.
+        """
+
+        cors_headers, video_upload_url = self.prepare(video_id)
+        cors_headers["Access-Control-Expose-Headers"] = "Upload-Offset, Upload-Length"
+        cors_headers["Tus-Resumable"] = "1.0.0"
+
+        if request.method == "OPTIONS":
+            cors_headers["Access-Control-Allow-Methods"] = "GET, HEAD, PATCH, OPTIONS"
+            cors_headers["Access-Control-Allow-Headers"] = ", ".join(
+                [
+                    "Content-Type",
+                    "Tus-Resumable",
+                    "Upload-Length",
+                    "Upload-Metadata",
+                    "Upload-Offset",
+                ]
+            )
+            return Response({}, headers=cors_headers)
+
+        if request.method in ["GET", "HEAD"]:
+            cors_headers["Upload-Offset"] = str(video_upload_url.upload_offset)
+            if video_upload_url.file_size is not None:
+                cors_headers["Upload-Length"] = str(video_upload_url.file_size)
+            cors_headers["Cache-Control"] = "no-store"
+            return Response(
+                status=rest_status.HTTP_204_NO_CONTENT, headers=cors_headers
+            )
+
+        try:
+            offset = int(request.META["HTTP_UPLOAD_OFFSET"])
+            size = int(request.META.get("CONTENT_LENGTH") or 0)
+            if video_upload_url.storage_upload is None:
+                tasks.start_resumable_upload(
+                    video_upload_url.public_video_id,
+                    self.get_upload_file_name(request),
+                    int(request.META["HTTP_UPLOAD_LENGTH"]),
+                )
+            offset = tasks.upload_chunk(
+                video_upload_url.public_video_id, offset, request.stream, size
+            )
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Missing or invalid upload headers"},
+                status=rest_status.HTTP_400_BAD_REQUEST,
+                headers=cors_headers,
+            )
+        except (exceptions.LockUnavailable, exceptions.UploadChunkConflict) as e:
+            return Response(
+                {"detail": e.args[0] if e.args else "Concurrent upload"},
+                status=rest_status.HTTP_409_CONFLICT,
+                headers=cors_headers,
+            )
+        except exceptions.UploadChunkInvalid as e:
+            return Response(
+                {"detail": e.args[0]},
+                status=rest_status.HTTP_400_BAD_REQUEST,
+                headers=cors_headers,
+            )
+
+        cors_headers["Upload-Offset"] = str(offset)
+        return Response(status=rest_status.HTTP_204_NO_CONTENT, headers=cors_headers)
+
+    @staticmethod
+    def get_upload_file_name(request):
+        """
+        Parse the file name from the `Upload-Metadata` header.
+
+        Raises:
+            ValueError in case of missing or invalid file name
+        """
+        for item in request.META.get("HTTP_UPLOAD_METADATA", "").split(","):
+            key, _, value = item.strip().partition(" ")
+            if key == "filename":
+                file_name = b64decode(value).decode()
+                if file_name and "/" not in file_name:
+                    return file_name
+        raise ValueError("Missing file name")
+
     @action(detail=True, methods=["POST", "OPTIONS"])
     def transcode(self, request, video_id=None):
         """
@@ -463,6 +833,27 @@ class UploadViewset(viewsets.ViewSet):
         return cors_headers, video_upload_url
 
 
+class TranscodingNotificationViewSet(viewsets.ViewSet):
+    """
+    Receive notifications from the transcoding service whenever the state of a
+    transcoding job changes. This endpoint is only available when
+    TRANSCODING_MONITORING = "notifications".
+
+    Notifications are not authenticated: they only trigger a progress check of
+    the corresponding jobs.
+    """
+
+    authentication_classes = ()
+    permission_classes = ()
+
+    def create(self, request):
+        if settings.TRANSCODING_MONITORING != "notifications":
+            raise Http404
+        for job_id in backend.get().parse_notification(request):
+            send_task("check_transcoding_job", args=(job_id,))
+        return Response(status=rest_status.HTTP_204_NO_CONTENT)
+
+
 class ErrorResponse(Exception):
     def __init__(self, response_data, status=None):
         super(ErrorResponse, self).__init__(response_data, status)
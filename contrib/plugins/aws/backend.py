@@ -1,12 +1,22 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from tempfile import NamedTemporaryFile
+from time import time
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from botocore.signers import CloudFrontSigner
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 import pipeline.backend
 import pipeline.utils
-from pipeline.exceptions import TranscodingFailed
+from pipeline.cache import LocalCache
+from pipeline.exceptions import StorageDeletionFailed, TranscodingFailed
 
 
 class Backend(pipeline.backend.BaseBackend):
@@ -14,11 +24,37 @@ class Backend(pipeline.backend.BaseBackend):
     VIDEO_KEY_PATTERN = VIDEO_FOLDER_KEY_PATTERN + "{resolution}.mp4"
     SUBTITLE_BASE_KEY_PATTERN = VIDEO_FOLDER_KEY_PATTERN + "subs/{subtitle_id}."
     SUBTITLE_KEY_PATTERN = SUBTITLE_BASE_KEY_PATTERN + "{language}.vtt"
+    STREAMING_FOLDER_KEY_PATTERN = VIDEO_FOLDER_KEY_PATTERN + "{kind}/"
+    # Adaptive streaming renditions are stored in the streaming folder, along
+    # with their master playlist, named "index.<extension>"
+    MANIFEST_NAME = "index"
+    # Elastic Transcoder playlist format and extension of each streaming kind
+    STREAMING_PLAYLIST_FORMATS = {
+        "hls": ("HLSv3", "m3u8"),
+        "dash": ("MPEG-DASH", "mpd"),
+    }
+    # Maximum number of keys per DeleteObjects request
+    DELETE_OBJECTS_BATCH_SIZE = 1000
 
     def __init__(self):
+        if settings.ELASTIC_TRANSCODER_STREAMING_PRESETS and (
+            self._signs_cloudfront_urls() or settings.S3_SIGNED_URLS
+        ):
+            # Only master playlists would be signed: the variant playlists and
+            # segments they reference would fail to load.
+            raise ImproperlyConfigured(
+                "Adaptive streaming formats cannot be served with signed urls"
+            )
         self._session = None
         self._s3_client = None
         self._elastictranscoder_client = None
+        self._sns_client = None
+        self._cloudfront_signer = None
+        # Signed urls of the current and previous signature periods
+        self._signed_urls = LocalCache(max_size_setting="SIGNED_URL_CACHE_SIZE")
+        # Boto3 sessions are not thread-safe, but clients are: clients are
+        # created once and then shared by all threads.
+        self._clients_lock = threading.RLock()
 
     @property
     def session(self):
@@ -26,26 +62,80 @@ class Backend(pipeline.backend.BaseBackend):
         Boto3 authenticated session
         """
         if self._session is None:
-            self._session = boto3.Session(
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            )
+            with self._clients_lock:
+                if self._session is None:
+                    self._session = boto3.Session(
+                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    )
         return self._session
 
+    def _create_client(self, service_name):
+        config = Config(
+            # Concurrent uploads should not wait for a connection
+            max_pool_connections=max(10, settings.S3_UPLOAD_CONCURRENCY),
+            retries={"max_attempts": settings.AWS_MAX_ATTEMPTS},
+        )
+        with self._clients_lock:
+            return self.session.client(
+                service_name, region_name=settings.AWS_REGION, config=config
+            )
+
     @property
     def s3_client(self):
         if self._s3_client is None:
-            self._s3_client = self.session.client("s3", region_name=settings.AWS_REGION)
+            with self._clients_lock:
+                if self._s3_client is None:
+                    self._s3_client = self._create_client("s3")
         return self._s3_client
 
     @property
     def elastictranscoder_client(self):
         if self._elastictranscoder_client is None:
-            self._elastictranscoder_client = self.session.client(
-                "elastictranscoder", region_name=settings.AWS_REGION
-            )
+            with self._clients_lock:
+                if self._elastictranscoder_client is None:
+                    self._elastictranscoder_client = self._create_client(
+                        "elastictranscoder"
+                    )
         return self._elastictranscoder_client
 
+    @property
+    def sns_client(self):
+        if self._sns_client is None:
+            with self._clients_lock:
+                if self._sns_client is None:
+                    self._sns_client = self._create_client("sns")
+        return self._sns_client
+
+    @property
+    def cloudfront_signer(self):
+        """
+        Signer of CloudFront urls, with the private key of the
+        CLOUDFRONT_KEY_PAIR_ID key pair. Requires cryptography.
+        """
+        if self._cloudfront_signer is None:
+            with self._clients_lock:
+                if self._cloudfront_signer is None:
+                    self._cloudfront_signer = self._create_cloudfront_signer()
+        return self._cloudfront_signer
+
+    @staticmethod
+    def _create_cloudfront_signer():
+        # pylint: disable=import-outside-toplevel
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        with open(settings.CLOUDFRONT_PRIVATE_KEY_FILE, "rb") as key_file:
+            private_key = serialization.load_pem_private_key(
+                key_file.read(), password=None, backend=default_backend()
+            )
+
+        def rsa_signer(message):
+            return private_key.sign(message, padding.PKCS1v15(), hashes.SHA1())
+
+        return CloudFrontSigner(settings.CLOUDFRONT_KEY_PAIR_ID, rsa_signer)
+
     @classmethod
     def get_video_folder_key(cls, video_id):
         """
@@ -66,6 +156,17 @@ class Backend(pipeline.backend.BaseBackend):
             video_id=video_id, subtitle_id=subtitle_id, language=language
         )
 
+    @classmethod
+    def get_streaming_folder_key(cls, video_id, kind):
+        return cls.STREAMING_FOLDER_KEY_PATTERN.format(video_id=video_id, kind=kind)
+
+    @classmethod
+    def get_manifest_key(cls, video_id, kind):
+        _playlist_format, extension = cls.STREAMING_PLAYLIST_FORMATS[kind]
+        return "{}{}.{}".format(
+            cls.get_streaming_folder_key(video_id, kind), cls.MANIFEST_NAME, extension
+        )
+
     @classmethod
     def get_thumbnail_key(cls, video_id, thumb_id, ext="jpg"):
         return cls.get_video_folder_key(video_id) + "thumbs/{}.{}".format(thumb_id, ext)
@@ -97,14 +198,34 @@ class Backend(pipeline.backend.BaseBackend):
 
     def _get_default_acl(self):
         """
-        If we are using a CDN, then objects are stored with private ACL by
-        default. Else, with public-read ACL.
+        If we are using a CDN, or signed S3 urls, then objects are stored with
+        private ACL by default. Else, with public-read ACL.
         """
-        if hasattr(settings, "CLOUDFRONT_DOMAIN_NAME"):
+        if hasattr(settings, "CLOUDFRONT_DOMAIN_NAME") or settings.S3_SIGNED_URLS:
             return "private"
         else:
             return "public-read"
 
+    def _signs_cloudfront_urls(self):
+        return bool(
+            getattr(settings, "CLOUDFRONT_DOMAIN_NAME", None)
+            and settings.CLOUDFRONT_KEY_PAIR_ID
+        )
+
+    def _sign_url(self, url, expires_at):
+        if self._signs_cloudfront_urls():
+            return self.cloudfront_signer.generate_presigned_url(
+                url, date_less_than=datetime.utcfromtimestamp(expires_at)
+            )
+        base_url = self._get_download_base_url() + "/"
+        if not url.startswith(base_url):
+            return url
+        return self.s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": settings.S3_BUCKET, "Key": url[len(base_url) :]},
+            ExpiresIn=int(expires_at - time()),
+        )
+
     ####################
     # Overridden methods
     ####################
@@ -115,11 +236,73 @@ class Backend(pipeline.backend.BaseBackend):
         """
         # Source videos do not need to be accessible
         acl = "private"
-        self.s3_client.put_object(
-            ACL=acl,
+        # Large files are uploaded in parts, concurrently. Failed parts are
+        # retried by the client.
+        self.s3_client.upload_fileobj(
+            file_object,
+            settings.S3_PRIVATE_BUCKET,
+            self.get_video_folder_key(public_video_id) + "src/" + file_object.name,
+            ExtraArgs={"ACL": acl},
+            Config=TransferConfig(
+                multipart_threshold=settings.S3_UPLOAD_PART_SIZE,
+                multipart_chunksize=settings.S3_UPLOAD_PART_SIZE,
+                max_concurrency=settings.S3_UPLOAD_CONCURRENCY,
+            ),
+        )
+
+    def create_upload(self, public_video_id, file_name):
+        key = self.get_video_folder_key(public_video_id) + "src/" + file_name
+        response = self.s3_client.create_multipart_upload(
+            ACL="private", Bucket=settings.S3_PRIVATE_BUCKET, Key=key
+        )
+        return {"Key": key, "UploadId": response["UploadId"]}
+
+    def get_upload_part_url(self, upload, part_number, expires_in):
+        return self.s3_client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": settings.S3_PRIVATE_BUCKET,
+                "Key": upload["Key"],
+                "UploadId": upload["UploadId"],
+                "PartNumber": part_number,
+            },
+            ExpiresIn=expires_in,
+        )
+
+    def upload_part(self, upload, part_number, file_object, size):
+        self.s3_client.upload_part(
             Body=file_object,
             Bucket=settings.S3_PRIVATE_BUCKET,
-            Key=self.get_video_folder_key(public_video_id) + "src/" + file_object.name,
+            ContentLength=size,
+            Key=upload["Key"],
+            PartNumber=part_number,
+            UploadId=upload["UploadId"],
+        )
+
+    def complete_upload(self, upload):
+        # Uploaded parts are listed from S3, such that clients do not need to
+        # keep track of the part ETags.
+        parts = []
+        paginator = self.s3_client.get_paginator("list_parts")
+        for page in paginator.paginate(
+            Bucket=settings.S3_PRIVATE_BUCKET,
+            Key=upload["Key"],
+            UploadId=upload["UploadId"],
+        ):
+            for part in page.get("Parts", []):
+                parts.append({"PartNumber": part["PartNumber"], "ETag": part["ETag"]})
+        self.s3_client.complete_multipart_upload(
+            Bucket=settings.S3_PRIVATE_BUCKET,
+            Key=upload["Key"],
+            UploadId=upload["UploadId"],
+            MultipartUpload={"Parts": parts},
+        )
+
+    def abort_upload(self, upload):
+        self.s3_client.abort_multipart_upload(
+            Bucket=settings.S3_PRIVATE_BUCKET,
+            Key=upload["Key"],
+            UploadId=upload["UploadId"],
         )
 
     def start_transcoding(self, public_video_id, video_path=""):
@@ -155,8 +338,86 @@ class Backend(pipeline.backend.BaseBackend):
             )
             jobs.append(job["Job"])
 
+        # Adaptive streaming jobs are started after the progressive file jobs,
+        # in the same order as their formats are yielded by `iter_formats`
+        for kind, presets in sorted(
+            settings.ELASTIC_TRANSCODER_STREAMING_PRESETS.items()
+        ):
+            jobs.append(
+                self._create_streaming_job(public_video_id, src_file_key, kind, presets)
+            )
+
         return jobs
 
+    def _create_streaming_job(self, public_video_id, src_file_key, kind, presets):
+        """
+        Create a single job that transcodes the segmented renditions of all
+        presets, along with their master playlist.
+        """
+        playlist_format, _extension = self.STREAMING_PLAYLIST_FORMATS[kind]
+        job = self.elastictranscoder_client.create_job(
+            PipelineId=settings.ELASTIC_TRANSCODER_PIPELINE_ID,
+            Input={"Key": src_file_key},
+            OutputKeyPrefix=self.get_streaming_folder_key(public_video_id, kind),
+            Outputs=[
+                {
+                    "Key": name,
+                    "PresetId": preset_id,
+                    "SegmentDuration": settings.ELASTIC_TRANSCODER_SEGMENT_DURATION,
+                }
+                for name, preset_id, _bitrate in presets
+            ],
+            Playlists=[
+                {
+                    "Name": self.MANIFEST_NAME,
+                    "Format": playlist_format,
+                    "OutputKeys": [name for name, _preset_id, _bitrate in presets],
+                }
+            ],
+        )
+        return job["Job"]
+
+    @staticmethod
+    def _is_streaming_job(job):
+        return bool(job.get("Playlists"))
+
+    def get_job_id(self, job):
+        return job["Id"]
+
+    def parse_notification(self, request):
+        """
+        Parse SNS messages sent by the Elastic Transcoder pipeline. Subscription
+        confirmation requests are automatically confirmed, but only for the
+        ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN topic.
+        """
+        message_type = request.META.get("HTTP_X_AMZ_SNS_MESSAGE_TYPE")
+        try:
+            payload = json.loads(request.body.decode("utf-8"))
+        except ValueError:
+            return []
+
+        topic_arn = getattr(
+            settings, "ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN", None
+        )
+        if topic_arn and payload.get("TopicArn") != topic_arn:
+            return []
+
+        if message_type == "SubscriptionConfirmation":
+            if not topic_arn:
+                # Never subscribe to arbitrary topics
+                return []
+            self.sns_client.confirm_subscription(
+                TopicArn=payload["TopicArn"], Token=payload["Token"]
+            )
+        elif message_type == "Notification":
+            try:
+                message = json.loads(payload["Message"])
+            except (KeyError, ValueError):
+                return []
+            if "jobId" in message:
+                return [message["jobId"]]
+        return []
+
     def _get_job_update(self, job):
         job_id = job["Id"]
         job_update = self.elastictranscoder_client.read_job(Id=job_id)
@@ -165,20 +426,34 @@ class Backend(pipeline.backend.BaseBackend):
     def check_progress(self, job):
         job_update = self._get_job_update(job)
         job_status = job_update["Job"]["Output"]["Status"]
+        if self._is_streaming_job(job_update["Job"]):
+            # The status of jobs with multiple outputs is the job status
+            job_status = job_update["Job"]["Status"]
         if job_status == "Submitted" or job_status == "Progressing":
             # Elastic Transcoder does not provide any indicator of the time left
-            return 0.0, False
+            return pipeline.backend.JobProgress(0.0, False)
         elif job_status == "Complete":
-            return 100.0, True
+            return pipeline.backend.JobProgress(
+                100.0, True, self._get_job_info(job_update)
+            )
         elif job_status == "Error":
-            error_message = job_update["Job"]["Output"]["StatusDetail"]
+            if self._is_streaming_job(job_update["Job"]):
+                error_message = "\n".join(
+                    output["StatusDetail"]
+                    for output in job_update["Job"]["Outputs"]
+                    if output.get("StatusDetail")
+                )
+            else:
+                error_message = job_update["Job"]["Output"]["StatusDetail"]
             raise TranscodingFailed(error_message)
         else:
             raise TranscodingFailed("Unknown transcoding status: {}".format(job_status))
 
     def get_job_info(self, job) -> pipeline.backend.JobInfo:
-        job_update = self._get_job_update(job)
+        return self._get_job_info(self._get_job_update(job))
 
+    @staticmethod
+    def _get_job_info(job_update) -> pipeline.backend.JobInfo:
         return pipeline.backend.JobInfo(
             width=job_update["Job"]["Output"]["Width"],
             height=job_update["Job"]["Output"]["Height"],
@@ -201,23 +476,127 @@ class Backend(pipeline.backend.BaseBackend):
         """
         Recursively delete all objects with the given prefix. This can be used
         to delete an entire folder. Objects are deleted both from the public
-        and the private bucket.
+        and the private bucket, concurrently.
+        """
+        buckets = set([settings.S3_BUCKET, settings.S3_PRIVATE_BUCKET])
+        with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+            futures = [
+                executor.submit(self.delete_bucket_objects, bucket, prefix)
+                for bucket in buckets
+            ]
+        for future in futures:
+            future.result()
+
+    def delete_bucket_objects(self, bucket, prefix):
         """
-        for bucket in [settings.S3_BUCKET, settings.S3_PRIVATE_BUCKET]:
-            list_objects = self.s3_client.list_objects(Bucket=bucket, Prefix=prefix)
-            for obj in list_objects.get("Contents", []):
-                self.s3_client.delete_object(Bucket=bucket, Key=obj["Key"])
+        Delete all objects with the given prefix from a single bucket, in
+        batches of at most 1000 objects per request.
 
-    def iter_formats(self, public_video_id):
-        for resolution, _preset_id, bitrate in settings.ELASTIC_TRANSCODER_PRESETS:
-            try:
-                self.s3_client.head_object(
-                    Bucket=settings.S3_BUCKET,
-                    Key=self.get_video_key(public_video_id, resolution),
+        Raises:
+            StorageDeletionFailed in case some objects could not be deleted.
+        """
+        errors = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            for start in range(0, len(keys), self.DELETE_OBJECTS_BATCH_SIZE):
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket,
+                    Delete={
+                        "Objects": keys[start : start + self.DELETE_OBJECTS_BATCH_SIZE],
+                        "Quiet": True,
+                    },
+                )
+                errors += response.get("Errors", [])
+        if errors:
+            raise StorageDeletionFailed(
+                "Could not delete {} objects from bucket {}: {}".format(
+                    len(errors),
+                    bucket,
+                    ", ".join(
+                        "{} ({})".format(error.get("Key"), error.get("Code"))
+                        for error in errors[:10]
+                    ),
+                )
+            )
+
+    def iter_formats(self, public_video_id, jobs=None):
+        file_jobs = streaming_jobs = None
+        if jobs is not None:
+            file_jobs = [job for job in jobs if not self._is_streaming_job(job)]
+            streaming_jobs = [job for job in jobs if self._is_streaming_job(job)]
+        yield from self.iter_preset_formats(
+            public_video_id, settings.ELASTIC_TRANSCODER_PRESETS, jobs=file_jobs
+        )
+        yield from self.iter_streaming_formats(public_video_id, jobs=streaming_jobs)
+
+    def iter_streaming_formats(self, public_video_id, jobs=None):
+        """
+        Iterate on the adaptive streaming formats that were transcoded for this
+        video. As for `iter_preset_formats`, formats are derived from the
+        transcoding jobs, when they are known, and the master playlists are
+        otherwise found on S3.
+        """
+        if jobs is not None:
+            playlist_formats = set(
+                playlist["Format"] for job in jobs for playlist in job["Playlists"]
+            )
+        for kind, presets in sorted(
+            settings.ELASTIC_TRANSCODER_STREAMING_PRESETS.items()
+        ):
+            if jobs is not None:
+                playlist_format, _extension = self.STREAMING_PLAYLIST_FORMATS[kind]
+                if playlist_format not in playlist_formats:
+                    continue
+            if jobs is None or settings.ELASTIC_TRANSCODER_VERIFY_OUTPUTS:
+                manifest_key = self.get_manifest_key(public_video_id, kind)
+                list_objects = self.s3_client.list_objects_v2(
+                    Bucket=settings.S3_BUCKET, Prefix=manifest_key
                 )
-            except ClientError:
-                continue
-            yield resolution, bitrate
+                if not list_objects.get("KeyCount"):
+                    continue
+            # The bitrate of a streaming format is its maximum bitrate
+            yield pipeline.backend.Format(
+                kind.upper(), max(bitrate for _name, _id, bitrate in presets), kind
+            )
+
+    def iter_preset_formats(self, public_video_id, presets, jobs=None):
+        """
+        Iterate on the formats of the given presets that were transcoded for
+        this video. When the transcoding jobs are known, formats are derived
+        from the job outputs. Otherwise, or if
+        ELASTIC_TRANSCODER_VERIFY_OUTPUTS is true, transcoded files are found
+        with a single listing of the video folder.
+        """
+        formats = {
+            self.get_video_key(public_video_id, resolution): (resolution, bitrate)
+            for resolution, _preset_id, bitrate in presets
+        }
+        if jobs is None:
+            keys = list(formats.keys())
+        else:
+            keys = [job["Output"]["Key"] for job in jobs]
+            keys = [key for key in keys if key in formats]
+
+        if jobs is None or settings.ELASTIC_TRANSCODER_VERIFY_OUTPUTS:
+            existing_keys = self.list_video_folder_keys(public_video_id)
+            keys = [key for key in keys if key in existing_keys]
+
+        for key in keys:
+            yield formats[key]
+
+    def list_video_folder_keys(self, public_video_id):
+        """
+        Return the set of keys of the transcoded files, which are stored at the
+        root of the video folder in the public bucket. Sub-folders are not
+        listed.
+        """
+        list_objects = self.s3_client.list_objects_v2(
+            Bucket=settings.S3_BUCKET,
+            Prefix=self.get_video_folder_key(public_video_id),
+            Delimiter="/",
+        )
+        return set(obj["Key"] for obj in list_objects.get("Contents", []))
 
     def upload_subtitle(self, video_id, subtitle_id, language_code, content):
         self.s3_client.put_object(
@@ -285,3 +664,29 @@ class Backend(pipeline.backend.BaseBackend):
             + "/"
             + self.get_thumbnail_key(video_id, thumb_id)
         )
+
+    def manifest_url(self, video_id, kind):
+        return (
+            self._get_download_base_url() + "/" + self.get_manifest_key(video_id, kind)
+        )
+
+    def get_url_signature_period(self):
+        if not (self._signs_cloudfront_urls() or settings.S3_SIGNED_URLS):
+            return None
+        return int(time() // settings.SIGNED_URL_TIMEOUT)
+
+    def sign_url(self, url):
+        """
+        Signed urls expire at the end of the signature period that follows the
+        current one: they are valid for SIGNED_URL_TIMEOUT seconds at least,
+        and they are generated once per period.
+        """
+        period = self.get_url_signature_period()
+        if period is None or not url:
+            return url
+        signed_url = self._signed_urls.get((url, period))
+        if signed_url is None:
+            expires_at = (period + 2) * settings.SIGNED_URL_TIMEOUT
+            signed_url = self._sign_url(url, expires_at)
+            self._signed_urls.set((url, period), signed_url)
+        return signed_url
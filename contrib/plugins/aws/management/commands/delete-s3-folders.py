@@ -1,4 +1,6 @@
-from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
 
 from contrib.plugins.aws.backend import Backend
 
@@ -8,8 +10,34 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("folders", nargs="+", help="Folder names")
+        parser.add_argument(
+            "-p",
+            "--parallel",
+            type=int,
+            default=1,
+            help="Number of folders to delete concurrently",
+        )
 
     def handle(self, *args, **options):
         backend = Backend()
-        for folder in options["folders"]:
-            backend.delete_objects(folder)
+        folders = options["folders"]
+        failed = []
+
+        def delete(folder):
+            try:
+                backend.delete_objects(folder)
+            except Exception as e:  # pylint: disable=broad-except
+                self.stderr.write("{}: {}".format(folder, e))
+                failed.append(folder)
+            else:
+                self.stdout.write("{}: deleted".format(folder))
+
+        with ThreadPoolExecutor(max_workers=max(options["parallel"], 1)) as executor:
+            list(executor.map(delete, folders))
+
+        if failed:
+            raise CommandError(
+                "Failed to delete {} folders out of {}".format(
+                    len(failed), len(folders)
+                )
+            )
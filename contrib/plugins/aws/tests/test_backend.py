@@ -1,9 +1,13 @@
+import json
 import shutil
 from io import BytesIO
+from time import time
 from unittest.mock import Mock, patch
 
-from botocore.exceptions import ClientError
-from django.test import TestCase
+from botocore.signers import CloudFrontSigner
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase
 from django.test.utils import override_settings
 
 import pipeline.backend
@@ -17,45 +21,131 @@ from . import utils
 
 @utils.override_s3_settings
 class VideoUploadUrlTests(TestCase):
+    @override_settings(S3_UPLOAD_PART_SIZE=1024 * 1024 * 8, S3_UPLOAD_CONCURRENCY=4)
     def test_upload_video(self):
         backend = aws_backend.Backend()
-        backend._s3_client = Mock(put_object=Mock())
+        backend._s3_client = Mock(upload_fileobj=Mock())
         file_object = Mock()
         file_object.name = "somevideo.mp4"
 
         backend.upload_video("videoid", file_object)
 
-        backend.s3_client.put_object.assert_called_once()
-        self.assertEqual("private", backend.s3_client.put_object.call_args[1]["ACL"])
+        backend.s3_client.upload_fileobj.assert_called_once()
+        args, kwargs = backend.s3_client.upload_fileobj.call_args
         self.assertEqual(
-            "videos/videoid/src/somevideo.mp4",
-            backend.s3_client.put_object.call_args[1]["Key"],
+            (file_object, "privates3bucket", "videos/videoid/src/somevideo.mp4"), args
         )
+        self.assertEqual({"ACL": "private"}, kwargs["ExtraArgs"])
+        self.assertEqual(1024 * 1024 * 8, kwargs["Config"].multipart_chunksize)
+        self.assertEqual(4, kwargs["Config"].max_concurrency)
+
+    @override_settings(S3_UPLOAD_CONCURRENCY=16)
+    def test_client_config(self):
+        backend = aws_backend.Backend()
+        self.assertEqual(16, backend.s3_client.meta.config.max_pool_connections)
+
+    def test_direct_upload(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            create_multipart_upload=Mock(return_value={"UploadId": "uploadid"}),
+            get_paginator=Mock(
+                return_value=Mock(
+                    paginate=Mock(
+                        return_value=[
+                            {"Parts": [{"PartNumber": 1, "ETag": "etag1"}]},
+                            {"Parts": [{"PartNumber": 2, "ETag": "etag2"}]},
+                        ]
+                    )
+                )
+            ),
+        )
+
+        upload = backend.create_upload("videoid", "somevideo.mp4")
+        backend.complete_upload(upload)
+
         self.assertEqual(
-            "privates3bucket", backend.s3_client.put_object.call_args[1]["Bucket"]
+            {"Key": "videos/videoid/src/somevideo.mp4", "UploadId": "uploadid"}, upload
+        )
+        backend.s3_client.create_multipart_upload.assert_called_once_with(
+            ACL="private",
+            Bucket="privates3bucket",
+            Key="videos/videoid/src/somevideo.mp4",
+        )
+        backend.s3_client.complete_multipart_upload.assert_called_once_with(
+            Bucket="privates3bucket",
+            Key="videos/videoid/src/somevideo.mp4",
+            UploadId="uploadid",
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": 1, "ETag": "etag1"},
+                    {"PartNumber": 2, "ETag": "etag2"},
+                ]
+            },
         )
 
     def test_delete_video_no_content(self):
         backend = aws_backend.Backend()
-        backend._s3_client = Mock(list_objects=Mock(return_value={}))
+        paginator = Mock(paginate=Mock(return_value=[{}]))
+        backend._s3_client = Mock(get_paginator=Mock(return_value=paginator))
         backend.delete_video("videoid")
 
-        backend.s3_client.list_objects.assert_any_call(
+        backend.s3_client.get_paginator.assert_called_with("list_objects_v2")
+        paginator.paginate.assert_any_call(
             Bucket="privates3bucket", Prefix="videos/videoid/"
         )
-        backend.s3_client.list_objects.assert_any_call(
+        paginator.paginate.assert_any_call(
             Bucket="publics3bucket", Prefix="videos/videoid/"
         )
+        backend.s3_client.delete_objects.assert_not_called()
 
     def test_delete_subtitle(self):
         backend = aws_backend.Backend()
-        backend._s3_client = Mock(list_objects=Mock(return_value={}))
+        paginator = Mock(paginate=Mock(return_value=[{}]))
+        backend._s3_client = Mock(get_paginator=Mock(return_value=paginator))
         backend.delete_subtitle("videoid", "subid")
 
-        backend.s3_client.list_objects.assert_any_call(
+        paginator.paginate.assert_any_call(
             Bucket="publics3bucket", Prefix="videos/videoid/subs/subid."
         )
 
+    @override_settings(S3_PRIVATE_BUCKET="publics3bucket")
+    def test_delete_objects_batches(self):
+        backend = aws_backend.Backend()
+        pages = [
+            {"Contents": [{"Key": "key{}".format(i)} for i in range(1000)]},
+            {"Contents": [{"Key": "key{}".format(i)} for i in range(1000, 1500)]},
+        ]
+        backend._s3_client = Mock(
+            get_paginator=Mock(return_value=Mock(paginate=Mock(return_value=pages))),
+            delete_objects=Mock(return_value={}),
+        )
+        backend.delete_objects("videos/videoid/")
+
+        self.assertEqual(2, backend.s3_client.delete_objects.call_count)
+        calls = backend.s3_client.delete_objects.call_args_list
+        self.assertEqual(1000, len(calls[0][1]["Delete"]["Objects"]))
+        self.assertEqual(500, len(calls[1][1]["Delete"]["Objects"]))
+        self.assertEqual({"Key": "key1000"}, calls[1][1]["Delete"]["Objects"][0])
+
+    def test_delete_objects_errors(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            get_paginator=Mock(
+                return_value=Mock(
+                    paginate=Mock(return_value=[{"Contents": [{"Key": "key"}]}])
+                )
+            ),
+            delete_objects=Mock(
+                return_value={"Errors": [{"Key": "key", "Code": "AccessDenied"}]}
+            ),
+        )
+
+        self.assertRaises(
+            pipeline.exceptions.StorageDeletionFailed,
+            backend.delete_objects,
+            "videos/videoid/",
+        )
+
     @override_settings(PLUGIN_BACKEND="contrib.plugins.aws.backend.Backend")
     def test_video_url(self):
         backend = pipeline.backend.get()
@@ -74,6 +164,75 @@ class VideoUploadUrlTests(TestCase):
             "https://cloudfrontid.cloudfront.net/videos/videoid/SD.mp4", url
         )
 
+    @override_settings(
+        PLUGIN_BACKEND="contrib.plugins.aws.backend.Backend",
+        CLOUDFRONT_DOMAIN_NAME="cloudfrontid.cloudfront.net",
+    )
+    def test_manifest_url(self):
+        backend = pipeline.backend.get()
+        self.assertEqual(
+            "https://cloudfrontid.cloudfront.net/videos/videoid/hls/index.m3u8",
+            backend.manifest_url("videoid", "hls"),
+        )
+        self.assertEqual(
+            "https://cloudfrontid.cloudfront.net/videos/videoid/dash/index.mpd",
+            backend.manifest_url("videoid", "dash"),
+        )
+
+
+@utils.override_s3_settings
+@override_settings(PLUGIN_BACKEND="contrib.plugins.aws.backend.Backend")
+class SignedUrlTests(TestCase):
+    def test_unsigned_urls(self):
+        backend = pipeline.backend.get()
+        url = backend.video_url("videoid", "SD")
+
+        self.assertIsNone(backend.get_url_signature_period())
+        self.assertEqual(url, backend.sign_url(url))
+
+    @override_settings(S3_SIGNED_URLS=True)
+    def test_presigned_s3_urls(self):
+        backend = pipeline.backend.get()
+        signed_url = backend.sign_url(backend.video_url("videoid", "SD"))
+
+        self.assertIn("publics3bucket", signed_url)
+        self.assertIn("videos/videoid/SD.mp4", signed_url)
+        self.assertIn("Signature=", signed_url)
+        self.assertEqual("private", backend._get_default_acl())
+
+    @override_settings(
+        CLOUDFRONT_DOMAIN_NAME="cloudfrontid.cloudfront.net",
+        CLOUDFRONT_KEY_PAIR_ID="KEYPAIRID",
+    )
+    def test_signed_cloudfront_urls(self):
+        backend = pipeline.backend.get()
+        rsa_signer = Mock(return_value=b"signature")
+        backend._cloudfront_signer = CloudFrontSigner("KEYPAIRID", rsa_signer)
+        url = backend.video_url("videoid", "SD")
+
+        signed_url = backend.sign_url(url)
+
+        self.assertTrue(signed_url.startswith(url + "?Expires="))
+        self.assertIn("Key-Pair-Id=KEYPAIRID", signed_url)
+        # Signed urls are cached during each signature period
+        self.assertEqual(signed_url, backend.sign_url(url))
+        rsa_signer.assert_called_once()
+        with patch(
+            "contrib.plugins.aws.backend.time",
+            return_value=time() + settings.SIGNED_URL_TIMEOUT,
+        ):
+            self.assertNotEqual(signed_url, backend.sign_url(url))
+        self.assertEqual(2, rsa_signer.call_count)
+
+    @override_settings(
+        S3_SIGNED_URLS=True,
+        ELASTIC_TRANSCODER_STREAMING_PRESETS={
+            "hls": [("1M", "1351620000001-200030", 1000)]
+        },
+    )
+    def test_signed_urls_with_streaming_formats(self):
+        self.assertRaises(ImproperlyConfigured, aws_backend.Backend)
+
 
 @utils.override_s3_settings
 class TranscodeTests(TestCase):
@@ -155,9 +314,12 @@ class TranscodeTests(TestCase):
             read_job=Mock(return_value=read_job_fixture)
         )
 
-        progress, finished = backend.check_progress(job["Job"])
-        self.assertEqual(100, progress)
-        self.assertTrue(finished)
+        job_progress = backend.check_progress(job["Job"])
+        self.assertEqual(100, job_progress.progress)
+        self.assertTrue(job_progress.finished)
+        self.assertEqual(
+            read_job_fixture["Job"]["Output"]["Width"], job_progress.info.width
+        )
         backend.elastictranscoder_client.read_job.assert_called_once_with(
             Id="jobid"  # job id in test fixture
         )
@@ -186,20 +348,228 @@ class TranscodeTests(TestCase):
         jobs = backend.start_transcoding("videoid")
         backend.check_progress(jobs[0])
 
+    def test_get_job_id(self):
+        job = utils.load_json_fixture("elastictranscoder_create_job.json")
+        backend = aws_backend.Backend()
+        self.assertEqual("jobid", backend.get_job_id(job["Job"]))
+
+    def test_parse_notification(self):
+        backend = aws_backend.Backend()
+        request = RequestFactory().post(
+            "/",
+            data=json.dumps(
+                {
+                    "Type": "Notification",
+                    "TopicArn": "arn:aws:sns:topic",
+                    "Message": json.dumps({"state": "COMPLETED", "jobId": "jobid"}),
+                }
+            ),
+            content_type="text/plain",
+            HTTP_X_AMZ_SNS_MESSAGE_TYPE="Notification",
+        )
+
+        self.assertEqual(["jobid"], backend.parse_notification(request))
+
+    @override_settings(ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN="arn:aws:sns:topic")
+    def test_parse_notification_from_other_topic(self):
+        backend = aws_backend.Backend()
+        request = RequestFactory().post(
+            "/",
+            data=json.dumps(
+                {
+                    "Type": "Notification",
+                    "TopicArn": "arn:aws:sns:othertopic",
+                    "Message": json.dumps({"state": "COMPLETED", "jobId": "jobid"}),
+                }
+            ),
+            content_type="text/plain",
+            HTTP_X_AMZ_SNS_MESSAGE_TYPE="Notification",
+        )
+
+        self.assertEqual([], backend.parse_notification(request))
+
+    @override_settings(ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN="arn:aws:sns:topic")
+    def test_parse_subscription_confirmation(self):
+        backend = aws_backend.Backend()
+        backend._sns_client = Mock(confirm_subscription=Mock())
+        request = RequestFactory().post(
+            "/",
+            data=json.dumps(
+                {
+                    "Type": "SubscriptionConfirmation",
+                    "TopicArn": "arn:aws:sns:topic",
+                    "Token": "token",
+                }
+            ),
+            content_type="text/plain",
+            HTTP_X_AMZ_SNS_MESSAGE_TYPE="SubscriptionConfirmation",
+        )
+
+        self.assertEqual([], backend.parse_notification(request))
+        backend.sns_client.confirm_subscription.assert_called_once_with(
+            TopicArn="arn:aws:sns:topic", Token="token"
+        )
+
+    @override_settings(ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN=None)
+    def test_parse_subscription_confirmation_without_topic(self):
+        backend = aws_backend.Backend()
+        backend._sns_client = Mock(confirm_subscription=Mock())
+        request = RequestFactory().post(
+            "/",
+            data=json.dumps(
+                {
+                    "Type": "SubscriptionConfirmation",
+                    "TopicArn": "arn:aws:sns:topic",
+                    "Token": "token",
+                }
+            ),
+            content_type="text/plain",
+            HTTP_X_AMZ_SNS_MESSAGE_TYPE="SubscriptionConfirmation",
+        )
+
+        self.assertEqual([], backend.parse_notification(request))
+        backend.sns_client.confirm_subscription.assert_not_called()
+
     @override_settings(
         ELASTIC_TRANSCODER_PRESETS=[("SD", "presetid1", 128), ("HD", "presetid2", 256)]
     )
     def test_iter_formats(self):
         backend = aws_backend.Backend()
-
-        def head_object(Bucket=None, Key=None):
-            if Key != "videos/videoid/HD.mp4":
-                raise ClientError({"Error": {}}, "head_object")
-
-        backend.s3_client.head_object = head_object
+        backend._s3_client = Mock(
+            list_objects_v2=Mock(
+                return_value={"Contents": [{"Key": "videos/videoid/HD.mp4"}]}
+            )
+        )
         formats = list(backend.iter_formats("videoid"))
 
         self.assertEqual([("HD", 256)], formats)
+        backend.s3_client.list_objects_v2.assert_called_once_with(
+            Bucket="publics3bucket", Prefix="videos/videoid/", Delimiter="/"
+        )
+
+    @override_settings(
+        ELASTIC_TRANSCODER_PRESETS=[("SD", "presetid1", 128), ("HD", "presetid2", 256)]
+    )
+    def test_iter_formats_from_jobs(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock()
+        jobs = [
+            {"Output": {"Key": "videos/videoid/HD.mp4"}},
+            {"Output": {"Key": "videos/videoid/SD.mp4"}},
+        ]
+        formats = list(backend.iter_formats("videoid", jobs=jobs))
+
+        self.assertEqual([("HD", 256), ("SD", 128)], formats)
+        backend.s3_client.list_objects_v2.assert_not_called()
+
+    @override_settings(
+        ELASTIC_TRANSCODER_PIPELINE_ID="pipelineid",
+        ELASTIC_TRANSCODER_PRESETS=[("SD", "presetid", 128)],
+        ELASTIC_TRANSCODER_STREAMING_PRESETS={
+            "hls": [("400k", "hlspresetid1", 400), ("1M", "hlspresetid2", 1000)]
+        },
+        ELASTIC_TRANSCODER_SEGMENT_DURATION="6",
+    )
+    def test_start_transcoding_with_streaming_formats(self):
+        create_job_fixture = utils.load_json_fixture(
+            "elastictranscoder_create_job.json"
+        )
+        backend = aws_backend.Backend()
+        backend._elastictranscoder_client = Mock(
+            create_job=Mock(return_value=create_job_fixture)
+        )
+
+        jobs = backend.start_transcoding("videoid", "videos/videoid/src/video.mpg")
+
+        self.assertEqual(2, len(jobs))
+        backend.elastictranscoder_client.create_job.assert_called_with(
+            PipelineId="pipelineid",
+            Input={"Key": "videos/videoid/src/video.mpg"},
+            OutputKeyPrefix="videos/videoid/hls/",
+            Outputs=[
+                {"Key": "400k", "PresetId": "hlspresetid1", "SegmentDuration": "6"},
+                {"Key": "1M", "PresetId": "hlspresetid2", "SegmentDuration": "6"},
+            ],
+            Playlists=[
+                {"Name": "index", "Format": "HLSv3", "OutputKeys": ["400k", "1M"]}
+            ],
+        )
+
+    @override_settings(
+        ELASTIC_TRANSCODER_PRESETS=[("SD", "presetid1", 128)],
+        ELASTIC_TRANSCODER_STREAMING_PRESETS={
+            "hls": [("400k", "hlspresetid1", 400), ("1M", "hlspresetid2", 1000)],
+            "dash": [("1M", "dashpresetid", 1000)],
+        },
+    )
+    def test_iter_streaming_formats_from_jobs(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock()
+        jobs = [
+            {"Output": {"Key": "videos/videoid/SD.mp4"}},
+            {"Output": {"Key": "400k"}, "Playlists": [{"Format": "HLSv3"}]},
+        ]
+        formats = list(backend.iter_formats("videoid", jobs=jobs))
+
+        self.assertEqual([("SD", 128), ("HLS", 1000, "hls")], formats)
+        backend.s3_client.list_objects_v2.assert_not_called()
+
+    @override_settings(
+        ELASTIC_TRANSCODER_PRESETS=[],
+        ELASTIC_TRANSCODER_STREAMING_PRESETS={"hls": [("1M", "hlspresetid", 1000)]},
+    )
+    def test_iter_streaming_formats_from_storage(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(list_objects_v2=Mock(return_value={"KeyCount": 1}))
+
+        formats = list(backend.iter_streaming_formats("videoid"))
+
+        self.assertEqual([("HLS", 1000, "hls")], formats)
+        backend.s3_client.list_objects_v2.assert_called_once_with(
+            Bucket="publics3bucket", Prefix="videos/videoid/hls/index.m3u8"
+        )
+
+    def test_check_progress_of_failed_streaming_job(self):
+        backend = aws_backend.Backend()
+        backend._elastictranscoder_client = Mock(
+            read_job=Mock(
+                return_value={
+                    "Job": {
+                        "Status": "Error",
+                        "Output": {"Status": "Complete"},
+                        "Outputs": [
+                            {"Status": "Complete"},
+                            {"Status": "Error", "StatusDetail": "error message"},
+                        ],
+                        "Playlists": [{"Format": "HLSv3"}],
+                    }
+                }
+            )
+        )
+
+        with self.assertRaises(pipeline.exceptions.TranscodingFailed) as context:
+            backend.check_progress({"Id": "jobid"})
+        self.assertEqual("error message", context.exception.args[0])
+
+    @override_settings(
+        ELASTIC_TRANSCODER_PRESETS=[("SD", "presetid1", 128), ("HD", "presetid2", 256)],
+        ELASTIC_TRANSCODER_VERIFY_OUTPUTS=True,
+    )
+    def test_iter_formats_from_jobs_with_verification(self):
+        backend = aws_backend.Backend()
+        backend._s3_client = Mock(
+            list_objects_v2=Mock(
+                return_value={"Contents": [{"Key": "videos/videoid/SD.mp4"}]}
+            )
+        )
+        jobs = [
+            {"Output": {"Key": "videos/videoid/SD.mp4"}},
+            {"Output": {"Key": "videos/videoid/HD.mp4"}},
+        ]
+        formats = list(backend.iter_formats("videoid", jobs=jobs))
+
+        self.assertEqual([("SD", 128)], formats)
+        backend.s3_client.list_objects_v2.assert_called_once()
 
 
 @utils.override_s3_settings
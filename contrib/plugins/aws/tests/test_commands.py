@@ -0,0 +1,38 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+import pipeline.exceptions
+
+
+class DeleteS3FoldersTests(TestCase):
+    @patch("contrib.plugins.aws.backend.Backend.delete_objects")
+    def test_delete_folders_in_parallel(self, delete_objects):
+        call_command(
+            "delete-s3-folders",
+            "videos/video1/",
+            "videos/video2/",
+            parallel=2,
+            stdout=StringIO(),
+        )
+
+        delete_objects.assert_any_call("videos/video1/")
+        delete_objects.assert_any_call("videos/video2/")
+
+    @patch("contrib.plugins.aws.backend.Backend.delete_objects")
+    def test_delete_folders_failure(self, delete_objects):
+        delete_objects.side_effect = [
+            None,
+            pipeline.exceptions.StorageDeletionFailed("error"),
+        ]
+        self.assertRaises(
+            CommandError,
+            call_command,
+            "delete-s3-folders",
+            "videos/video1/",
+            "videos/video2/",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
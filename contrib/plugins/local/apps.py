@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class ContribPluginsLocalConfig(AppConfig):
+    name = "contrib.plugins.local"
@@ -0,0 +1,709 @@
+import glob
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from time import sleep, time
+from uuid import uuid4
+
+import celery
+from django.conf import settings
+
+import pipeline.backend
+import pipeline.utils
+from pipeline.exceptions import TranscodingFailed
+
+from . import ffmpeg, tasks
+
+logger = logging.getLogger(__name__)
+
+
+class Backend(pipeline.backend.BaseBackend):
+    """
+    Store files on a local, or network-mounted, filesystem and transcode videos
+    with ffmpeg.
+
+    Transcoded files, subtitles and thumbnails are stored in LOCAL_STORAGE_ROOT,
+    which should be served at LOCAL_STORAGE_URL, with the same layout as the S3
+    public bucket of the AWS backend. Source files and transcoding progress files
+    are stored in LOCAL_PRIVATE_STORAGE_ROOT. Both folders must be shared by all
+    workers.
+
+    Each preset of LOCAL_TRANSCODING_PRESETS is transcoded by an ffmpeg process.
+    Processes are started by the worker that runs the transcode_video task, with
+    at most LOCAL_TRANSCODING_CONCURRENCY concurrent processes per worker. Their
+    progress is written to the private storage, such that it can be checked by
+    any worker.
+
+    Videos longer than twice LOCAL_TRANSCODING_CHUNK_DURATION are instead split
+    into chunks, which are transcoded in parallel by celery workers, and then
+    concatenated. See `start_chunked_transcoding`.
+    """
+
+    VIDEO_FOLDER_KEY_PATTERN = "videos/{video_id}/"
+    VIDEO_KEY_PATTERN = VIDEO_FOLDER_KEY_PATTERN + "{resolution}.mp4"
+    SUBTITLE_BASE_KEY_PATTERN = VIDEO_FOLDER_KEY_PATTERN + "subs/{subtitle_id}."
+    SUBTITLE_KEY_PATTERN = SUBTITLE_BASE_KEY_PATTERN + "{language}.vtt"
+    UPLOAD_FOLDER_KEY_PATTERN = "uploads/{upload_id}/"
+    # Position of the thumbnail frame, relative to the video duration
+    THUMBNAIL_POSITION = 0.1
+    COPY_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Progress files of the jobs that wait for an available process
+        self._queued_progress_paths = set()
+        self._queued_lock = threading.Lock()
+        self._heartbeat = None
+
+    @property
+    def executor(self):
+        """
+        Thread pool that runs and waits for the ffmpeg processes.
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.LOCAL_TRANSCODING_CONCURRENCY,
+                        thread_name_prefix="ffmpeg",
+                    )
+        return self._executor
+
+    @classmethod
+    def get_video_folder_key(cls, video_id):
+        return cls.VIDEO_FOLDER_KEY_PATTERN.format(video_id=video_id)
+
+    @classmethod
+    def get_video_key(cls, video_id, resolution):
+        return cls.VIDEO_KEY_PATTERN.format(video_id=video_id, resolution=resolution)
+
+    @classmethod
+    def get_subtitle_key(cls, video_id, subtitle_id, language):
+        return cls.SUBTITLE_KEY_PATTERN.format(
+            video_id=video_id, subtitle_id=subtitle_id, language=language
+        )
+
+    @classmethod
+    def get_thumbnail_key(cls, video_id, thumb_id, ext="jpg"):
+        return cls.get_video_folder_key(video_id) + "thumbs/{}.{}".format(thumb_id, ext)
+
+    @classmethod
+    def get_src_folder_key(cls, video_id):
+        return cls.get_video_folder_key(video_id) + "src/"
+
+    @classmethod
+    def get_job_file_key(cls, video_id, resolution, ext):
+        return cls.get_video_folder_key(video_id) + "jobs/{}.{}".format(resolution, ext)
+
+    @classmethod
+    def get_chunk_folder_key(cls, video_id, resolution="src"):
+        """
+        Folder of the source chunks, or of the transcoded chunks of a format.
+        """
+        return cls.get_video_folder_key(video_id) + "chunks/{}/".format(resolution)
+
+    @staticmethod
+    def get_path(key):
+        """
+        Path of a public file.
+        """
+        return os.path.join(settings.LOCAL_STORAGE_ROOT, key)
+
+    @staticmethod
+    def get_private_path(key):
+        return os.path.join(settings.LOCAL_PRIVATE_STORAGE_ROOT, key)
+
+    def get_src_file_path(self, public_video_id):
+        """
+        Find the source file of a video, whose name depends on the original
+        file name.
+
+        Returns None if no source file exists.
+        """
+        src_folder = self.get_private_path(self.get_src_folder_key(public_video_id))
+        try:
+            file_names = sorted(os.listdir(src_folder))
+        except FileNotFoundError:
+            return None
+        if file_names:
+            return os.path.join(src_folder, file_names[0])
+        return None
+
+    def get_progress_path(self, job):
+        return self.get_private_path(
+            self.get_job_file_key(job["video_id"], job["format"], "progress")
+        )
+
+    def get_error_path(self, job):
+        return self.get_private_path(
+            self.get_job_file_key(job["video_id"], job["format"], "error")
+        )
+
+    def get_output_path(self, job):
+        return self.get_path(self.get_video_key(job["video_id"], job["format"]))
+
+    def get_chunk_path(self, public_video_id, resolution, index, ext):
+        return self.get_private_path(
+            self.get_chunk_folder_key(public_video_id, resolution)
+            + "{:05d}.{}".format(index, ext)
+        )
+
+    def get_dispatch_marker_path(self, public_video_id):
+        """
+        Marker of the dispatch of the chord callback that concatenates chunks.
+        """
+        return self.get_private_path(
+            self.get_video_folder_key(public_video_id) + "chunks/dispatched"
+        )
+
+    def _get_url(self, key):
+        return settings.LOCAL_STORAGE_URL.rstrip("/") + "/" + key
+
+    @staticmethod
+    def _makedirs(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _write(self, path, file_object, size=None):
+        """
+        Copy a file object to the storage. If `size` is defined, at most `size`
+        bytes are read.
+        """
+        self._makedirs(path)
+        with open(path, "wb") as dst:
+            if size is None:
+                shutil.copyfileobj(file_object, dst, self.COPY_BUFFER_SIZE)
+                return
+            while size > 0:
+                data = file_object.read(min(size, self.COPY_BUFFER_SIZE))
+                if not data:
+                    break
+                dst.write(data)
+                size -= len(data)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_queued_marker(self, progress_path):
+        """
+        Write an empty progress file, which is overwritten by ffmpeg once the
+        job starts. Queued jobs are thus also subject to the stall timeout.
+        """
+        self._makedirs(progress_path)
+        with open(progress_path, "w"):
+            pass
+
+    def _submit_job(self, job, src_path, args):
+        progress_path = self.get_progress_path(job)
+        self._write_queued_marker(progress_path)
+        with self._queued_lock:
+            self._queued_progress_paths.add(progress_path)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(
+                    target=self._run_heartbeat, name="ffmpeg-heartbeat", daemon=True
+                )
+                self._heartbeat.start()
+        self.executor.submit(self._run_job, job, src_path, args)
+
+    def _run_heartbeat(self):
+        while True:
+            sleep(settings.LOCAL_TRANSCODING_STALL_TIMEOUT / 4)
+            self._touch_queued_markers()
+
+    def _touch_queued_markers(self):
+        """
+        Refresh the markers of the jobs that wait in the executor: they only
+        stall if this process is killed.
+        """
+        with self._queued_lock:
+            progress_paths = list(self._queued_progress_paths)
+        for progress_path in progress_paths:
+            try:
+                os.utime(progress_path)
+            except FileNotFoundError:
+                pass
+
+    def _run_job(self, job, src_path, args):
+        """
+        Run the ffmpeg process of a job. Errors are written to the job error
+        file, which is checked by `check_progress`.
+        """
+        with self._queued_lock:
+            self._queued_progress_paths.discard(self.get_progress_path(job))
+        output_path = self.get_output_path(job)
+        try:
+            self._makedirs(output_path)
+            ffmpeg.transcode(src_path, output_path, args, self.get_progress_path(job))
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error("Transcoding job %s failed: %s", job["id"], error)
+            self._write_error(self.get_error_path(job), error)
+
+    def _write_error(self, error_path, error):
+        message = error.args[0] if error.args else repr(error)
+        self._makedirs(error_path)
+        with open(error_path, "w") as error_file:
+            error_file.write(str(message))
+
+    @staticmethod
+    def _check_error(error_path):
+        """
+        Raise the error that was written to an error file, if any.
+        """
+        try:
+            with open(error_path) as error_file:
+                raise TranscodingFailed(error_file.read())
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _read_progress(progress_path, check_queued=True):
+        """
+        Parse an ffmpeg progress file.
+
+        Returns:
+            values (dict): parsed progress values, which are empty if the
+            process is queued, or None if there is no progress file.
+            updated_at (float): time of the last update
+
+        Raises:
+            TranscodingFailed: if the progress of an unfinished process was not
+            updated for LOCAL_TRANSCODING_STALL_TIMEOUT seconds, e.g: because
+            its worker was killed. Queued processes are only checked if
+            `check_queued` is True.
+        """
+        try:
+            with open(progress_path) as progress_file:
+                values = ffmpeg.parse_progress(progress_file.read())
+            updated_at = os.path.getmtime(progress_path)
+        except FileNotFoundError:
+            return None, None
+        if (
+            values.get("progress") != "end"
+            and (values or check_queued)
+            and time() - updated_at > settings.LOCAL_TRANSCODING_STALL_TIMEOUT
+        ):
+            raise TranscodingFailed("Transcoding stalled")
+        return values, updated_at
+
+    def get_chunk_duration(self, duration):
+        """
+        Target duration of the chunks of a video, or None if the video should
+        be transcoded in one piece.
+        """
+        chunk_duration = settings.LOCAL_TRANSCODING_CHUNK_DURATION
+        if not chunk_duration or not duration or duration < 2 * chunk_duration:
+            return None
+        return max(chunk_duration, duration / settings.LOCAL_TRANSCODING_MAX_CHUNKS)
+
+    def start_chunked_transcoding(self, public_video_id, src_path, duration):
+        """
+        Split the source file at keyframes, without re-encoding, and transcode
+        each (chunk, preset) pair in a separate celery task. Once all chunks
+        are transcoded, a chord callback concatenates the chunks of each
+        preset, again without re-encoding.
+
+        There is a single job per preset, whose progress is the progress of its
+        chunks, weighted by their duration.
+        """
+        # Clear the files of previous attempts
+        shutil.rmtree(
+            self.get_private_path(
+                self.get_video_folder_key(public_video_id) + "chunks/"
+            ),
+            ignore_errors=True,
+        )
+        chunk_folder = self.get_private_path(self.get_chunk_folder_key(public_video_id))
+        os.makedirs(chunk_folder)
+        chunks = ffmpeg.split(src_path, chunk_folder, self.get_chunk_duration(duration))
+        if not chunks:
+            raise TranscodingFailed("Could not split source file")
+
+        jobs = []
+        header = []
+        for resolution, args, _bitrate in settings.LOCAL_TRANSCODING_PRESETS:
+            job = {
+                "id": public_video_id + "/" + resolution,
+                "video_id": public_video_id,
+                "format": resolution,
+                "duration": duration,
+                "chunks": [chunk_duration for _path, chunk_duration in chunks],
+            }
+            self._remove(self.get_progress_path(job))
+            self._remove(self.get_error_path(job))
+            os.makedirs(
+                self.get_private_path(
+                    self.get_chunk_folder_key(public_video_id, resolution)
+                )
+            )
+            for index in range(len(chunks)):
+                self._write_queued_marker(
+                    self.get_chunk_path(public_video_id, resolution, index, "progress")
+                )
+            header += [
+                tasks.transcode_chunk.si(public_video_id, resolution, index, args)
+                for index in range(len(chunks))
+            ]
+            jobs.append(job)
+
+        celery.chord(header)(tasks.concat_chunks.si(public_video_id, jobs))
+        return jobs
+
+    def transcode_chunk(self, public_video_id, resolution, index, args):
+        """
+        Transcode a chunk of the source file. Errors are written to the chunk
+        error file.
+
+        Returns:
+            success (bool)
+        """
+        success = True
+        try:
+            ffmpeg.transcode(
+                self.get_chunk_path(public_video_id, "src", index, "mkv"),
+                self.get_chunk_path(public_video_id, resolution, index, "mp4"),
+                args,
+                self.get_chunk_path(public_video_id, resolution, index, "progress"),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error(
+                "Transcoding chunk %d of %s/%s failed: %s",
+                index,
+                public_video_id,
+                resolution,
+                error,
+            )
+            self._write_error(
+                self.get_chunk_path(public_video_id, resolution, index, "error"), error
+            )
+            success = False
+        # The chord callback is dispatched once all chunks are transcoded
+        if self._are_chunks_transcoded(public_video_id):
+            self._write_queued_marker(self.get_dispatch_marker_path(public_video_id))
+        return success
+
+    def _are_chunks_transcoded(self, public_video_id):
+        for progress_path in self._get_chunk_progress_paths(public_video_id):
+            if os.path.exists(os.path.splitext(progress_path)[0] + ".error"):
+                continue
+            try:
+                with open(progress_path) as progress_file:
+                    values = ffmpeg.parse_progress(progress_file.read())
+            except FileNotFoundError:
+                return False
+            if values.get("progress") != "end":
+                return False
+        return True
+
+    def concat_chunks(self, public_video_id, jobs):
+        """
+        Concatenate the transcoded chunks of each job, then delete all chunks.
+        The errors of failed chunks are written to the job error files.
+
+        Chunks are no longer checked by `check_progress` once the job progress
+        files exist: they are written for all jobs, and refreshed until each
+        job is concatenated.
+        """
+        for position, job in enumerate(jobs):
+            for queued_job in jobs[position:]:
+                self._write_queued_marker(self.get_progress_path(queued_job))
+            try:
+                chunk_paths = []
+                for index in range(len(job["chunks"])):
+                    self._check_error(
+                        self.get_chunk_path(
+                            public_video_id, job["format"], index, "error"
+                        )
+                    )
+                    chunk_paths.append(
+                        self.get_chunk_path(
+                            public_video_id, job["format"], index, "mp4"
+                        )
+                    )
+                output_path = self.get_output_path(job)
+                self._makedirs(output_path)
+                ffmpeg.concat(chunk_paths, output_path, self.get_progress_path(job))
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Transcoding job %s failed: %s", job["id"], error)
+                self._write_error(self.get_error_path(job), error)
+        shutil.rmtree(
+            self.get_private_path(
+                self.get_video_folder_key(public_video_id) + "chunks/"
+            ),
+            ignore_errors=True,
+        )
+
+    def _get_chunks_position(self, job):
+        """
+        Total duration of the transcoded parts of the chunks of a job, in
+        seconds.
+
+        Raises:
+            TranscodingFailed: if a chunk failed or stalled, if chunks are
+            queued but no chunk of the video was updated within
+            LOCAL_TRANSCODING_STALL_TIMEOUT seconds, or if all chunks were
+            transcoded, but their concatenation did not start within this
+            timeout after the dispatch of the chord callback.
+        """
+        position = 0
+        finished = True
+        queued = False
+        last_updated_at = 0
+        for index, chunk_duration in enumerate(job["chunks"]):
+            self._check_error(
+                self.get_chunk_path(job["video_id"], job["format"], index, "error")
+            )
+            # Chunks may wait in the celery queue for longer than the timeout
+            values, updated_at = self._read_progress(
+                self.get_chunk_path(job["video_id"], job["format"], index, "progress"),
+                check_queued=False,
+            )
+            if not values:
+                queued = queued or values is not None
+                finished = False
+                continue
+            last_updated_at = max(last_updated_at, updated_at)
+            if values.get("progress") == "end":
+                position += chunk_duration
+            else:
+                finished = False
+                position += min(chunk_duration, ffmpeg.get_out_time(values) or 0)
+        if finished:
+            try:
+                dispatched_at = os.path.getmtime(
+                    self.get_dispatch_marker_path(job["video_id"])
+                )
+            except FileNotFoundError:
+                # The worker of the last chunk was killed
+                dispatched_at = last_updated_at
+            if time() - dispatched_at > settings.LOCAL_TRANSCODING_STALL_TIMEOUT:
+                raise TranscodingFailed("Transcoded chunks were not concatenated")
+        if (
+            queued
+            and time() - self._get_chunks_updated_at(job["video_id"])
+            > settings.LOCAL_TRANSCODING_STALL_TIMEOUT
+        ):
+            raise TranscodingFailed("Transcoding stalled")
+        return position
+
+    def _get_chunk_progress_paths(self, public_video_id):
+        """
+        Progress files of the chunks of all formats of a video.
+        """
+        return glob.glob(
+            glob.escape(
+                self.get_private_path(
+                    self.get_video_folder_key(public_video_id) + "chunks/"
+                )
+            )
+            + "*/*.progress"
+        )
+
+    def _get_chunks_updated_at(self, public_video_id):
+        """
+        Time of the last update of the progress files of all chunks of a video.
+        """
+        updated_at = 0
+        for progress_path in self._get_chunk_progress_paths(public_video_id):
+            try:
+                updated_at = max(updated_at, os.path.getmtime(progress_path))
+            except FileNotFoundError:
+                pass
+        return updated_at
+
+    ####################
+    # Overridden methods
+    ####################
+
+    def upload_video(self, public_video_id, file_object):
+        self._write(
+            self.get_private_path(
+                self.get_src_folder_key(public_video_id)
+                + os.path.basename(file_object.name)
+            ),
+            file_object,
+        )
+
+    def create_upload(self, public_video_id, file_name):
+        return {
+            "Key": self.get_src_folder_key(public_video_id)
+            + os.path.basename(file_name),
+            "UploadId": uuid4().hex,
+        }
+
+    def _get_part_path(self, upload, part_number):
+        return self.get_private_path(
+            self.UPLOAD_FOLDER_KEY_PATTERN.format(upload_id=upload["UploadId"])
+            + "{:05d}".format(part_number)
+        )
+
+    def upload_part(self, upload, part_number, file_object, size):
+        self._write(self._get_part_path(upload, part_number), file_object, size)
+
+    def complete_upload(self, upload):
+        part_folder = os.path.dirname(self._get_part_path(upload, 1))
+        dst_path = self.get_private_path(upload["Key"])
+        self._makedirs(dst_path)
+        with open(dst_path, "wb") as dst:
+            for part_name in sorted(os.listdir(part_folder)):
+                with open(os.path.join(part_folder, part_name), "rb") as part:
+                    shutil.copyfileobj(part, dst, self.COPY_BUFFER_SIZE)
+        shutil.rmtree(part_folder, ignore_errors=True)
+
+    def abort_upload(self, upload):
+        shutil.rmtree(
+            os.path.dirname(self._get_part_path(upload, 1)), ignore_errors=True
+        )
+
+    def start_transcoding(self, public_video_id, video_path=""):
+        """
+        If `video_path` is empty, then guess the video location based on
+        `public_video_id`. Otherwise, `video_path` is relative to the private
+        storage, outside of which files cannot be transcoded.
+        """
+        if video_path:
+            private_root = os.path.realpath(settings.LOCAL_PRIVATE_STORAGE_ROOT)
+            src_path = os.path.realpath(self.get_private_path(video_path))
+            if os.path.commonpath([private_root, src_path]) != private_root:
+                raise TranscodingFailed("Invalid source path")
+        else:
+            src_path = self.get_src_file_path(public_video_id)
+        if src_path is None or not os.path.exists(src_path):
+            raise TranscodingFailed("Missing source file")
+
+        # The source duration is required to compute the job progress
+        duration = ffmpeg.get_duration(ffmpeg.probe(src_path))
+        if self.get_chunk_duration(duration):
+            return self.start_chunked_transcoding(public_video_id, src_path, duration)
+
+        jobs = []
+        for resolution, args, _bitrate in settings.LOCAL_TRANSCODING_PRESETS:
+            job = {
+                "id": public_video_id + "/" + resolution,
+                "video_id": public_video_id,
+                "format": resolution,
+                "duration": duration,
+            }
+            # Clear the files of previous attempts
+            self._remove(self.get_error_path(job))
+            self._submit_job(job, src_path, args)
+            jobs.append(job)
+        return jobs
+
+    def get_job_id(self, job):
+        return job["id"]
+
+    def check_progress(self, job):
+        """
+        Progress is parsed from the ffmpeg progress file, or from the progress
+        files of the chunks of chunked jobs, until their concatenation starts.
+        Jobs and chunks that wait for an available process have an empty
+        progress file.
+        """
+        self._check_error(self.get_error_path(job))
+        values, _updated_at = self._read_progress(self.get_progress_path(job))
+        # The "end" block is written after the output file is complete
+        if values is not None and values.get("progress") == "end":
+            return pipeline.backend.JobProgress(100.0, True, self.get_job_info(job))
+
+        if "chunks" in job:
+            if values is None:
+                position = self._get_chunks_position(job)
+            else:
+                # Chunks are being concatenated
+                position = job["duration"]
+        elif values is not None:
+            position = ffmpeg.get_out_time(values)
+        else:
+            position = None
+        if not position or not job["duration"]:
+            return pipeline.backend.JobProgress(0.0, False)
+        # Outputs may be slightly longer than their source
+        progress = min(99.0, 100.0 * position / job["duration"])
+        return pipeline.backend.JobProgress(progress, False)
+
+    def get_job_info(self, job) -> pipeline.backend.JobInfo:
+        return ffmpeg.get_job_info(self.get_output_path(job))
+
+    def delete_video(self, public_video_id):
+        folder_key = self.get_video_folder_key(public_video_id)
+        shutil.rmtree(self.get_path(folder_key), ignore_errors=True)
+        shutil.rmtree(self.get_private_path(folder_key), ignore_errors=True)
+
+    def delete_subtitle(self, public_video_id, public_subtitle_id):
+        prefix = self.SUBTITLE_BASE_KEY_PATTERN.format(
+            video_id=public_video_id, subtitle_id=public_subtitle_id
+        )
+        for path in glob.glob(glob.escape(self.get_path(prefix)) + "*"):
+            self._remove(path)
+
+    def iter_formats(self, public_video_id, jobs=None):
+        """
+        Formats are derived from the transcoding jobs, when they are known.
+        Otherwise, transcoded files are found in the storage.
+        """
+        if jobs is not None:
+            resolutions = set(job["format"] for job in jobs)
+        for resolution, _args, bitrate in settings.LOCAL_TRANSCODING_PRESETS:
+            if jobs is not None:
+                if resolution not in resolutions:
+                    continue
+            elif not os.path.exists(
+                self.get_path(self.get_video_key(public_video_id, resolution))
+            ):
+                continue
+            yield (resolution, bitrate)
+
+    def upload_subtitle(self, video_id, subtitle_id, language_code, content):
+        path = self.get_path(
+            self.get_subtitle_key(video_id, subtitle_id, language_code)
+        )
+        self._makedirs(path)
+        with open(path, "wb") as subtitle_file:
+            subtitle_file.write(
+                content.encode("utf-8") if isinstance(content, str) else content
+            )
+
+    def create_thumbnail(self, video_id, thumb_id):
+        """
+        The frame is extracted from the first transcoded format, since the
+        source file is not necessarily stored in the video folder.
+        """
+        for resolution, _bitrate in self.iter_formats(video_id):
+            src_path = self.get_path(self.get_video_key(video_id, resolution))
+            break
+        else:
+            raise TranscodingFailed("Missing transcoded file")
+        duration = ffmpeg.get_duration(ffmpeg.probe(src_path)) or 0
+
+        # Extract a frame to png, then convert it to jpg
+        with NamedTemporaryFile(mode="rb", suffix=".png") as frame_file:
+            with NamedTemporaryFile(mode="rb", suffix=".jpg") as thumbnail_file:
+                ffmpeg.extract_frame(
+                    src_path, frame_file.name, duration * self.THUMBNAIL_POSITION
+                )
+                pipeline.utils.make_thumbnail(frame_file, thumbnail_file.name)
+                self.upload_thumbnail(video_id, thumb_id, thumbnail_file)
+
+    def upload_thumbnail(self, video_id, thumb_id, file_object):
+        self._write(
+            self.get_path(self.get_thumbnail_key(video_id, thumb_id)), file_object
+        )
+
+    def delete_thumbnail(self, video_id, thumb_id):
+        self._remove(self.get_path(self.get_thumbnail_key(video_id, thumb_id)))
+
+    def video_url(self, public_video_id, format_name):
+        return self._get_url(self.get_video_key(public_video_id, format_name))
+
+    def subtitle_url(self, video_id, subtitle_id, language):
+        return self._get_url(self.get_subtitle_key(video_id, subtitle_id, language))
+
+    def thumbnail_url(self, video_id, thumb_id):
+        return self._get_url(self.get_thumbnail_key(video_id, thumb_id))
@@ -0,0 +1,273 @@
+"""
+Thin wrappers around the ffmpeg and ffprobe command line tools.
+"""
+import csv
+import json
+import os
+import subprocess
+from fractions import Fraction
+
+from django.conf import settings
+
+import pipeline.backend
+from pipeline.exceptions import TranscodingFailed
+
+# Number of stderr lines that are kept in error messages
+ERROR_LINES = 10
+
+
+def run(args, timeout=None):
+    """
+    Run a command, and return its standard output.
+
+    Raises:
+        TranscodingFailed: if the command cannot be run, or if it returns a
+        non-zero exit code. The error message contains the last lines of the
+        standard error.
+    """
+    try:
+        process = subprocess.run(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.SubprocessError) as error:
+        raise TranscodingFailed("Could not run {}: {}".format(args[0], error))
+    if process.returncode != 0:
+        stderr = process.stderr.decode("utf-8", errors="replace").strip()
+        raise TranscodingFailed(
+            "\n".join(stderr.splitlines()[-ERROR_LINES:])
+            or "{} exited with code {}".format(args[0], process.returncode)
+        )
+    return process.stdout
+
+
+def probe(path):
+    """
+    Return the format and stream metadata of a media file, as parsed from the
+    json output of ffprobe.
+    """
+    output = run(
+        [
+            settings.FFPROBE_BINARY,
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            path,
+        ],
+        timeout=settings.FFPROBE_TIMEOUT,
+    )
+    try:
+        return json.loads(output.decode("utf-8"))
+    except ValueError:
+        raise TranscodingFailed("Invalid ffprobe output for {}".format(path))
+
+
+def get_duration(metadata):
+    """
+    Duration of a probed file, in seconds, or None if it is unknown.
+    """
+    try:
+        return float(metadata["format"]["duration"])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_video_stream(metadata):
+    for stream in metadata.get("streams", []):
+        if stream.get("codec_type") == "video":
+            return stream
+    return None
+
+
+def get_frame_rate(stream):
+    """
+    Frame rate of a video stream, as a string, e.g: "25" or "29.97". Empty
+    if it is unknown.
+    """
+    try:
+        frame_rate = Fraction(stream["r_frame_rate"])
+    except (KeyError, ValueError, ZeroDivisionError):
+        return ""
+    return "{:.2f}".format(float(frame_rate)).rstrip("0").rstrip(".")
+
+
+def get_job_info(path) -> pipeline.backend.JobInfo:
+    """
+    Probe a transcoded file.
+    """
+    metadata = probe(path)
+    stream = get_video_stream(metadata) or {}
+    duration = get_duration(metadata)
+    return pipeline.backend.JobInfo(
+        width=stream.get("width"),
+        height=stream.get("height"),
+        duration_millis=None if duration is None else int(round(duration * 1000)),
+        file_size=int(metadata.get("format", {}).get("size", 0)) or None,
+        frame_rate=get_frame_rate(stream),
+    )
+
+
+def transcode(src_path, dst_path, args, progress_path):
+    """
+    Transcode a file with the given output options. Progress is reported by
+    ffmpeg in the progress file, as blocks of key=value lines that are
+    appended at least once per second.
+    """
+    run(
+        [
+            settings.FFMPEG_BINARY,
+            "-y",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-progress",
+            progress_path,
+            "-i",
+            src_path,
+        ]
+        + list(args)
+        + [dst_path]
+    )
+
+
+def split(src_path, dst_folder, chunk_duration):
+    """
+    Split a file, without re-encoding, into chunks of approximately
+    `chunk_duration` seconds. Chunks are cut at the first video keyframe after
+    each multiple of the chunk duration, and their timestamps start at zero.
+    Only the first video and audio streams are kept.
+
+    Returns:
+        chunks (list): (path, duration) of each chunk, in order.
+    """
+    list_path = os.path.join(dst_folder, "chunks.csv")
+    run(
+        [
+            settings.FFMPEG_BINARY,
+            "-y",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-i",
+            src_path,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-f",
+            "segment",
+            "-segment_time",
+            "{:.3f}".format(chunk_duration),
+            "-reset_timestamps",
+            "1",
+            "-segment_list",
+            list_path,
+            "-segment_list_type",
+            "csv",
+            os.path.join(dst_folder, "%05d.mkv"),
+        ]
+    )
+    # Rows are of the form: file name, start time, end time
+    with open(list_path) as list_file:
+        return [
+            (os.path.join(dst_folder, row[0]), float(row[2]) - float(row[1]))
+            for row in csv.reader(list_file)
+            if row
+        ]
+
+
+def concat(src_paths, dst_path, progress_path):
+    """
+    Concatenate files with identical encoding parameters, without re-encoding.
+    """
+    list_path = dst_path + ".txt"
+    with open(list_path, "w") as list_file:
+        for src_path in src_paths:
+            list_file.write("file '{}'\n".format(src_path.replace("'", "'\\''")))
+    try:
+        run(
+            [
+                settings.FFMPEG_BINARY,
+                "-y",
+                "-nostdin",
+                "-loglevel",
+                "error",
+                "-progress",
+                progress_path,
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_path,
+                "-c",
+                "copy",
+                "-movflags",
+                "+faststart",
+                dst_path,
+            ]
+        )
+    finally:
+        os.remove(list_path)
+
+
+def extract_frame(src_path, dst_path, position):
+    """
+    Extract a single frame from a video file, at the given position in
+    seconds.
+    """
+    run(
+        [
+            settings.FFMPEG_BINARY,
+            "-y",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-ss",
+            "{:.3f}".format(position),
+            "-i",
+            src_path,
+            "-frames:v",
+            "1",
+            dst_path,
+        ],
+        timeout=settings.FFPROBE_TIMEOUT,
+    )
+
+
+def parse_progress(content):
+    """
+    Parse the content of an ffmpeg progress file.
+
+    Returns:
+        progress (dict): the values of the last progress block. The
+        "progress" key is "end" once the output file was written.
+    """
+    values = {}
+    for line in content.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            values[key.strip()] = value.strip()
+    return values
+
+
+def get_out_time(values):
+    """
+    Position of the encoder in the output file, in seconds, from parsed
+    progress values. Note that ffmpeg reports "out_time_ms" in microseconds,
+    too.
+    """
+    for key in ("out_time_us", "out_time_ms"):
+        try:
+            return max(0, int(values[key])) / 1000000
+        except (KeyError, ValueError):
+            continue
+    return None
@@ -0,0 +1,17 @@
+"""
+Celery tasks of chunked transcoding, which are run by
+`contrib.plugins.local.backend.Backend.start_chunked_transcoding`.
+"""
+from celery import shared_task
+
+from pipeline import backend
+
+
+@shared_task(name="local_transcode_chunk", acks_late=True)
+def transcode_chunk(public_video_id, resolution, index, args):
+    return backend.get().transcode_chunk(public_video_id, resolution, index, args)
+
+
+@shared_task(name="local_concat_chunks", acks_late=True)
+def concat_chunks(public_video_id, jobs):
+    backend.get().concat_chunks(public_video_id, jobs)
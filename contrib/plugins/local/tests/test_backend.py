@@ -0,0 +1,759 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from io import BytesIO
+from time import time
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import pipeline.backend
+import pipeline.utils
+from contrib.plugins.local import backend as local_backend
+from contrib.plugins.local import ffmpeg
+from pipeline.backend import JobProgress
+from pipeline.exceptions import TranscodingFailed
+
+PROGRESS_BLOCK = """frame={frame}
+fps=25.00
+out_time_us={out_time_us}
+out_time_ms={out_time_us}
+out_time=00:00:00.000000
+speed=2.5x
+progress={progress}
+"""
+
+PROBE_OUTPUT = {
+    "streams": [
+        {"codec_type": "audio", "sample_rate": "44100"},
+        {
+            "codec_type": "video",
+            "width": 1280,
+            "height": 720,
+            "r_frame_rate": "30000/1001",
+        },
+    ],
+    "format": {"duration": "12.345000", "size": "1048576"},
+}
+
+
+class LocalStorageTestCase(TestCase):
+    def setUp(self):
+        self.storage_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_root)
+        settings_override = override_settings(
+            LOCAL_STORAGE_ROOT=os.path.join(self.storage_root, "public"),
+            LOCAL_STORAGE_URL="https://example.com/storage/",
+            LOCAL_PRIVATE_STORAGE_ROOT=os.path.join(self.storage_root, "private"),
+            LOCAL_TRANSCODING_PRESETS=[("LD", ["-c:v", "libx264"], 900)],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.backend = local_backend.Backend()
+
+    def write_file(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def upload_source(self, video_id="videoid"):
+        file_object = BytesIO(b"videocontent")
+        file_object.name = "somevideo.mp4"
+        self.backend.upload_video(video_id, file_object)
+
+
+class FfmpegTests(TestCase):
+    def test_parse_progress(self):
+        values = ffmpeg.parse_progress(
+            PROGRESS_BLOCK.format(frame=25, out_time_us=1000000, progress="continue")
+            + PROGRESS_BLOCK.format(frame=50, out_time_us=2000000, progress="end")
+        )
+        self.assertEqual("50", values["frame"])
+        self.assertEqual("end", values["progress"])
+        self.assertEqual(2, ffmpeg.get_out_time(values))
+
+    def test_get_out_time_not_available(self):
+        self.assertIsNone(ffmpeg.get_out_time({"out_time_us": "N/A"}))
+        self.assertEqual(1.5, ffmpeg.get_out_time({"out_time_ms": "1500000"}))
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_get_job_info(self, mock_run):
+        mock_run.return_value = Mock(
+            returncode=0, stdout=json.dumps(PROBE_OUTPUT).encode()
+        )
+        job_info = ffmpeg.get_job_info("/tmp/video.mp4")
+
+        self.assertEqual(
+            pipeline.backend.JobInfo(
+                width=1280,
+                height=720,
+                duration_millis=12345,
+                file_size=1048576,
+                frame_rate="29.97",
+            ),
+            job_info,
+        )
+        self.assertEqual("/tmp/video.mp4", mock_run.call_args[0][0][-1])
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_get_job_info_without_frame_rate(self, mock_run):
+        mock_run.return_value = Mock(
+            returncode=0,
+            stdout=json.dumps(
+                {"streams": [{"codec_type": "video", "width": 1280, "height": 720}]}
+            ).encode(),
+        )
+        job_info = ffmpeg.get_job_info("/tmp/video.mp4")
+
+        self.assertEqual("", job_info.frame_rate)
+        self.assertIsNone(job_info.duration_millis)
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_run_error(self, mock_run):
+        mock_run.return_value = Mock(
+            returncode=1, stderr="\n".join(str(i) for i in range(20)).encode()
+        )
+        with self.assertRaises(TranscodingFailed) as context:
+            ffmpeg.run(["ffmpeg"])
+
+        self.assertEqual(
+            "\n".join(str(i) for i in range(10, 20)), context.exception.args[0]
+        )
+
+    @patch.object(ffmpeg.subprocess, "run", side_effect=FileNotFoundError("ffmpeg"))
+    def test_run_missing_binary(self, _mock_run):
+        self.assertRaises(TranscodingFailed, ffmpeg.run, ["ffmpeg"])
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_transcode(self, mock_run):
+        mock_run.return_value = Mock(returncode=0, stdout=b"")
+        ffmpeg.transcode("src.mp4", "LD.mp4", ["-c:v", "libx264"], "LD.progress")
+
+        args = mock_run.call_args[0][0]
+        self.assertEqual("LD.progress", args[args.index("-progress") + 1])
+        self.assertEqual("src.mp4", args[args.index("-i") + 1])
+        self.assertEqual(["-c:v", "libx264", "LD.mp4"], args[-3:])
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_split(self, mock_run):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+
+        def run(args, **kwargs):
+            list_path = args[args.index("-segment_list") + 1]
+            with open(list_path, "w") as list_file:
+                list_file.write("00000.mkv,0.000000,5.005000\n")
+                list_file.write("00001.mkv,5.005000,7.500000\n")
+            return Mock(returncode=0, stdout=b"")
+
+        mock_run.side_effect = run
+        chunks = ffmpeg.split("src.mp4", folder, 5)
+
+        self.assertEqual(
+            [
+                (os.path.join(folder, "00000.mkv"), 5.005),
+                (os.path.join(folder, "00001.mkv"), 2.495),
+            ],
+            [(path, round(duration, 3)) for path, duration in chunks],
+        )
+        args = mock_run.call_args[0][0]
+        self.assertEqual("5.000", args[args.index("-segment_time") + 1])
+        self.assertEqual("copy", args[args.index("-c") + 1])
+
+    @patch.object(ffmpeg.subprocess, "run")
+    def test_concat(self, mock_run):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        lists = []
+
+        def run(args, **kwargs):
+            with open(args[args.index("-i") + 1]) as list_file:
+                lists.append(list_file.read())
+            return Mock(returncode=0, stdout=b"")
+
+        mock_run.side_effect = run
+        dst_path = os.path.join(folder, "LD.mp4")
+        ffmpeg.concat(
+            ["/chunks/00000.mp4", "/chunks/it's.mp4"], dst_path, "LD.progress"
+        )
+
+        self.assertEqual(
+            ["file '/chunks/00000.mp4'\nfile '/chunks/it'\\''s.mp4'\n"], lists
+        )
+        args = mock_run.call_args[0][0]
+        self.assertEqual("copy", args[args.index("-c") + 1])
+        self.assertEqual(dst_path, args[-1])
+        self.assertEqual([], os.listdir(folder))
+
+
+class StorageTests(LocalStorageTestCase):
+    def test_upload_video(self):
+        self.upload_source()
+        src_path = self.backend.get_src_file_path("videoid")
+
+        self.assertEqual(
+            os.path.join(
+                self.storage_root, "private", "videos/videoid/src/somevideo.mp4"
+            ),
+            src_path,
+        )
+        with open(src_path, "rb") as f:
+            self.assertEqual(b"videocontent", f.read())
+
+    def test_get_missing_src_file_path(self):
+        self.assertIsNone(self.backend.get_src_file_path("videoid"))
+
+    def test_multipart_upload(self):
+        upload = self.backend.create_upload("videoid", "somevideo.mp4")
+        self.backend.upload_part(upload, 2, BytesIO(b"content-ignored"), 7)
+        self.backend.upload_part(upload, 1, BytesIO(b"video"), 5)
+        self.backend.complete_upload(upload)
+
+        self.assertEqual("videos/videoid/src/somevideo.mp4", upload["Key"])
+        with open(self.backend.get_src_file_path("videoid"), "rb") as f:
+            self.assertEqual(b"videocontent", f.read())
+        self.assertFalse(
+            os.path.exists(os.path.join(self.storage_root, "private", "uploads"))
+            and os.listdir(os.path.join(self.storage_root, "private", "uploads"))
+        )
+
+    def test_delete_video(self):
+        self.upload_source()
+        self.backend.upload_subtitle("videoid", "subid", "fr", "WEBVTT")
+
+        self.backend.delete_video("videoid")
+
+        self.assertIsNone(self.backend.get_src_file_path("videoid"))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.storage_root, "public", "videos/videoid"))
+        )
+
+    def test_delete_subtitle(self):
+        self.backend.upload_subtitle("videoid", "subid1", "fr", "WEBVTT")
+        self.backend.upload_subtitle("videoid", "subid2", "fr", "WEBVTT")
+
+        self.backend.delete_subtitle("videoid", "subid1")
+
+        self.assertEqual(
+            ["subid2.fr.vtt"],
+            os.listdir(
+                os.path.join(self.storage_root, "public", "videos/videoid/subs")
+            ),
+        )
+
+    def test_urls(self):
+        self.assertEqual(
+            "https://example.com/storage/videos/videoid/LD.mp4",
+            self.backend.video_url("videoid", "LD"),
+        )
+        self.assertEqual(
+            "https://example.com/storage/videos/videoid/subs/subid.fr.vtt",
+            self.backend.subtitle_url("videoid", "subid", "fr"),
+        )
+        self.assertEqual(
+            "https://example.com/storage/videos/videoid/thumbs/thumbid.jpg",
+            self.backend.thumbnail_url("videoid", "thumbid"),
+        )
+
+    def test_iter_formats(self):
+        self.assertEqual([], list(self.backend.iter_formats("videoid")))
+        self.assertEqual(
+            [("LD", 900)],
+            list(self.backend.iter_formats("videoid", jobs=[{"format": "LD"}])),
+        )
+        self.write_file(
+            os.path.join(self.storage_root, "public", "videos/videoid/LD.mp4"), ""
+        )
+        self.assertEqual([("LD", 900)], list(self.backend.iter_formats("videoid")))
+
+
+class TranscodingTests(LocalStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = {
+            "id": "videoid/LD",
+            "video_id": "videoid",
+            "format": "LD",
+            "duration": 10.0,
+        }
+
+    def write_progress(self, content):
+        self.write_file(self.backend.get_progress_path(self.job), content)
+
+    def test_start_transcoding_without_source(self):
+        self.assertRaises(TranscodingFailed, self.backend.start_transcoding, "videoid")
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_start_transcoding_from_storage_path(self, mock_probe):
+        self.upload_source()
+        self.backend._executor = Mock()
+
+        self.backend.start_transcoding("videoid", "videos/videoid/src/somevideo.mp4")
+
+        mock_probe.assert_called_once_with(self.backend.get_src_file_path("videoid"))
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_start_transcoding_outside_of_private_storage(self, mock_probe):
+        self.upload_source()
+        public_path = self.backend.get_path("videos/videoid/LD.mp4")
+        self.write_file(public_path, "transcoded")
+
+        for video_path in ["/etc/passwd", "../public/videos/videoid/LD.mp4"]:
+            with self.assertRaises(TranscodingFailed) as context:
+                self.backend.start_transcoding("videoid", video_path)
+            self.assertEqual("Invalid source path", context.exception.args[0])
+        mock_probe.assert_not_called()
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_start_transcoding(self, _mock_probe):
+        self.upload_source()
+
+        def transcode(src_path, dst_path, args, progress_path):
+            self.write_file(
+                progress_path,
+                PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end"),
+            )
+
+        with patch.object(ffmpeg, "transcode", side_effect=transcode) as mock_transcode:
+            jobs = self.backend.start_transcoding("videoid")
+            self.backend.executor.shutdown(wait=True)
+
+        self.assertEqual(
+            [
+                {
+                    "id": "videoid/LD",
+                    "video_id": "videoid",
+                    "format": "LD",
+                    "duration": 12.345,
+                }
+            ],
+            jobs,
+        )
+        self.assertEqual("videoid/LD", self.backend.get_job_id(jobs[0]))
+        src_path, dst_path, args, _progress_path = mock_transcode.call_args[0]
+        self.assertEqual(self.backend.get_src_file_path("videoid"), src_path)
+        self.assertEqual(self.backend.get_output_path(jobs[0]), dst_path)
+        self.assertEqual(["-c:v", "libx264"], args)
+        with patch.object(ffmpeg, "get_job_info", return_value="jobinfo"):
+            self.assertEqual(
+                (100.0, True, "jobinfo"), self.backend.check_progress(jobs[0])
+            )
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_queued_job(self, _mock_probe):
+        self.upload_source()
+        self.backend._executor = Mock()
+
+        jobs = self.backend.start_transcoding("videoid")
+
+        progress_path = self.backend.get_progress_path(jobs[0])
+        with open(progress_path) as progress_file:
+            self.assertEqual("", progress_file.read())
+        self.assertEqual({progress_path}, self.backend._queued_progress_paths)
+        self.assertEqual(JobProgress(0.0, False), self.backend.check_progress(jobs[0]))
+
+        with patch.object(ffmpeg, "transcode"):
+            self.backend._run_job(jobs[0], "src.mp4", [])
+        self.assertEqual(set(), self.backend._queued_progress_paths)
+
+    @override_settings(LOCAL_TRANSCODING_CONCURRENCY=3)
+    def test_executor_concurrency(self):
+        self.assertEqual(3, self.backend.executor._max_workers)
+
+    @patch.object(ffmpeg, "transcode", side_effect=TranscodingFailed("Invalid data"))
+    def test_failed_job(self, _mock_transcode):
+        self.backend._run_job(self.job, "src.mp4", [])
+
+        with self.assertRaises(TranscodingFailed) as context:
+            self.backend.check_progress(self.job)
+        self.assertEqual("Invalid data", context.exception.args[0])
+
+    def test_check_progress_of_queued_job(self):
+        self.assertEqual(JobProgress(0.0, False), self.backend.check_progress(self.job))
+
+    def test_check_progress(self):
+        self.write_progress(
+            PROGRESS_BLOCK.format(frame=25, out_time_us=1000000, progress="continue")
+            + PROGRESS_BLOCK.format(frame=100, out_time_us=4000000, progress="continue")
+        )
+        self.assertEqual(
+            JobProgress(40.0, False), self.backend.check_progress(self.job)
+        )
+
+    def test_check_progress_of_longer_output(self):
+        self.write_progress(
+            PROGRESS_BLOCK.format(frame=25, out_time_us=11000000, progress="continue")
+        )
+        self.assertEqual(
+            JobProgress(99.0, False), self.backend.check_progress(self.job)
+        )
+
+    def test_check_progress_of_unknown_duration(self):
+        self.job["duration"] = None
+        self.write_progress(
+            PROGRESS_BLOCK.format(frame=25, out_time_us=1000000, progress="continue")
+        )
+        self.assertEqual(JobProgress(0.0, False), self.backend.check_progress(self.job))
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_stalled_job(self):
+        self.write_progress(
+            PROGRESS_BLOCK.format(frame=25, out_time_us=1000000, progress="continue")
+        )
+        updated_at = time() - 61
+        os.utime(self.backend.get_progress_path(self.job), (updated_at, updated_at))
+
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_stalled_queued_job(self):
+        self.write_progress("")
+        progress_path = self.backend.get_progress_path(self.job)
+        updated_at = time() - 61
+        os.utime(progress_path, (updated_at, updated_at))
+
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+        # Markers of jobs that wait in the executor are refreshed
+        self.backend._queued_progress_paths.add(progress_path)
+        self.backend._touch_queued_markers()
+        self.assertEqual(JobProgress(0.0, False), self.backend.check_progress(self.job))
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_get_job_info(self, mock_probe):
+        job_info = self.backend.get_job_info(self.job)
+
+        mock_probe.assert_called_once_with(self.backend.get_output_path(self.job))
+        self.assertEqual(1280, job_info.width)
+        self.assertEqual(12345, job_info.duration_millis)
+
+    @patch.object(pipeline.utils, "make_thumbnail")
+    @patch.object(ffmpeg, "extract_frame")
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_create_thumbnail_from_transcoded_file(
+        self, mock_probe, mock_extract_frame, _mock_make_thumbnail
+    ):
+        # Videos transcoded from their storage path have no source in their folder
+        output_path = self.backend.get_output_path(self.job)
+        self.write_file(output_path, "transcoded")
+
+        self.backend.create_thumbnail("videoid", "thumbid")
+
+        mock_probe.assert_called_once_with(output_path)
+        src_path, _frame_path, position = mock_extract_frame.call_args[0]
+        self.assertEqual(output_path, src_path)
+        self.assertAlmostEqual(1.2345, position)
+
+    def test_create_thumbnail_without_transcoded_file(self):
+        self.upload_source()
+        self.assertRaises(
+            TranscodingFailed, self.backend.create_thumbnail, "videoid", "thumbid"
+        )
+
+
+@override_settings(
+    LOCAL_TRANSCODING_CHUNK_DURATION=5,
+    PLUGIN_BACKEND="contrib.plugins.local.backend.Backend",
+)
+class ChunkedTranscodingTests(LocalStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = {
+            "id": "videoid/LD",
+            "video_id": "videoid",
+            "format": "LD",
+            "duration": 10.0,
+            "chunks": [5.0, 5.0],
+        }
+
+    def write_chunk_progress(self, index, content, resolution="LD"):
+        self.write_file(
+            self.backend.get_chunk_path("videoid", resolution, index, "progress"),
+            content,
+        )
+
+    def test_get_chunk_duration(self):
+        self.assertIsNone(self.backend.get_chunk_duration(None))
+        self.assertIsNone(self.backend.get_chunk_duration(9.9))
+        self.assertEqual(5, self.backend.get_chunk_duration(10))
+        with override_settings(LOCAL_TRANSCODING_MAX_CHUNKS=4):
+            self.assertEqual(25, self.backend.get_chunk_duration(100))
+        with override_settings(LOCAL_TRANSCODING_CHUNK_DURATION=0):
+            self.assertIsNone(self.backend.get_chunk_duration(100))
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_start_chunked_transcoding(self, _mock_probe):
+        self.upload_source()
+
+        def split(src_path, dst_folder, chunk_duration):
+            return [
+                (os.path.join(dst_folder, "0000{}.mkv".format(index)), duration)
+                for index, duration in enumerate([5.0, 5.0, 2.345])
+            ]
+
+        def write_end(dst_path, progress_path):
+            self.write_file(dst_path, "")
+            self.write_file(
+                progress_path,
+                PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end"),
+            )
+
+        with patch.object(ffmpeg, "split", side_effect=split), patch.object(
+            local_backend.celery, "chord"
+        ) as mock_chord:
+            jobs = self.backend.start_transcoding("videoid")
+        header = mock_chord.call_args[0][0]
+        body = mock_chord.return_value.call_args[0][0]
+
+        self.assertEqual(
+            [
+                {
+                    "id": "videoid/LD",
+                    "video_id": "videoid",
+                    "format": "LD",
+                    "duration": 12.345,
+                    "chunks": [5.0, 5.0, 2.345],
+                }
+            ],
+            jobs,
+        )
+        self.assertEqual(3, len(header))
+        self.assertEqual(("videoid", "LD", 2, ["-c:v", "libx264"]), header[2].args)
+        self.assertEqual(("videoid", jobs), body.args)
+
+        with patch.object(
+            ffmpeg,
+            "transcode",
+            side_effect=lambda src, dst, args, progress: write_end(dst, progress),
+        ) as mock_transcode:
+            header[0].apply()
+            header[1].apply()
+            self.assertAlmostEqual(
+                100 * 10 / 12.345, self.backend.check_progress(jobs[0]).progress
+            )
+            self.assertFalse(
+                os.path.exists(self.backend.get_dispatch_marker_path("videoid"))
+            )
+            header[2].apply()
+            self.assertTrue(
+                os.path.exists(self.backend.get_dispatch_marker_path("videoid"))
+            )
+            self.assertEqual(
+                JobProgress(99.0, False), self.backend.check_progress(jobs[0])
+            )
+        self.assertEqual(
+            self.backend.get_chunk_path("videoid", "src", 2, "mkv"),
+            mock_transcode.call_args[0][0],
+        )
+
+        with patch.object(
+            ffmpeg,
+            "concat",
+            side_effect=lambda src_paths, dst, progress: write_end(dst, progress),
+        ) as mock_concat:
+            body.apply()
+        self.assertEqual(
+            [
+                self.backend.get_chunk_path("videoid", "LD", index, "mp4")
+                for index in range(3)
+            ],
+            mock_concat.call_args[0][0],
+        )
+        self.assertEqual(
+            self.backend.get_output_path(jobs[0]), mock_concat.call_args[0][1]
+        )
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.storage_root, "private", "videos/videoid/chunks")
+            )
+        )
+        with patch.object(ffmpeg, "get_job_info", return_value="jobinfo"):
+            self.assertEqual(
+                (100.0, True, "jobinfo"), self.backend.check_progress(jobs[0])
+            )
+
+    @patch.object(ffmpeg, "probe", return_value=PROBE_OUTPUT)
+    def test_short_videos_are_not_chunked(self, _mock_probe):
+        self.upload_source()
+        with override_settings(LOCAL_TRANSCODING_CHUNK_DURATION=10), patch.object(
+            ffmpeg, "transcode"
+        ), patch.object(ffmpeg, "split") as mock_split:
+            jobs = self.backend.start_transcoding("videoid")
+            self.backend.executor.shutdown(wait=True)
+
+        mock_split.assert_not_called()
+        self.assertNotIn("chunks", jobs[0])
+
+    def test_check_progress_of_chunks(self):
+        self.write_chunk_progress(
+            0, PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end")
+        )
+        self.write_chunk_progress(
+            1, PROGRESS_BLOCK.format(frame=1, out_time_us=2500000, progress="continue")
+        )
+        self.assertEqual(
+            JobProgress(75.0, False), self.backend.check_progress(self.job)
+        )
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_queued_chunks(self):
+        updated_at = time() - 61
+        self.write_chunk_progress(0, "")
+        self.write_chunk_progress(
+            0, PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end"), "HD"
+        )
+        for path in [
+            self.backend.get_chunk_path("videoid", "LD", 0, "progress"),
+            self.backend.get_chunk_path("videoid", "HD", 0, "progress"),
+        ]:
+            os.utime(path, (updated_at, updated_at))
+        self.write_chunk_progress(
+            1, PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end")
+        )
+
+        # Chunks of the video were recently transcoded
+        self.assertEqual(
+            JobProgress(50.0, False), self.backend.check_progress(self.job)
+        )
+
+        os.utime(
+            self.backend.get_chunk_path("videoid", "LD", 1, "progress"),
+            (updated_at, updated_at),
+        )
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_chunks_that_were_not_concatenated(self):
+        for index in range(2):
+            self.write_chunk_progress(
+                index, PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end")
+            )
+            updated_at = time() - 61
+            os.utime(
+                self.backend.get_chunk_path("videoid", "LD", index, "progress"),
+                (updated_at, updated_at),
+            )
+
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+    def write_transcoded_chunks(self, updated_at):
+        for index in range(2):
+            self.write_chunk_progress(
+                index, PROGRESS_BLOCK.format(frame=1, out_time_us=0, progress="end")
+            )
+            os.utime(
+                self.backend.get_chunk_path("videoid", "LD", index, "progress"),
+                (updated_at, updated_at),
+            )
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_chunks_that_wait_for_concatenation(self):
+        self.write_transcoded_chunks(time() - 61)
+        dispatch_marker_path = self.backend.get_dispatch_marker_path("videoid")
+        self.write_file(dispatch_marker_path, "")
+
+        self.assertEqual(
+            JobProgress(99.0, False), self.backend.check_progress(self.job)
+        )
+
+        updated_at = time() - 61
+        os.utime(dispatch_marker_path, (updated_at, updated_at))
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+    @override_settings(LOCAL_TRANSCODING_STALL_TIMEOUT=60)
+    def test_check_progress_of_chunks_that_are_concatenated(self):
+        updated_at = time() - 61
+        self.write_transcoded_chunks(updated_at)
+        dispatch_marker_path = self.backend.get_dispatch_marker_path("videoid")
+        self.write_file(dispatch_marker_path, "")
+        os.utime(dispatch_marker_path, (updated_at, updated_at))
+        # Concatenation is still running after the timeout
+        self.write_file(
+            self.backend.get_progress_path(self.job),
+            PROGRESS_BLOCK.format(frame=1, out_time_us=1000000, progress="continue"),
+        )
+
+        self.assertEqual(
+            JobProgress(99.0, False), self.backend.check_progress(self.job)
+        )
+
+    def test_concat_chunks_of_multiple_jobs(self):
+        jobs = [self.job, dict(self.job, id="videoid/HD", format="HD")]
+        hd_progress_path = self.backend.get_progress_path(jobs[1])
+
+        def concat(src_paths, dst_path, progress_path):
+            if progress_path != hd_progress_path:
+                # Jobs that wait for their concatenation are not checked
+                self.assertTrue(os.path.exists(hd_progress_path))
+                self.assertEqual(
+                    JobProgress(99.0, False), self.backend.check_progress(jobs[1])
+                )
+
+        with patch.object(ffmpeg, "concat", side_effect=concat) as mock_concat:
+            self.backend.concat_chunks("videoid", jobs)
+
+        self.assertEqual(2, mock_concat.call_count)
+
+    @patch.object(ffmpeg, "transcode", side_effect=TranscodingFailed("Invalid data"))
+    def test_failed_chunk(self, _mock_transcode):
+        self.assertFalse(
+            self.backend.transcode_chunk("videoid", "LD", 1, ["-c:v", "libx264"])
+        )
+        self.assertRaises(TranscodingFailed, self.backend.check_progress, self.job)
+
+        with patch.object(ffmpeg, "concat") as mock_concat:
+            self.backend.concat_chunks("videoid", [self.job])
+
+        mock_concat.assert_not_called()
+        with self.assertRaises(TranscodingFailed) as context:
+            self.backend.check_progress(self.job)
+        self.assertEqual("Invalid data", context.exception.args[0])
+
+
+@skipUnless(
+    shutil.which("ffmpeg") and shutil.which("ffprobe"), "requires ffmpeg and ffprobe"
+)
+class FfmpegTranscodingTests(LocalStorageTestCase):
+    def test_transcode_video(self):
+        src_path = os.path.join(self.storage_root, "src.mp4")
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=320x240:rate=25",
+                src_path,
+            ],
+            check=True,
+        )
+        with open(src_path, "rb") as src_file:
+            self.backend.upload_video("videoid", src_file)
+
+        with override_settings(
+            LOCAL_TRANSCODING_PRESETS=[("LD", ["-vf", "scale=-2:120"], 900)]
+        ):
+            jobs = self.backend.start_transcoding("videoid")
+            self.backend.executor.shutdown(wait=True)
+            job_progress = self.backend.check_progress(jobs[0])
+            self.backend.create_thumbnail("videoid", "thumbid")
+
+        self.assertEqual(100.0, job_progress.progress)
+        self.assertTrue(job_progress.finished)
+        self.assertEqual(160, job_progress.info.width)
+        self.assertEqual(120, job_progress.info.height)
+        self.assertEqual("25", job_progress.info.frame_rate)
+        self.assertAlmostEqual(2000, job_progress.info.duration_millis, delta=100)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    self.storage_root, "public", "videos/videoid/thumbs/thumbid.jpg"
+                )
+            )
+        )
@@ -58,8 +58,31 @@ class VideoFormatAdmin(admin.ModelAdmin):
     search_fields = ("name", "bitrate", "video__public_id", "video__title")
 
 
+class TranscodingJobAdmin(admin.ModelAdmin):
+    model = models.TranscodingJob
+    list_display = ("job_id", "video", "status", "progress")
+    list_filter = ("status",)
+    raw_id_fields = ("video",)
+    search_fields = ("job_id", "video__public_id", "video__title")
+
+
+class StorageDeletionAdmin(admin.ModelAdmin):
+    model = models.StorageDeletion
+    list_display = (
+        "public_video_id",
+        "public_subtitle_id",
+        "job_id",
+        "created_at",
+        "attempted_at",
+        "attempts",
+    )
+    search_fields = ("public_video_id", "public_subtitle_id", "job_id")
+
+
 admin.site.register(models.Video, VideoAdmin)
 admin.site.register(models.VideoUploadUrl, VideoUploadUrlAdmin)
 admin.site.register(models.Playlist, PlaylistAdmin)
 admin.site.register(models.Subtitle, SubtitleAdmin)
 admin.site.register(models.VideoFormat, VideoFormatAdmin)
+admin.site.register(models.TranscodingJob, TranscodingJobAdmin)
+admin.site.register(models.StorageDeletion, StorageDeletionAdmin)
@@ -1,7 +1,10 @@
 import importlib
+import threading
 from typing import NamedTuple, Optional, Text
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 
 class JobInfo(NamedTuple):
@@ -16,6 +19,30 @@ class JobInfo(NamedTuple):
     frame_rate: Text = ""
 
 
+class JobProgress(NamedTuple):
+    """
+    Progress of a transcoding job, as returned by `check_progress`. Once the
+    job is finished, backends may also return information about the job's
+    output, which saves a call to `get_job_info`.
+    """
+
+    progress: float
+    finished: bool
+    info: Optional[JobInfo] = None
+
+
+class Format(NamedTuple):
+    """
+    Transcoded format of a video, as yielded by `iter_formats`. Formats are
+    progressive video files by default, or adaptive streaming formats ("hls"
+    or "dash"), which are served by a master playlist.
+    """
+
+    name: Text
+    bitrate: float
+    kind: Text = "file"
+
+
 class BaseBackend(object):
     def upload_video(self, video_id, file_object):
         """
@@ -27,27 +54,120 @@ class BaseBackend(object):
         """
         raise NotImplementedError
 
+    def create_upload(self, video_id, file_name):
+        """
+        Start a storage-side multipart upload of a video file. Parts of the
+        file may then be uploaded directly by clients, to the urls returned by
+        `get_upload_part_url`, or from the server, with `upload_part`.
+
+        This feature is optional.
+
+        Args:
+            video_id (str)
+            file_name (str)
+
+        Returns:
+            upload: arbitrary json-serializable upload object, which will be
+            passed as argument to the other upload methods.
+        """
+        raise NotImplementedError
+
+    def get_upload_part_url(self, upload, part_number, expires_in):
+        """
+        Return the url to which a part of the file should be uploaded with an
+        HTTP PUT request.
+
+        Args:
+            upload: object returned by `create_upload`
+            part_number (int): part number, starting at 1
+            expires_in (int): duration of validity of the url, in seconds
+        """
+        raise NotImplementedError
+
+    def upload_part(self, upload, part_number, file_object, size):
+        """
+        Upload a part of the file from the server. If a part with the same
+        number was already uploaded, it is replaced. All parts except the last
+        one must be at least 5 Mb large.
+
+        Args:
+            upload: object returned by `create_upload`
+            part_number (int): part number, starting at 1
+            file_object (file): file-like object from which the part is read
+            size (int): size of the part, in bytes
+        """
+        raise NotImplementedError
+
+    def complete_upload(self, upload):
+        """
+        Assemble all the uploaded parts into the video file, which can then be
+        transcoded.
+        """
+        raise NotImplementedError
+
+    def abort_upload(self, upload):
+        """
+        Cancel an upload and delete the uploaded parts.
+        """
+        raise NotImplementedError
+
     def start_transcoding(self, video_id):
         """
         Create and start transcoding jobs.
 
         Returns:
             jobs: iterable of arbitrary job objects. Each of these job objects
-            will be passed as argument to the `check_progress` method
+            will be passed as argument to the `check_progress` method. Job
+            objects must be json-serializable, as they are stored in the
+            database until transcoding is complete.
+        """
+        raise NotImplementedError
+
+    def get_job_id(self, job):
+        """
+        Return a unique identifier for a job object returned by
+        `start_transcoding`. This identifier is used to find the jobs that are
+        referenced by transcoding notifications.
+
+        Returns:
+            job_id (str)
+        """
+        return str(job)
+
+    def parse_notification(self, request):
+        """
+        Parse a notification sent by the transcoding service to the
+        transcoding notification endpoint. This method is only called when
+        transcoding progress is monitored with notifications, i.e: when
+        TRANSCODING_MONITORING = "notifications".
+
+        Notifications are not trusted: they only trigger a call to
+        `check_progress` for each of the referenced jobs.
+
+        Args:
+            request (HttpRequest)
+
+        Returns:
+            job_ids (list of str): identifiers, as returned by `get_job_id`,
+            of the jobs whose state has changed.
         """
         raise NotImplementedError
 
     def check_progress(self, job):
         """
         Monitor the progress of a transcoding job. This method will be called
-        periodically by the transcoding task.
+        periodically by the transcoding task, or whenever a notification
+        refers to this job.
 
         Args:
             job: arbitrary object that was returned by the `start_transcoding` method
 
         Returns:
+            JobProgress, or a (progress, finished) tuple, where:
             progress (float): progress percentage with a value between 0 and 100
             finished (bool): True if the job is finished
+            info (JobInfo): optional information about the job's output, once
+            the job is finished.
 
         Raises:
             TranscodingError in case of transcoding error. The exception
@@ -58,8 +178,9 @@ class BaseBackend(object):
     def get_job_info(self, job) -> JobInfo:
         """
         Returns information about the job's output. Will be called after the
-        job is done. Values are not mandatory but filling them is appreciated
-        by the upper layers.
+        job is done, unless this information was already returned by
+        `check_progress`. Values are not mandatory but filling them is
+        appreciated by the upper layers.
         """
         raise NotImplementedError
 
@@ -88,14 +209,29 @@ class BaseBackend(object):
         """
         raise NotImplementedError
 
-    def iter_formats(self, video_id):
+    def iter_formats(self, video_id, jobs=None):
         """
         Iterator on the available formats for that video. This method will be
         called after transcoding has finished.
 
+        Formats should be yielded in the same order as the jobs returned by
+        `start_transcoding`, which are passed as the `jobs` argument: backends
+        may derive formats from the job objects instead of scanning the
+        storage. When `jobs` is None, formats should be found on the storage.
+
         Yields:
-            format_name (str)
-            bitrate (float)
+            format (Format): or (format_name, bitrate) tuples, for video files
+        """
+        raise NotImplementedError
+
+    def manifest_url(self, video_id, kind):
+        """
+        Return the url of the master playlist of an adaptive streaming format
+        of the video: "hls" or "dash". As for `video_url`, this method should
+        be fast.
+
+        This feature is optional: it is only required by backends that yield
+        adaptive streaming formats in `iter_formats`.
         """
         raise NotImplementedError
 
@@ -161,6 +297,28 @@ class BaseBackend(object):
         """
         return ""
 
+    def sign_url(self, url):
+        """
+        Sign a url returned by `video_url`, `subtitle_url` or `thumbnail_url`.
+        These urls are stored in video snapshots and caches, so they should
+        not expire: time-limited urls should instead be generated by this
+        method, which is called whenever urls are served by the api. As for
+        the other url methods, the result should be fast or cached.
+
+        This feature is optional. If undefined, urls are not signed.
+        """
+        return url
+
+    def get_url_signature_period(self):
+        """
+        Identifier of the current validity period of signed urls: api
+        responses that include signed urls change with this identifier.
+
+        Returns:
+            period (int): None if urls are not signed.
+        """
+        return None
+
 
 class UndefinedPluginBackend(Exception):
     pass
@@ -170,9 +328,16 @@ class MissingPluginBackend(Exception):
     pass
 
 
+_backend = None
+_backend_lock = threading.Lock()
+
+
 def get() -> BaseBackend:
     """
-    Get the plugin backend based on the PLUGIN_BACKEND setting.
+    Get the plugin backend based on the PLUGIN_BACKEND setting. The backend is
+    created once per process and shared by all threads, such that backends may
+    reuse their clients and connections across calls. The backend is
+    re-created whenever settings are modified, e.g: with `override_settings`.
 
     Raises:
         UndefinedPluginBackend in case of undefined setting
@@ -180,6 +345,18 @@ def get() -> BaseBackend:
         MissingPluginBackend in case of a missing plugin class definition
 
     """
+    global _backend  # pylint: disable=global-statement
+
+    backend_object = _backend
+    if backend_object is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create()
+            backend_object = _backend
+    return backend_object
+
+
+def _create() -> BaseBackend:
     setting = getattr(settings, "PLUGIN_BACKEND")
     if setting is None:
         raise UndefinedPluginBackend()
@@ -192,8 +369,23 @@ def get() -> BaseBackend:
         backend_class = getattr(backend_module, object_name, None)
         if backend_class is None:
             raise MissingPluginBackend(setting)
-        # Note that we could cache the plugin backend across calls; we don't do
-        # it for now, because it's not really useful.
         backend_object = backend_class()
 
     return backend_object
+
+
+def reset():
+    """
+    Discard the current plugin backend, along with its clients. This should be
+    called in child processes after a fork, as connections should not be
+    shared between processes: for instance, in the gunicorn `post_fork` hook.
+    Celery worker processes are reset automatically.
+    """
+    global _backend  # pylint: disable=global-statement
+    with _backend_lock:
+        _backend = None
+
+
+@receiver(setting_changed)
+def reset_on_setting_changed(**kwargs):
+    reset()
@@ -1,28 +1,409 @@
+"""
+Two-tier cache of video api results: video details and video lists.
+
+Video content is stored in the shared django cache, which is common to all
+processes, and in a per-process LRU cache in front of it. Cache keys are
+stamped with a version number that is stored in the shared cache: invalidating
+a video increments its version, such that stale entries are ignored by all
+processes, including their local cache. A cache hit thus costs a single
+request to the shared cache. Likewise, the video lists of an owner are stamped
+with a per-owner generation that is incremented whenever one of their videos
+or playlists is modified. Transcoding progress is stored separately, such
+that progress updates do not invalidate the cache.
+"""
+import hashlib
 import json
+import math
+import random
+import threading
+from collections import OrderedDict
+from time import sleep, time
 
+from django.conf import settings
 from django.core.cache import cache
 
+# Cached content is refreshed after this delay (soft timeout), but it is kept in
+# the shared cache for VIDEO_CACHE_STALE_TIMEOUT more seconds, during which it
+# may be served while a single process recomputes it.
 VIDEO_CACHE_TIMEOUT = 3600
+VIDEO_CACHE_STALE_TIMEOUT = 3600
+# Content of a video is recomputed by a single process at a time: concurrent
+# requests serve stale content, or wait for the new content for at most
+# VIDEO_CACHE_LOCK_WAIT seconds.
+VIDEO_CACHE_LOCK_TIMEOUT = 10
+VIDEO_CACHE_LOCK_WAIT = 1
+# Content is refreshed before it expires with a probability that increases as
+# the expiration approaches, and with its computation time. Larger values
+# trigger earlier refreshes.
+VIDEO_CACHE_EARLY_REFRESH_BETA = 1.0
+# Progress entries must outlive the video content that was cached before they
+# were last updated.
+PROGRESS_CACHE_TIMEOUT = VIDEO_CACHE_TIMEOUT
+# Statuses of the videos for which the stored progress is merged in api results
+PROGRESS_STATUSES = ["pending", "processing"]
 
 
-def _cache_key(public_id):
+class LocalCache(object):
+    """
+    Thread-safe, per-process LRU cache. Values are shared by all threads and
+    must not be modified. Unless `max_size` is defined, the cache size is read
+    from the `max_size_setting` setting.
+    """
+
+    def __init__(self, max_size=None, max_size_setting="VIDEO_CACHE_LOCAL_SIZE"):
+        self._max_size = max_size
+        self._max_size_setting = max_size_setting
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return getattr(settings, self._max_size_setting)
+        return self._max_size
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+local_cache = LocalCache()
+
+
+def _version_key(public_id):
+    return "VIDEO_VERSION:" + public_id
+
+
+def _cache_key(public_id, version):
     """
     Key which stores the video content in the cache. Of course, the cache
     must be invalidated every time the video is saved.
     """
-    return "VIDEO:" + public_id
+    return "VIDEO:{}:{}".format(public_id, version)
 
 
-def invalidate(public_video_id):
-    cache.delete(_cache_key(public_video_id))
+def _stale_key(public_id):
+    """
+    Key which stores the latest content of a video, whatever its version.
+    """
+    return "VIDEO_STALE:" + public_id
+
+
+def _lock_key(key):
+    return "LOCK:" + key
+
+
+def _progress_key(public_id):
+    return "VIDEO_PROGRESS:" + public_id
+
+
+def _owner_version_key(owner_id):
+    return "VIDEOS_VERSION:{}".format(owner_id)
+
+
+def _list_cache_key(owner_id, query, version):
+    """
+    Key which stores a video list in the cache. The list is invalidated every
+    time one of the owner's videos or playlists is modified.
+    """
+    query_hash = hashlib.md5(query.encode("utf-8")).hexdigest()
+    return "VIDEOS:{}:{}:{}".format(owner_id, version, query_hash)
+
+
+def _initial_version():
+    # Versions are initialized with the current time, in microseconds, such
+    # that a version that was evicted from the shared cache is never re-used.
+    return int(time() * 1000000)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _modified_key(version_key):
+    return version_key + ":MODIFIED"
+
+
+def _increment_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing version: there is nothing to invalidate, but concurrent
+        # processes might have read the version before it was evicted.
+        cache.add(key, _initial_version() + 1, None)
+    cache.set(_modified_key(key), time(), None)
+
+
+def _get_validators(version_key, *keys):
+    """
+    Fetch a version, its modification time and additional values with a
+    single request to the shared cache.
+    """
+    values = cache.get_many([version_key, _modified_key(version_key)] + list(keys))
+    version = values.get(version_key)
+    if version is None:
+        version = _get_version(version_key)
+    return version, values.get(_modified_key(version_key)), values
+
+
+def _make_entry(data, delta=0):
+    """
+    Cache entries store the content along with its soft expiration date and
+    its computation time, in seconds.
+    """
+    return {"data": data, "delta": delta, "expires_at": time() + VIDEO_CACHE_TIMEOUT}
+
+
+def _is_expired(entry):
+    return time() >= entry["expires_at"]
+
+
+def _should_refresh(entry):
+    """
+    Probabilistic early refresh: see "Optimal Probabilistic Cache Stampede
+    Prevention", Vattani et al.
+    """
+    return (
+        time()
+        - entry["delta"]
+        * VIDEO_CACHE_EARLY_REFRESH_BETA
+        * math.log(1 - random.random())
+        >= entry["expires_at"]
+    )
+
+
+def _get_entry(key):
+    entry = local_cache.get(key)
+    if entry is None:
+        content = cache.get(key)
+        if content is None:
+            return None
+        entry = json.loads(content)
+        local_cache.set(key, entry)
+    return entry
+
 
+def _set_entry(key, entry):
+    cache.set(key, json.dumps(entry), VIDEO_CACHE_TIMEOUT + VIDEO_CACHE_STALE_TIMEOUT)
+    local_cache.set(key, entry)
 
-def get(public_video_id):
-    content = cache.get(_cache_key(public_video_id))
-    if content is not None:
-        return json.loads(content)
+
+def _get(key):
+    entry = _get_entry(key)
+    if entry is None or _is_expired(entry):
+        return None
+    return entry["data"]
+
+
+def _set(key, data):
+    _set_entry(key, _make_entry(data))
+
+
+def _wait_for_entry(key):
+    """
+    Wait for the content that is being computed by another process.
+    """
+    deadline = time() + VIDEO_CACHE_LOCK_WAIT
+    while time() < deadline:
+        sleep(0.05)
+        content = cache.get(key)
+        if content is not None:
+            entry = json.loads(content)
+            local_cache.set(key, entry)
+            return entry
     return None
 
 
-def set(public_video_id, data):
-    return cache.set(_cache_key(public_video_id), json.dumps(data), VIDEO_CACHE_TIMEOUT)
+def get_version(public_video_id):
+    """
+    Current version of the cached video content. The version should be read
+    before the video content is computed, and then passed to `set`: content
+    that is invalidated in the meantime is then never cached under the new
+    version.
+    """
+    return _get_version(_version_key(public_video_id))
+
+
+def invalidate(public_video_id):
+    _increment_version(_version_key(public_video_id))
+
+
+def get_validators(public_video_id):
+    """
+    Validators of the content of a video, for conditional requests. The etag
+    changes whenever the video is invalidated or its progress is updated.
+
+    Returns:
+        etag (str)
+        last_modified (float): modification timestamp, or None if unknown.
+    """
+    progress_key = _progress_key(public_video_id)
+    version, last_modified, values = _get_validators(
+        _version_key(public_video_id), progress_key
+    )
+    etag = str(version)
+    if values.get(progress_key) is not None:
+        etag += "-{}".format(values[progress_key])
+    return etag, last_modified
+
+
+def get(public_video_id, version=None):
+    if version is None:
+        version = get_version(public_video_id)
+    return _get(_cache_key(public_video_id, version))
+
+
+def set(public_video_id, data, version=None):
+    if version is None:
+        version = get_version(public_video_id)
+    _set(_cache_key(public_video_id, version), data)
+
+
+def get_or_set(public_video_id, compute):
+    """
+    Get the cached content of a video, or compute and cache it. Content is
+    computed by a single process at a time: while it is being computed,
+    concurrent calls serve the previous content of the video, if any, even if
+    it was invalidated. Content is also refreshed early, before it expires.
+
+    Args:
+        public_video_id (str)
+        compute (function): returns the content of the video. Exceptions are
+        propagated.
+    """
+    version = get_version(public_video_id)
+    key = _cache_key(public_video_id, version)
+    entry = _get_entry(key)
+    if entry is not None and not _should_refresh(entry):
+        return entry["data"]
+
+    lock_key = _lock_key(key)
+    is_locked = cache.add(lock_key, 1, VIDEO_CACHE_LOCK_TIMEOUT)
+    if not is_locked:
+        # Content is being computed by another process
+        if entry is None:
+            entry = _get_entry(_stale_key(public_video_id))
+        if entry is None:
+            entry = _wait_for_entry(key)
+        if entry is not None:
+            return entry["data"]
+
+    try:
+        start = time()
+        data = compute()
+        entry = _make_entry(data, time() - start)
+        _set_entry(key, entry)
+        cache.set(
+            _stale_key(public_video_id),
+            json.dumps(entry),
+            VIDEO_CACHE_TIMEOUT + VIDEO_CACHE_STALE_TIMEOUT,
+        )
+    finally:
+        if is_locked:
+            cache.delete(lock_key)
+    return data
+
+
+def get_owner_version(owner_id):
+    """
+    Current generation of the video lists of an owner. As for `get_version`,
+    it should be read before the list is computed.
+    """
+    return _get_version(_owner_version_key(owner_id))
+
+
+def invalidate_owner(owner_id):
+    _increment_version(_owner_version_key(owner_id))
+
+
+def get_owner_validators(owner_id):
+    """
+    Validators of the videos and playlists of an owner, for conditional
+    requests. See `get_validators`.
+    """
+    version, last_modified, _values = _get_validators(_owner_version_key(owner_id))
+    return str(version), last_modified
+
+
+def get_list(owner_id, query, version):
+    return _get(_list_cache_key(owner_id, query, version))
+
+
+def set_list(owner_id, query, data, version):
+    _set(_list_cache_key(owner_id, query, version), data)
+
+
+def set_progress(public_video_id, progress):
+    """
+    Store the transcoding progress of a video. Progress updates do not
+    invalidate the cached video content: instead, the progress is merged in
+    api results with `merge_progress`. The modification time of the video is
+    updated, as is its etag (see `get_validators`).
+    """
+    cache.set(_progress_key(public_video_id), progress, PROGRESS_CACHE_TIMEOUT)
+    cache.set(_modified_key(_version_key(public_video_id)), time(), None)
+
+
+def merge_progress(videos):
+    """
+    Merge the latest transcoding progress in the content of the videos that
+    are being processed. Cached content is not modified: modified videos are
+    copied.
+
+    Args:
+        videos (list): video api results
+
+    Returns:
+        videos (list)
+    """
+    processing_ids = [
+        video["id"]
+        for video in videos
+        if video.get("processing")
+        and video["processing"].get("status") in PROGRESS_STATUSES
+    ]
+    if not processing_ids:
+        return videos
+    progress = cache.get_many(
+        [_progress_key(public_id) for public_id in processing_ids]
+    )
+    if not progress:
+        return videos
+
+    merged_videos = []
+    for video in videos:
+        video_progress = progress.get(_progress_key(video["id"]))
+        if video_progress is not None and video["id"] in processing_ids:
+            video = dict(
+                video, processing=dict(video["processing"], progress=video_progress)
+            )
+        merged_videos.append(video)
+    return merged_videos
@@ -14,6 +14,32 @@ class TranscodingFailed(Exception):
     pass
 
 
+class UploadChunkInvalid(Exception):
+    """
+    Raised whenever a chunk of a resumable upload cannot be appended to the
+    uploaded file.
+    """
+
+    pass
+
+
+class UploadChunkConflict(UploadChunkInvalid):
+    """
+    Raised whenever the offset of a chunk of a resumable upload does not match
+    the number of bytes that were already received.
+    """
+
+    pass
+
+
+class StorageDeletionFailed(Exception):
+    """
+    Raised whenever some objects could not be deleted from the storage.
+    """
+
+    pass
+
+
 class SubtitleInvalid(Exception):
     """
     Raised whenever subtitle cannot be converted to utf8 or to VTT format.
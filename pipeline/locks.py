@@ -0,0 +1,331 @@
+"""
+Lock backends, which are used by `pipeline.tasks.Lock`. The lock backend is
+selected with the LOCK_BACKEND setting.
+
+Locks are acquired with a random token, which is required to release or
+extend them: a lock that expired and was acquired by another process is thus
+never released by its former owner.
+"""
+import hashlib
+import importlib
+import threading
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+
+class BaseLockBackend(object):
+    def acquire(self, name, token, timeout=None, blocking=False):
+        """
+        Acquire a lock.
+
+        Args:
+            name (str)
+            token (str): unique identifier of the lock owner
+            timeout (float): lock expiry duration, in seconds. Set to None if
+            the lock should not expire.
+            blocking (bool): if True, wait until the lock is available.
+
+        Returns:
+            acquired (bool)
+        """
+        raise NotImplementedError
+
+    def release(self, name, token=None):
+        """
+        Release a lock, if it is owned by the token. If the token is None, the
+        lock is released for all.
+
+        Returns:
+            released (bool)
+        """
+        raise NotImplementedError
+
+    def extend(self, name, token, timeout):
+        """
+        Reset the expiry duration of a lock, if it is still owned by the token.
+
+        Returns:
+            extended (bool)
+        """
+        raise NotImplementedError
+
+
+class CacheLockBackend(BaseLockBackend):
+    """
+    Locks stored in the default django cache. Ownership checks are not atomic,
+    and blocking calls poll the cache: prefer the Redis or Postgres backends
+    in production.
+    """
+
+    POLL_INTERVAL = 0.1
+    POLL_MAX_INTERVAL = 2
+
+    def acquire(self, name, token, timeout=None, blocking=False):
+        interval = self.POLL_INTERVAL
+        while not cache.add(name, token, timeout=timeout):
+            if not blocking:
+                return False
+            sleep(interval)
+            interval = min(2 * interval, self.POLL_MAX_INTERVAL)
+        return True
+
+    def release(self, name, token=None):
+        if token is not None and cache.get(name) != token:
+            return False
+        cache.delete(name)
+        return True
+
+    def extend(self, name, token, timeout):
+        if cache.get(name) != token:
+            return False
+        cache.set(name, token, timeout=timeout)
+        return True
+
+
+class MemoryLockBackend(BaseLockBackend):
+    """
+    Locks stored in the memory of the current process, for test purposes.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._condition = threading.Condition()
+
+    def _get_owner(self, name):
+        token, expires_at = self._locks.get(name, (None, None))
+        if expires_at is not None and monotonic() >= expires_at:
+            del self._locks[name]
+            return None
+        return token
+
+    def _set_owner(self, name, token, timeout):
+        expires_at = None if timeout is None else monotonic() + timeout
+        self._locks[name] = (token, expires_at)
+
+    def acquire(self, name, token, timeout=None, blocking=False):
+        with self._condition:
+            while self._get_owner(name) is not None:
+                if not blocking:
+                    return False
+                # Wake up on release, or when the lock expires
+                expires_at = self._locks[name][1]
+                self._condition.wait(
+                    None if expires_at is None else expires_at - monotonic()
+                )
+            self._set_owner(name, token, timeout)
+            return True
+
+    def release(self, name, token=None):
+        with self._condition:
+            owner = self._get_owner(name)
+            if owner is None or token not in (None, owner):
+                return False
+            del self._locks[name]
+            self._condition.notify_all()
+            return True
+
+    def extend(self, name, token, timeout):
+        with self._condition:
+            if self._get_owner(name) != token:
+                return False
+            self._set_owner(name, token, timeout)
+            return True
+
+
+class PostgresLockBackend(BaseLockBackend):
+    """
+    Postgres session-level advisory locks. Locks are held by a dedicated
+    database connection per thread, which is reused by all calls and is
+    unaffected by the transactions of the current thread: blocking calls wait
+    on the database server, and locks are released as soon as their
+    connection is closed, e.g: when a worker is killed. As a consequence,
+    locks do not expire and the timeout is ignored.
+    """
+
+    def __init__(self, using="default"):
+        self.using = using
+        # Locks held by the current process: {token: (name, connection)}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(name):
+        # Advisory lock keys are signed 64-bit integers
+        digest = hashlib.md5(name.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or connection.closed:
+            database = connections[self.using]
+            connection = database.get_new_connection(database.get_connection_params())
+            connection.autocommit = True
+            self._local.connection = connection
+        return connection
+
+    def _is_held(self, name, connection):
+        with self._lock:
+            return any(
+                lock_name == name and lock_connection is connection
+                for lock_name, lock_connection in self._locks.values()
+            )
+
+    def acquire(self, name, token, timeout=None, blocking=False):
+        connection = self._get_connection()
+        if self._is_held(name, connection):
+            # Advisory locks are re-entrant within a session
+            return False
+        try:
+            with connection.cursor() as cursor:
+                if blocking:
+                    cursor.execute("SELECT pg_advisory_lock(%s)", [self._key(name)])
+                    is_acquired = True
+                else:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", [self._key(name)])
+                    is_acquired = cursor.fetchone()[0]
+        except Exception:
+            # Locks of a broken session are lost
+            connection.close()
+            raise
+        if is_acquired:
+            with self._lock:
+                self._locks[token] = (name, connection)
+        return is_acquired
+
+    def release(self, name, token=None):
+        with self._lock:
+            # Locks held by other processes cannot be released
+            tokens = [
+                lock_token
+                for lock_token, (lock_name, _connection) in self._locks.items()
+                if lock_name == name and token in (None, lock_token)
+            ]
+            held = [self._locks.pop(lock_token) for lock_token in tokens]
+        released = False
+        for _name, connection in held:
+            if connection.closed:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [self._key(name)])
+                released = cursor.fetchone()[0] or released
+        return released
+
+    def extend(self, name, token, timeout):
+        with self._lock:
+            lock_name, connection = self._locks.get(token, (None, None))
+        return lock_name == name and not connection.closed
+
+
+class RedisLockBackend(BaseLockBackend):
+    """
+    Redis locks, acquired with SET NX and released or extended with atomic
+    scripts that check the lock token. Released locks are signaled to blocked
+    callers on a separate list, on which they wait with BLPOP.
+
+    Requires the redis package; the server is configured with the
+    LOCK_REDIS_URL setting.
+    """
+
+    KEY_PREFIX = "videofront:lock:"
+    # Signals are short-lived: stale signals only result in an additional
+    # acquisition attempt.
+    SIGNAL_TIMEOUT_MS = 1000
+    RELEASE_SCRIPT = """
+if ARGV[1] == "" or redis.call("get", KEYS[1]) == ARGV[1] then
+    if redis.call("del", KEYS[1]) == 1 then
+        redis.call("rpush", KEYS[2], 1)
+        redis.call("pexpire", KEYS[2], ARGV[2])
+        return 1
+    end
+end
+return 0
+"""
+    EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == "" then
+    return redis.call("persist", KEYS[1]) + 1
+end
+return redis.call("pexpire", KEYS[1], ARGV[2])
+"""
+
+    def __init__(self, url=None):
+        import redis  # pylint: disable=import-outside-toplevel
+
+        self.client = redis.StrictRedis.from_url(url or settings.LOCK_REDIS_URL)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+        self._extend = self.client.register_script(self.EXTEND_SCRIPT)
+
+    def _keys(self, name):
+        key = self.KEY_PREFIX + name
+        return [key, key + ":signal"]
+
+    def acquire(self, name, token, timeout=None, blocking=False):
+        key, signal_key = self._keys(name)
+        px = None if timeout is None else int(timeout * 1000)
+        while not self.client.set(key, token, nx=True, px=px):
+            if not blocking:
+                return False
+            ttl = self.client.pttl(key)
+            if ttl == -2:
+                # Lock was released in the meantime
+                continue
+            # Wait for a release signal, or for the lock expiry (0 = forever)
+            self.client.blpop([signal_key], timeout=0 if ttl < 0 else -(-ttl // 1000))
+        return True
+
+    def release(self, name, token=None):
+        return bool(
+            self._release(
+                keys=self._keys(name), args=[token or "", self.SIGNAL_TIMEOUT_MS]
+            )
+        )
+
+    def extend(self, name, token, timeout):
+        px = "" if timeout is None else int(timeout * 1000)
+        return bool(self._extend(keys=self._keys(name)[:1], args=[token, px]))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get():
+    """
+    Get the lock backend based on the LOCK_BACKEND setting. As for plugin
+    backends, the lock backend is created once per process, and re-created
+    whenever settings are modified.
+    """
+    global _backend  # pylint: disable=global-statement
+
+    backend_object = _backend
+    if backend_object is None:
+        with _backend_lock:
+            if _backend is None:
+                module_name, class_name = settings.LOCK_BACKEND.rsplit(".", 1)
+                _backend = getattr(importlib.import_module(module_name), class_name)()
+            backend_object = _backend
+    return backend_object
+
+
+def reset():
+    """
+    Discard the current lock backend. As for plugin backends, this should be
+    called in child processes after a fork.
+    """
+    global _backend  # pylint: disable=global-statement
+    with _backend_lock:
+        _backend = None
+
+
+@receiver(setting_changed)
+def reset_on_setting_changed(**kwargs):
+    if kwargs["setting"] == "LOCK_BACKEND":
+        reset()
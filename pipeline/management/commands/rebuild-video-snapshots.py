@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from pipeline import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the api snapshots of videos, e.g: after the settings that "
+        "affect video urls were modified."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "video_ids", nargs="*", help="Public video IDs. Defaults to all videos."
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of videos rebuilt per query",
+        )
+
+    def handle(self, *args, **options):
+        count = models.rebuild_snapshots(
+            public_video_ids=options["video_ids"] or None,
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write("Rebuilt {} video snapshots.".format(count))
@@ -0,0 +1,78 @@
+# Generated by Django 2.2 on 2026-10-16 20:33
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0018_auto_20190415_1005")]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingstate",
+            name="delete_on_failure",
+            field=models.BooleanField(
+                default=True,
+                verbose_name="Delete video assets in case of transcoding failure",
+            ),
+        ),
+        migrations.CreateModel(
+            name="TranscodingJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "job_id",
+                    models.CharField(
+                        db_index=True,
+                        max_length=128,
+                        verbose_name="Backend job identifier",
+                    ),
+                ),
+                ("content", models.TextField()),
+                (
+                    "progress",
+                    models.FloatField(
+                        default=0,
+                        validators=[
+                            django.core.validators.MinValueValidator(0),
+                            django.core.validators.MaxValueValidator(100),
+                        ],
+                        verbose_name="Progress percentage",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("failed", "Failed"),
+                            ("success", "Success"),
+                        ],
+                        default="pending",
+                        max_length=32,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("message", models.CharField(blank=True, max_length=1024)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transcoding_jobs",
+                        to="pipeline.Video",
+                    ),
+                ),
+            ],
+            options={"ordering": ["id"]},
+        ),
+    ]
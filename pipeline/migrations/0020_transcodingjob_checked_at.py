@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-16 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0019_auto_20261016_2233")]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcodingjob",
+            name="checked_at",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Time of the last progress check"
+            ),
+        )
+    ]
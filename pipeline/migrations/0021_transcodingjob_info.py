@@ -0,0 +1,18 @@
+# Generated by Django 2.2 on 2026-10-16 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0020_transcodingjob_checked_at")]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcodingjob",
+            name="info",
+            field=models.TextField(
+                blank=True, verbose_name="Json-serialized job output information"
+            ),
+        )
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0021_transcodingjob_info")]
+
+    operations = [
+        migrations.CreateModel(
+            name="StorageDeletion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("public_video_id", models.CharField(db_index=True, max_length=20)),
+                ("public_subtitle_id", models.CharField(blank=True, max_length=20)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "attempted_at",
+                    models.DateTimeField(
+                        blank=True,
+                        null=True,
+                        verbose_name="Time of the last deletion attempt",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Number of failed deletion attempts"
+                    ),
+                ),
+                ("message", models.CharField(blank=True, max_length=1024)),
+            ],
+            options={"ordering": ["id"]},
+        )
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2 on 2026-10-16 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0022_storagedeletion")]
+
+    operations = [
+        migrations.AddField(
+            model_name="videouploadurl",
+            name="file_name",
+            field=models.CharField(
+                blank=True,
+                max_length=255,
+                verbose_name="Name of the directly uploaded file",
+            ),
+        ),
+        migrations.AddField(
+            model_name="videouploadurl",
+            name="file_size",
+            field=models.BigIntegerField(
+                blank=True,
+                null=True,
+                verbose_name="Size of the directly uploaded file, in bytes",
+            ),
+        ),
+        migrations.AddField(
+            model_name="videouploadurl",
+            name="upload",
+            field=models.TextField(
+                blank=True, verbose_name="Json-serialized storage upload object"
+            ),
+        ),
+    ]
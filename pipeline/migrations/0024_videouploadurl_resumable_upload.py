@@ -0,0 +1,25 @@
+# Generated by Django 2.2 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0023_videouploadurl_direct_upload")]
+
+    operations = [
+        migrations.AddField(
+            model_name="videouploadurl",
+            name="upload_offset",
+            field=models.BigIntegerField(
+                default=0, verbose_name="Number of bytes received by resumable uploads"
+            ),
+        ),
+        migrations.AddField(
+            model_name="videouploadurl",
+            name="upload_parts",
+            field=models.IntegerField(
+                default=0, verbose_name="Number of parts uploaded by resumable uploads"
+            ),
+        ),
+    ]
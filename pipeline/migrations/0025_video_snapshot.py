@@ -0,0 +1,14 @@
+# Generated by Django 2.2 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0024_videouploadurl_resumable_upload")]
+
+    operations = [
+        migrations.AddField(
+            model_name="video", name="snapshot", field=models.TextField(blank=True)
+        )
+    ]
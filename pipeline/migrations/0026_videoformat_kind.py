@@ -0,0 +1,20 @@
+# Generated by Django 2.2 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0025_video_snapshot")]
+
+    operations = [
+        migrations.AddField(
+            model_name="videoformat",
+            name="kind",
+            field=models.CharField(
+                choices=[("file", "File"), ("hls", "HLS"), ("dash", "DASH")],
+                default="file",
+                max_length=16,
+            ),
+        )
+    ]
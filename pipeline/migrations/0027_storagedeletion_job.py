@@ -0,0 +1,28 @@
+# Generated by Django 2.2 on 2026-10-16 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("pipeline", "0026_videoformat_kind")]
+
+    operations = [
+        migrations.AddField(
+            model_name="storagedeletion",
+            name="content",
+            field=models.TextField(
+                blank=True, verbose_name="Json-serialized unfinished transcoding job"
+            ),
+        ),
+        migrations.AddField(
+            model_name="storagedeletion",
+            name="job_id",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                max_length=128,
+                verbose_name="Backend identifier of the unfinished transcoding job",
+            ),
+        ),
+    ]
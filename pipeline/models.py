@@ -1,4 +1,7 @@
-from django.conf import global_settings
+import json
+import logging
+
+from django.conf import global_settings, settings
 from django.contrib.auth.models import User
 from django.core.validators import (
     MaxValueValidator,
@@ -6,11 +9,14 @@ from django.core.validators import (
     MinValueValidator,
 )
 from django.db import models
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
 from . import backend, cache, managers, utils
 
+logger = logging.getLogger(__name__)
+
 
 class Video(models.Model):
     """
@@ -43,9 +49,21 @@ class Video(models.Model):
 
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    # Json-encoded api representation of the video, including its processing
+    # state, subtitles and formats. It is rebuilt whenever the video or one of
+    # its related objects is modified. Empty snapshots are rebuilt on read.
+    snapshot = models.TextField(blank=True)
+
     def __str__(self):
         return "{} - {}".format(self.public_id, self.title)
 
+    def serialize(self):
+        """
+        Api representation of the video, as stored in its snapshot.
+        """
+        serializer_class = import_string(settings.VIDEO_SNAPSHOT_SERIALIZER)
+        return serializer_class(self).data
+
     @property
     def processing_status(self):
         return self.processing_state.status if self.processing_state else None
@@ -62,6 +80,23 @@ class Video(models.Model):
     def thumbnail_url(self):
         return backend.get().thumbnail_url(self.public_id, self.public_thumbnail_id)
 
+    @property
+    def file_formats(self):
+        # Formats are filtered in python, such that prefetched formats are used
+        return [
+            video_format
+            for video_format in self.formats.all()
+            if video_format.kind == VideoFormat.KIND_FILE
+        ]
+
+    @property
+    def streaming_formats(self):
+        return [
+            video_format
+            for video_format in self.formats.all()
+            if video_format.kind != VideoFormat.KIND_FILE
+        ]
+
 
 @receiver(post_save, sender=Video)
 def create_video_processing_state(sender, instance=None, created=False, **kwargs):
@@ -72,6 +107,27 @@ def create_video_processing_state(sender, instance=None, created=False, **kwargs
         ProcessingState.objects.create(video=instance)
 
 
+@receiver(pre_delete, sender=Video)
+def create_transcoding_job_deletions(sender, instance=None, **kwargs):
+    """
+    Transcoding jobs are deleted along with their video, but unfinished jobs
+    may still write outputs to the storage: keep track of these jobs so that
+    their outputs are deleted once they are finished.
+    """
+    StorageDeletion.objects.bulk_create(
+        [
+            StorageDeletion(
+                public_video_id=instance.public_id,
+                job_id=transcoding_job.job_id,
+                content=transcoding_job.content,
+            )
+            for transcoding_job in instance.transcoding_jobs.filter(
+                status=TranscodingJob.STATUS_PENDING
+            )
+        ]
+    )
+
+
 class Playlist(models.Model):
     name = models.CharField(max_length=128, db_index=True)
     videos = models.ManyToManyField(Video, related_name="playlists")
@@ -95,6 +151,10 @@ class VideoUploadUrl(models.Model):
     associated an expiration date after which is cannot be used. Note however
     that an upload that has started just before the expiry date should proceed
     normally.
+
+    Video files may also be uploaded directly to the storage, or in chunks
+    with resumable uploads, in which case the `upload` attribute stores the
+    storage-side upload object.
     """
 
     public_video_id = models.CharField(
@@ -127,12 +187,41 @@ class VideoUploadUrl(models.Model):
         blank=True,
         null=True,
     )
+    file_name = models.CharField(
+        verbose_name="Name of the directly uploaded file", max_length=255, blank=True
+    )
+    file_size = models.BigIntegerField(
+        verbose_name="Size of the directly uploaded file, in bytes",
+        null=True,
+        blank=True,
+    )
+    upload = models.TextField(
+        verbose_name="Json-serialized storage upload object", blank=True
+    )
+    upload_offset = models.BigIntegerField(
+        verbose_name="Number of bytes received by resumable uploads", default=0
+    )
+    upload_parts = models.IntegerField(
+        verbose_name="Number of parts uploaded by resumable uploads", default=0
+    )
 
     objects = managers.VideoUploadUrlManager()
 
     def __str__(self):
         return self.public_video_id
 
+    @property
+    def storage_upload(self):
+        """
+        Upload object returned by the backend `create_upload` method, for
+        direct uploads to the storage.
+        """
+        return json.loads(self.upload) if self.upload else None
+
+    @storage_upload.setter
+    def storage_upload(self, value):
+        self.upload = json.dumps(value) if value is not None else ""
+
 
 class ProcessingState(models.Model):
 
@@ -168,11 +257,131 @@ class ProcessingState(models.Model):
         default=STATUS_PENDING,
     )
     message = models.CharField(max_length=1024, blank=True)
+    delete_on_failure = models.BooleanField(
+        verbose_name="Delete video assets in case of transcoding failure", default=True
+    )
 
     def __str__(self):
         return "{} - {}".format(self.video, self.status)
 
 
+class TranscodingJob(models.Model):
+    """
+    A transcoding job created by the plugin backend. Jobs are stored in the
+    database so that their progress can be monitored outside of the task that
+    started them.
+
+    The `content` attribute stores the json-serialized job object returned by
+    the backend `start_transcoding` method. The `info` attribute stores the job
+    output information, when it is returned by the backend `check_progress`
+    method.
+    """
+
+    STATUS_PENDING = ProcessingState.STATUS_PENDING
+    STATUS_FAILED = ProcessingState.STATUS_FAILED
+    STATUS_SUCCESS = ProcessingState.STATUS_SUCCESS
+    STATUSES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_SUCCESS, "Success"),
+    )
+
+    video = models.ForeignKey(
+        Video, related_name="transcoding_jobs", on_delete=models.CASCADE
+    )
+    job_id = models.CharField(
+        verbose_name="Backend job identifier", max_length=128, db_index=True
+    )
+    content = models.TextField()
+    info = models.TextField(
+        verbose_name="Json-serialized job output information", blank=True
+    )
+    progress = models.FloatField(
+        verbose_name="Progress percentage",
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)],
+    )
+    status = models.CharField(
+        verbose_name="Status",
+        max_length=32,
+        choices=STATUSES,
+        blank=False,
+        default=STATUS_PENDING,
+    )
+    message = models.CharField(max_length=1024, blank=True)
+    checked_at = models.DateTimeField(
+        verbose_name="Time of the last progress check", auto_now=True
+    )
+
+    class Meta:
+        ordering = ["id"]
+
+    @property
+    def job(self):
+        return json.loads(self.content)
+
+    @property
+    def job_info(self):
+        return backend.JobInfo(**json.loads(self.info)) if self.info else None
+
+    @job_info.setter
+    def job_info(self, value):
+        self.info = json.dumps(value._asdict()) if value else ""
+
+    @property
+    def is_finished(self):
+        return self.status != self.STATUS_PENDING
+
+    def __str__(self):
+        return "{} - {} [{}]".format(self.job_id, self.video, self.status)
+
+
+class StorageDeletion(models.Model):
+    """
+    Video or subtitle assets that must be deleted from the storage. Deletions
+    are performed asynchronously, and the failed ones are retried periodically
+    until they succeed. When `public_subtitle_id` is empty, all the assets of
+    the video are deleted.
+
+    Videos that are deleted during transcoding also get one deletion per
+    unfinished transcoding job, which stores the json-serialized job in the
+    `content` attribute: since the job may still write outputs to the storage,
+    these deletions are only performed once the job is finished.
+    """
+
+    public_video_id = models.CharField(max_length=20, db_index=True)
+    public_subtitle_id = models.CharField(max_length=20, blank=True)
+    job_id = models.CharField(
+        verbose_name="Backend identifier of the unfinished transcoding job",
+        max_length=128,
+        blank=True,
+        db_index=True,
+    )
+    content = models.TextField(
+        verbose_name="Json-serialized unfinished transcoding job", blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempted_at = models.DateTimeField(
+        verbose_name="Time of the last deletion attempt", null=True, blank=True
+    )
+    attempts = models.PositiveIntegerField(
+        verbose_name="Number of failed deletion attempts", default=0
+    )
+    message = models.CharField(max_length=1024, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    @property
+    def job(self):
+        return json.loads(self.content) if self.content else None
+
+    def __str__(self):
+        if self.public_subtitle_id:
+            return "{} - {}".format(self.public_video_id, self.public_subtitle_id)
+        return self.public_video_id
+
+
 class Subtitle(models.Model):
 
     video = models.ForeignKey(Video, related_name="subtitles", on_delete=models.CASCADE)
@@ -204,8 +413,16 @@ class Subtitle(models.Model):
 
 class VideoFormat(models.Model):
 
+    # Progressive video file, or adaptive streaming rendition set, which is
+    # served by a master playlist (manifest)
+    KIND_FILE = "file"
+    KIND_HLS = "hls"
+    KIND_DASH = "dash"
+    KINDS = ((KIND_FILE, "File"), (KIND_HLS, "HLS"), (KIND_DASH, "DASH"))
+
     video = models.ForeignKey(Video, related_name="formats", on_delete=models.CASCADE)
     name = models.CharField(max_length=128)
+    kind = models.CharField(max_length=16, choices=KINDS, default=KIND_FILE)
     bitrate = models.FloatField(validators=[MinValueValidator(0)])
     width = models.IntegerField(null=True, validators=[MinValueValidator(0)])
     height = models.IntegerField(null=True, validators=[MinValueValidator(0)])
@@ -218,7 +435,9 @@ class VideoFormat(models.Model):
 
     @property
     def url(self):
-        return backend.get().video_url(self.video.public_id, self.name)
+        if self.kind == self.KIND_FILE:
+            return backend.get().video_url(self.video.public_id, self.name)
+        return backend.get().manifest_url(self.video.public_id, self.kind)
 
     def __str__(self):
         return "{} - {} [{}]".format(self.name, self.video, self.bitrate)
@@ -227,7 +446,7 @@ class VideoFormat(models.Model):
 @receiver([post_save, post_delete], sender=Video)
 def invalidate_video_cache(sender, instance=None, created=False, **kwargs):
     if instance:
-        invalidate_cache(instance.public_id)
+        invalidate_cache(instance.public_id, instance.owner_id)
 
 
 @receiver([post_save, post_delete], sender=Subtitle)
@@ -238,8 +457,113 @@ def invalidate_related_video_cache(sender, instance=None, created=False, **kwarg
     Invalidate the video cache whenever a related object is saved.
     """
     if instance:
-        invalidate_cache(instance.video.public_id)
+        invalidate_cache(instance.video.public_id, instance.video.owner_id)
+
+
+@receiver([post_save, post_delete], sender=Playlist)
+def invalidate_playlist_cache(sender, instance=None, created=False, **kwargs):
+    """
+    Invalidate the video lists of the owner, which can be filtered by playlist.
+    """
+    if instance:
+        cache.invalidate_owner(instance.owner_id)
+
+
+@receiver(m2m_changed, sender=Playlist.videos.through)
+def invalidate_playlist_videos_cache(sender, instance=None, action=None, **kwargs):
+    """
+    Invalidate the video lists of the owner whenever videos are added to or
+    removed from a playlist.
+    """
+    if instance and action in ["post_add", "post_remove", "post_clear"]:
+        cache.invalidate_owner(instance.owner_id)
 
 
-def invalidate_cache(public_video_id):
+def invalidate_cache(public_video_id, owner_id=None):
+    """
+    Rebuild the video snapshot, then invalidate the cached video and the video
+    lists of its owner.
+    """
+    video = update_snapshot(public_video_id)
     cache.invalidate(public_video_id)
+    if owner_id is None and video is not None:
+        owner_id = video.owner_id
+    if owner_id is not None:
+        cache.invalidate_owner(owner_id)
+
+
+def _get_snapshot_queryset():
+    return Video.objects.select_related("processing_state").prefetch_related(
+        "subtitles", "formats"
+    )
+
+
+def update_snapshot(public_video_id):
+    """
+    Rebuild the snapshot of a video. Snapshot errors (e.g: from the plugin
+    backend) are logged, and the snapshot is then rebuilt on read.
+
+    Returns:
+        video (Video): None if the video does not exist.
+    """
+    video = _get_snapshot_queryset().filter(public_id=public_video_id).first()
+    if video is None:
+        return None
+    try:
+        video.snapshot = json.dumps(video.serialize())
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Could not build snapshot of video %s", public_video_id)
+        video.snapshot = ""
+    # Snapshot updates must not trigger the post_save receivers
+    Video.objects.filter(pk=video.pk).update(snapshot=video.snapshot)
+    return video
+
+
+def get_snapshot(public_video_id, snapshot):
+    """
+    Decode the snapshot of a video. Empty snapshots are rebuilt.
+
+    Returns:
+        data (dict): None if the video does not exist.
+    """
+    if not snapshot:
+        video = _get_snapshot_queryset().filter(public_id=public_video_id).first()
+        if video is None:
+            return None
+        data = video.serialize()
+        Video.objects.filter(pk=video.pk).update(snapshot=json.dumps(data))
+        return data
+    return json.loads(snapshot)
+
+
+def rebuild_snapshots(public_video_ids=None, batch_size=100):
+    """
+    Rebuild the snapshots of multiple videos, in batches, and invalidate their
+    cache.
+
+    Returns:
+        count (int): number of rebuilt snapshots.
+    """
+    videos = Video.objects.order_by("id")
+    if public_video_ids is not None:
+        videos = videos.filter(public_id__in=public_video_ids)
+    pks = list(videos.values_list("pk", flat=True))
+    for start in range(0, len(pks), batch_size):
+        batch = list(
+            _get_snapshot_queryset().filter(pk__in=pks[start : start + batch_size])
+        )
+        for video in batch:
+            video.snapshot = json.dumps(video.serialize())
+        Video.objects.bulk_update(batch, ["snapshot"])
+        for video in batch:
+            cache.invalidate(video.public_id)
+        for owner_id in set(video.owner_id for video in batch):
+            cache.invalidate_owner(owner_id)
+    return len(pks)
+
+
+def cache_progress(public_video_id, progress):
+    """
+    Store the transcoding progress of a video, without invalidating the cache.
+    """
+    cache.set_progress(public_video_id, progress)
@@ -1,29 +1,40 @@
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
 from tempfile import NamedTemporaryFile
 from time import sleep
+from uuid import uuid4
 
 import pycaption
 from celery import shared_task
+from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
 from django.db.transaction import TransactionManagementError
 from django.utils.timezone import now
 
 from videofront.celery_videofront import send_task
 
-from . import backend, exceptions, models, utils
+from . import backend, exceptions, locks, models, utils
 
 logger = logging.getLogger(__name__)
 
 
 class Lock(object):
     """
-    Lock context manager.
+    Lock context manager. Locks are stored by the LOCK_BACKEND.
 
     Usage:
 
         with Lock('mylockname', timeout=3600) as lock:
             if lock.is_acquired:
                 run_not_thread_safe_code()
+                # Renew the lease of long-running tasks
+                lock.extend()
     """
 
     def __init__(self, name, timeout=60, wait=False):
@@ -40,48 +51,87 @@ class Lock(object):
         self.timeout = timeout
         self.wait = wait
         self.is_acquired = False
+        self.token = None
 
     def __enter__(self):
         try:
-            acquire_lock(self.name, expires_in=self.timeout)
+            self.token = acquire_lock(self.name, expires_in=self.timeout)
             self.is_acquired = True
         except exceptions.LockUnavailable:
             if self.wait:
-                while cache.get(self.name) is not None:
-                    sleep(0.1)
+                token = acquire_lock(self.name, expires_in=self.timeout, blocking=True)
+                release_lock(self.name, token)
         return self
 
     def __exit__(self, exc_t, exc_v, trace):
         if self.is_acquired:
-            release_lock(self.name)
+            release_lock(self.name, self.token)
             self.is_acquired = False
+            self.token = None
 
+    def extend(self, timeout=None):
+        """
+        Reset the lock expiry duration to `timeout`, or to the initial timeout.
+
+        Returns:
+            extended (bool): False if the lock was lost, e.g: because it expired
+            and was acquired by another process.
+        """
+        if not self.is_acquired:
+            return False
+        return extend_lock(
+            self.name, self.token, self.timeout if timeout is None else timeout
+        )
 
-def acquire_lock(name, expires_in=None):
+
+def acquire_lock(name, expires_in=None, blocking=False):
     """
-    Acquire a database lock. Raises LockUnavailable when the lock is unavailable.
+    Acquire a lock. Raises LockUnavailable when the lock is unavailable.
+
+    Args:
+        name (str)
+        expires_in (int): lock expiry duration, in seconds
+        blocking (bool): wait until the lock is available
+
+    Returns:
+        token (str): identifier of the lock owner, which is required to
+        release or extend the lock.
     """
-    if cache.add(name, True, timeout=expires_in):
-        return True
+    token = uuid4().hex
+    if locks.get().acquire(name, token, timeout=expires_in, blocking=blocking):
+        return token
     raise exceptions.LockUnavailable(name)
 
 
-def release_lock(name):
+def release_lock(name, token=None):
     """
-    Release a lock for all. Note that the lock will be released even if it was
-    never acquired.
+    Release a lock, if it is owned by the token. Without token, the lock will
+    be released for all, even if it was never acquired.
     """
     # Note that in unit tests, and in case the wrapped code raises an
-    # IntegrityError, releasing the cache will result in a
-    # TransactionManagementError. This is because unit tests run inside atomic
-    # blocks. We cannot execute queries inside an atomic block if a transaction
-    # needs to be rollbacked.
+    # IntegrityError, releasing a lock from the database cache will result in
+    # a TransactionManagementError. This is because unit tests run inside
+    # atomic blocks. We cannot execute queries inside an atomic block if a
+    # transaction needs to be rollbacked.
     try:
-        cache.delete(name)
+        locks.get().release(name, token)
     except TransactionManagementError:
         logger.error("Could not release lock %s", name)
 
 
+def extend_lock(name, token, expires_in=None):
+    """
+    Reset the expiry duration of a lock that is owned by the token.
+
+    Returns:
+        extended (bool)
+    """
+    extended = locks.get().extend(name, token, expires_in)
+    if not extended:
+        logger.warning("Could not extend lock %s", name)
+    return extended
+
+
 def upload_video(public_video_id, file_object):
     """
     Store a video file for transcoding.
@@ -102,17 +152,176 @@ def upload_video(public_video_id, file_object):
     # Upload video
     backend.get().upload_video(public_video_id, file_object)
 
-    # Create video object
+    _create_uploaded_video(video_upload_url, file_object.name)
+
+
+def complete_upload(public_video_id):
+    """
+    Complete the direct upload of a video file to the storage, then start
+    transcoding. In case of failure, e.g: because some parts are missing, the
+    upload url remains available.
+
+    Args:
+        public_video_id (str)
+    """
+    # Make upload url unavailable immediately to avoid race conditions
+    models.VideoUploadUrl.objects.filter(public_video_id=public_video_id).update(
+        was_used=True
+    )
+
+    video_upload_url = models.VideoUploadUrl.objects.get(
+        public_video_id=public_video_id
+    )
+
+    try:
+        backend.get().complete_upload(video_upload_url.storage_upload)
+    except Exception:
+        models.VideoUploadUrl.objects.filter(public_video_id=public_video_id).update(
+            was_used=False
+        )
+        raise
+
+    _create_uploaded_video(video_upload_url, video_upload_url.file_name)
+
+
+def start_streamed_upload(public_video_id, file_name):
+    """
+    Start the multipart upload of a file that is streamed to the storage while
+    it is received. The previous upload to the same url, if any, e.g: from an
+    interrupted or concurrent request, is aborted, such that its parts are not
+    left in the storage.
+
+    Args:
+        public_video_id (str)
+        file_name (str)
+
+    Returns:
+        upload (dict): as returned by the `create_upload` backend method
+
+    Raises:
+        NotImplementedError if the backend does not support multipart uploads
+    """
+    with transaction.atomic():
+        video_upload_url = models.VideoUploadUrl.objects.select_for_update().get(
+            public_video_id=public_video_id
+        )
+        upload = backend.get().create_upload(public_video_id, file_name)
+        if video_upload_url.storage_upload is not None:
+            try:
+                backend.get().abort_upload(video_upload_url.storage_upload)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to abort upload: %s", video_upload_url)
+        video_upload_url.file_name = file_name
+        video_upload_url.storage_upload = upload
+        video_upload_url.save(update_fields=["file_name", "upload"])
+    return upload
+
+
+def start_resumable_upload(public_video_id, file_name, file_size):
+    """
+    Create the storage-side upload of a resumable upload. Nothing happens if
+    the upload was already started.
+
+    Args:
+        public_video_id (str)
+        file_name (str)
+        file_size (int): total size of the file, in bytes
+    """
+    with Lock("TASK_LOCK_RESUMABLE_UPLOAD:" + public_video_id, 3600) as lock:
+        if not lock.is_acquired:
+            raise exceptions.LockUnavailable()
+        video_upload_url = models.VideoUploadUrl.objects.available().get(
+            public_video_id=public_video_id
+        )
+        if video_upload_url.storage_upload is not None:
+            return
+        video_upload_url.file_name = file_name
+        video_upload_url.file_size = file_size
+        video_upload_url.storage_upload = backend.get().create_upload(
+            public_video_id, file_name
+        )
+        video_upload_url.save()
+
+
+def upload_chunk(public_video_id, offset, file_object, size):
+    """
+    Append a chunk to a resumable upload. Each chunk is uploaded to the
+    storage as a part of the multipart upload, and the upload is completed
+    once the last chunk is received. Until then, the upload url remains
+    available, such that an interrupted upload can be resumed.
+
+    Args:
+        public_video_id (str)
+        offset (int): position of the chunk in the file, which must be equal
+        to the number of bytes that were already received.
+        file_object (file): file-like object from which the chunk is read
+        size (int): chunk size, in bytes
+
+    Returns:
+        offset (int): number of bytes received so far
+
+    Raises:
+        LockUnavailable in case of concurrent upload to the same url
+        UploadChunkConflict in case of offset mismatch
+        UploadChunkInvalid in case of invalid chunk size
+    """
+    with Lock("TASK_LOCK_RESUMABLE_UPLOAD:" + public_video_id, 3600) as lock:
+        if not lock.is_acquired:
+            raise exceptions.LockUnavailable()
+
+        video_upload_url = models.VideoUploadUrl.objects.available().get(
+            public_video_id=public_video_id
+        )
+        if video_upload_url.storage_upload is None:
+            raise exceptions.UploadChunkInvalid("Upload was not started")
+        if offset != video_upload_url.upload_offset:
+            raise exceptions.UploadChunkConflict(
+                "Invalid offset: expected {}".format(video_upload_url.upload_offset)
+            )
+        end = offset + size
+        if end > video_upload_url.file_size:
+            raise exceptions.UploadChunkInvalid("Chunk exceeds the file size")
+        if (
+            end < video_upload_url.file_size
+            and size < settings.RESUMABLE_UPLOAD_MIN_CHUNK_SIZE
+        ):
+            raise exceptions.UploadChunkInvalid(
+                "Chunks must be at least {} bytes large".format(
+                    settings.RESUMABLE_UPLOAD_MIN_CHUNK_SIZE
+                )
+            )
+
+        if size > 0:
+            backend.get().upload_part(
+                video_upload_url.storage_upload,
+                video_upload_url.upload_parts + 1,
+                file_object,
+                size,
+            )
+            models.VideoUploadUrl.objects.filter(id=video_upload_url.id).update(
+                upload_offset=end, upload_parts=F("upload_parts") + 1
+            )
+
+        if end == video_upload_url.file_size:
+            complete_upload(public_video_id)
+
+    return end
+
+
+def _create_uploaded_video(video_upload_url, title):
+    """
+    Create the video object of an uploaded file and start transcoding.
+    """
     video = models.Video.objects.create(
         public_id=video_upload_url.public_video_id,
         owner=video_upload_url.owner,
-        title=file_object.name,
+        title=title,
     )
     if video_upload_url.playlist:
         video.playlists.add(video_upload_url.playlist)
 
     # Start transcoding
-    send_task("transcode_video", args=(public_video_id,))
+    send_task("transcode_video", args=(video_upload_url.public_video_id,))
 
 
 @shared_task(name="transcode_video_restart")
@@ -132,24 +341,273 @@ def transcode_video_restart():
 @shared_task(name="transcode_video")
 def transcode_video(public_video_id, delete=True):
     """
+    Create the transcoding jobs of a video. The progress of these jobs is then
+    monitored by the `poll_transcode_jobs` task or, when
+    TRANSCODING_MONITORING = "notifications", by the `check_transcoding_job`
+    task.
+
     Args:
         public_video_id (str)
         delete (bool): delete video on failure
     """
+    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id, 3600) as lock:
+        if not lock.is_acquired:
+            return
+        with monitor_transcoding(public_video_id):
+            _transcode_video(public_video_id, delete=delete)
+
+    if settings.TRANSCODING_MONITORING == "polling":
+        _start_poll_chain(public_video_id, countdown=settings.TRANSCODING_POLL_INTERVAL)
+
+
+def _poll_chain_key(public_video_id):
+    return "POLL_TRANSCODE_JOBS_CHAIN:" + public_video_id
+
+
+def _start_poll_chain(public_video_id, countdown=None):
+    """
+    Start a new chain of `poll_transcode_jobs` tasks. Polls are single-flight:
+    the identifier of the latest chain of each video is stored in the cache,
+    and the tasks of previous chains stop as soon as they are executed.
+    """
+    chain = uuid4().hex
+    cache.set(_poll_chain_key(public_video_id), chain, None)
+    send_task(
+        "poll_transcode_jobs",
+        args=(public_video_id,),
+        kwargs={"chain": chain},
+        countdown=countdown,
+    )
+
+
+def _stop_poll_chain(public_video_id, chain):
+    if chain is not None and cache.get(_poll_chain_key(public_video_id)) == chain:
+        cache.delete(_poll_chain_key(public_video_id))
+
+
+@shared_task(name="poll_transcode_jobs", acks_late=True)
+def poll_transcode_jobs(public_video_id, attempt=0, chain=None):
+    """
+    Check the progress of the transcoding jobs of a video. Since job state is
+    stored in the database, this task is short-lived: when
+    TRANSCODING_MONITORING = "polling", it re-enqueues itself with an
+    exponentially increasing delay until all jobs are finished. Eager tasks
+    ignore countdowns, so that eager polls instead sleep in a loop.
+
+    Args:
+        public_video_id (str)
+        attempt (int): number of previous polls
+        chain (str): identifier of the chain of polls, as returned by
+        `_start_poll_chain`. Polls from chains that were superseded by a more
+        recent chain are skipped.
+    """
+    while _poll_transcode_jobs(public_video_id, chain):
+        if settings.TRANSCODING_MONITORING != "polling":
+            return
+        countdown = min(
+            settings.TRANSCODING_POLL_INTERVAL * 2 ** (attempt + 1),
+            settings.TRANSCODING_POLL_MAX_INTERVAL,
+        )
+        attempt += 1
+        if not settings.CELERY_TASK_ALWAYS_EAGER:
+            send_task(
+                "poll_transcode_jobs",
+                args=(public_video_id,),
+                kwargs={"attempt": attempt, "chain": chain},
+                countdown=countdown,
+            )
+            return
+        sleep(countdown)
+
+
+def _poll_transcode_jobs(public_video_id, chain):
+    """
+    Check the transcoding jobs of a video once, and finish transcoding if all
+    jobs are finished.
+
+    Returns:
+        unfinished (bool): True if the jobs should be polled again.
+    """
+    if chain is not None and cache.get(_poll_chain_key(public_video_id)) not in [
+        None,
+        chain,
+    ]:
+        return False
+
+    status = (
+        models.ProcessingState.objects.filter(video__public_id=public_video_id)
+        .values_list("status", flat=True)
+        .first()
+    )
+    if status is None:
+        # If the video was deleted while the file was transcoding, wipe all data
+        _stop_poll_chain(public_video_id, chain)
+        delete_video(public_video_id)
+        return False
+    if status not in [
+        models.ProcessingState.STATUS_PENDING,
+        models.ProcessingState.STATUS_PROCESSING,
+    ]:
+        # Transcoding is already complete
+        _stop_poll_chain(public_video_id, chain)
+        return False
+
+    finished = False
     with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id, 3600) as lock:
         if lock.is_acquired:
-            try:
-                models.invalidate_cache(public_video_id)
-                _transcode_video(public_video_id, delete=delete)
-            except Exception as error:
-                # Store error message
-                message = "\n".join([str(arg) for arg in error.args])
-                models.ProcessingState.objects.filter(
-                    video__public_id=public_video_id
-                ).update(status=models.ProcessingState.STATUS_FAILED, message=message)
-                raise
-            finally:
-                models.invalidate_cache(public_video_id)
+            with monitor_transcoding(public_video_id, invalidate=False):
+                finished = _check_transcoding_jobs(public_video_id)
+                if finished:
+                    _finish_transcoding(public_video_id)
+
+    if finished:
+        _stop_poll_chain(public_video_id, chain)
+    return not finished
+
+
+@shared_task(name="resume_transcode_jobs")
+def resume_transcode_jobs():
+    """
+    Restart polling for videos with transcoding jobs that have not been checked
+    for a long time, e.g: because a worker was killed. The new chain of polls
+    supersedes the previous one, if any, such that chains do not pile up.
+    """
+    if settings.TRANSCODING_MONITORING != "polling":
+        return
+    with Lock("TASK_LOCK_RESUME_TRANSCODE_JOBS", 60) as lock:
+        if lock.is_acquired:
+            checked_before = now() - timedelta(
+                seconds=3 * settings.TRANSCODING_POLL_MAX_INTERVAL
+            )
+            public_video_ids = (
+                models.TranscodingJob.objects.filter(
+                    status=models.TranscodingJob.STATUS_PENDING,
+                    checked_at__lt=checked_before,
+                )
+                .values_list("video__public_id", flat=True)
+                .distinct()
+            )
+            for public_video_id in public_video_ids:
+                _start_poll_chain(public_video_id)
+
+
+@shared_task(name="poll_all_transcode_jobs")
+def poll_all_transcode_jobs():
+    """
+    Periodically check the progress of all unfinished transcoding jobs, when
+    TRANSCODING_MONITORING = "periodic". Each job is checked once per call, with
+    at most TRANSCODING_POLL_CONCURRENCY concurrent calls to the backend, and
+    no more than TRANSCODING_POLL_RATE_LIMIT calls per second.
+
+    The task lock has a short expiry duration, and it is extended whenever a
+    job is checked: if the worker is killed, polling resumes shortly.
+    """
+    if settings.TRANSCODING_MONITORING != "periodic":
+        return
+    with Lock("TASK_LOCK_POLL_ALL_TRANSCODE_JOBS", 60) as lock:
+        if lock.is_acquired:
+            _poll_all_transcode_jobs(lock)
+
+
+def _poll_all_transcode_jobs(lock):
+    transcoding_jobs = list(
+        models.TranscodingJob.objects.filter(
+            video__processing_state__status__in=[
+                models.ProcessingState.STATUS_PENDING,
+                models.ProcessingState.STATUS_PROCESSING,
+            ]
+        ).select_related("video__processing_state")
+    )
+    pending_jobs = [job for job in transcoding_jobs if not job.is_finished]
+    if not pending_jobs:
+        return
+
+    rate_limiter = utils.RateLimiter(settings.TRANSCODING_POLL_RATE_LIMIT)
+
+    lost_lock = threading.Event()
+
+    def check(transcoding_job):
+        if lost_lock.is_set():
+            return
+        rate_limiter.wait()
+        try:
+            _check_transcoding_job(transcoding_job)
+        except Exception:  # pylint: disable=broad-except
+            # E.g: throttling errors. The job will be checked again at the
+            # next call.
+            logger.exception(
+                "Could not check progress of transcoding job %s", transcoding_job.job_id
+            )
+
+    with ThreadPoolExecutor(
+        max_workers=settings.TRANSCODING_POLL_CONCURRENCY
+    ) as executor:
+        # The lock is extended from the current thread, after each check
+        for _ in executor.map(check, pending_jobs):
+            if not lock.extend():
+                # Jobs are now checked by another call
+                lost_lock.set()
+    if lost_lock.is_set():
+        return
+
+    models.TranscodingJob.objects.bulk_update(
+        pending_jobs, ["progress", "status", "message", "info", "checked_at"]
+    )
+
+    # Group jobs by video
+    jobs_by_video = {}
+    for transcoding_job in transcoding_jobs:
+        jobs_by_video.setdefault(transcoding_job.video, []).append(transcoding_job)
+
+    processing_states = []
+    # Progress updates are merged in api results: the video cache only needs to
+    # be invalidated when the status changes.
+    status_changed = set()
+    for video, video_jobs in jobs_by_video.items():
+        processing_state = video.processing_state
+        processing_state.progress = _get_transcoding_progress(video_jobs)
+        if processing_state.status != models.ProcessingState.STATUS_PROCESSING:
+            status_changed.add(video)
+        processing_state.status = models.ProcessingState.STATUS_PROCESSING
+        processing_states.append(processing_state)
+    models.ProcessingState.objects.bulk_update(
+        processing_states, ["progress", "status"]
+    )
+
+    for video, video_jobs in jobs_by_video.items():
+        models.cache_progress(video.public_id, video.processing_state.progress)
+        if video in status_changed:
+            models.invalidate_cache(video.public_id, video.owner_id)
+        if all(job.is_finished for job in video_jobs):
+            send_task("poll_transcode_jobs", args=(video.public_id,))
+
+
+@contextmanager
+def monitor_transcoding(public_video_id, invalidate=True):
+    """
+    Context manager that wraps all operations which modify the transcoding
+    state of a video: the video cache is invalidated before and after the
+    operation, and unexpected errors are stored in the processing state.
+
+    When `invalidate` is False, the cache is only invalidated in case of error:
+    the operation is then responsible for invalidating the cache when the video
+    is modified.
+    """
+    try:
+        if invalidate:
+            models.invalidate_cache(public_video_id)
+        yield
+    except Exception as error:
+        # Store error message
+        message = "\n".join([str(arg) for arg in error.args])
+        models.ProcessingState.objects.filter(video__public_id=public_video_id).update(
+            status=models.ProcessingState.STATUS_FAILED, message=message
+        )
+        invalidate = True
+        raise
+    finally:
+        if invalidate:
+            models.invalidate_cache(public_video_id)
 
 
 def _transcode_video(public_video_id, delete=True):
@@ -157,50 +615,124 @@ def _transcode_video(public_video_id, delete=True):
     This function is not thread-safe. It should only be called by the
     transcode_video task.
 
-    It will create the job in the backend and then poll every second to know
-    the current status of each job. When all jobs are done then the thumbnail
-    is created and the function returns.
+    Create transcoding jobs in the backend and store them in the database.
     """
-
     video = models.Video.objects.get(public_id=public_video_id)
-    processing_state = models.ProcessingState.objects.filter(
-        video__public_id=public_video_id
-    )
-    processing_state.update(
-        progress=0, status=models.ProcessingState.STATUS_PENDING, started_at=now()
+    models.ProcessingState.objects.filter(video=video).update(
+        progress=0,
+        status=models.ProcessingState.STATUS_PENDING,
+        started_at=now(),
+        delete_on_failure=delete,
     )
+    models.TranscodingJob.objects.filter(video=video).delete()
 
     jobs = backend.get().start_transcoding(public_video_id, video.storage_path)
 
-    done_job_indices = set()
-    all_job_indices = set(range(len(jobs)))
-    jobs_progress = [0.0 for _ in range(len(jobs))]
-    errors = []
+    models.TranscodingJob.objects.bulk_create(
+        [
+            models.TranscodingJob(
+                video=video,
+                job_id=str(backend.get().get_job_id(job)),
+                content=json.dumps(job),
+            )
+            for job in jobs
+        ]
+    )
 
-    while all_job_indices - done_job_indices:
-        for job_index, job in enumerate(jobs):
-            if job_index in done_job_indices:
-                continue
 
-            try:
-                jobs_progress[job_index], finished = backend.get().check_progress(job)
+def _check_transcoding_jobs(public_video_id, job_ids=None):
+    """
+    Check the progress of the unfinished transcoding jobs of a video and update
+    its processing state accordingly.
 
-                if finished:
-                    done_job_indices.add(job_index)
-            except exceptions.TranscodingFailed as error:
-                done_job_indices.add(job_index)
-                error_message = error.args[0] if error.args else ""
-                errors.append(error_message)
-
-        # Note that we do not delete original assets once transcoding has
-        # ended. This is because we want to keep the possibility of restarting
-        # the transcoding process.
-        processing_state.update(
-            progress=float(sum(jobs_progress)) / float(len(jobs)),
-            status=models.ProcessingState.STATUS_PROCESSING,
+    Args:
+        public_video_id (str)
+        job_ids (list of str): if defined, only the jobs with these
+        identifiers will be checked.
+
+    Returns:
+        finished (bool): True if all jobs are finished
+    """
+    transcoding_jobs = list(
+        models.TranscodingJob.objects.filter(video__public_id=public_video_id)
+    )
+
+    for transcoding_job in transcoding_jobs:
+        if transcoding_job.is_finished:
+            continue
+        if job_ids is not None and transcoding_job.job_id not in job_ids:
+            continue
+
+        _check_transcoding_job(transcoding_job)
+        transcoding_job.save()
+
+    # Note that we do not delete original assets once transcoding has
+    # ended. This is because we want to keep the possibility of restarting
+    # the transcoding process.
+    if transcoding_jobs:
+        progress = _get_transcoding_progress(transcoding_jobs)
+        processing_state = models.ProcessingState.objects.filter(
+            video__public_id=public_video_id
+        )
+        processing_state.update(progress=progress)
+        models.cache_progress(public_video_id, progress)
+        # Progress updates are merged in api results: the video cache only
+        # needs to be invalidated when the status changes.
+        if processing_state.exclude(
+            status=models.ProcessingState.STATUS_PROCESSING
+        ).update(status=models.ProcessingState.STATUS_PROCESSING):
+            models.invalidate_cache(public_video_id)
+
+    return all(job.is_finished for job in transcoding_jobs)
+
+
+def _check_transcoding_job(transcoding_job):
+    """
+    Update the progress and status of a transcoding job from the backend. Note
+    that the job object is not saved.
+    """
+    try:
+        job_progress = backend.JobProgress(
+            *backend.get().check_progress(transcoding_job.job)
+        )
+        transcoding_job.progress = job_progress.progress
+        if job_progress.finished:
+            transcoding_job.status = models.TranscodingJob.STATUS_SUCCESS
+            transcoding_job.job_info = job_progress.info
+    except exceptions.TranscodingFailed as error:
+        transcoding_job.status = models.TranscodingJob.STATUS_FAILED
+        transcoding_job.message = error.args[0] if error.args else ""
+    transcoding_job.checked_at = now()
+
+
+def _get_transcoding_progress(transcoding_jobs):
+    """
+    Average progress of a list of transcoding jobs.
+    """
+    return float(sum(job.progress for job in transcoding_jobs)) / len(transcoding_jobs)
+
+
+def _finish_transcoding(public_video_id):
+    """
+    Create the thumbnail and video formats once all transcoding jobs are
+    finished, and set the final processing status.
+    """
+    # If the video was deleted while the file was transcoding, wipe all data
+    try:
+        video = models.Video.objects.select_related("processing_state").get(
+            public_id=public_video_id
         )
+    except models.Video.DoesNotExist:
+        delete_video(public_video_id)
+        return
 
-        sleep(1.0)
+    processing_state = models.ProcessingState.objects.filter(video=video)
+    transcoding_jobs = list(models.TranscodingJob.objects.filter(video=video))
+    errors = [
+        job.message
+        for job in transcoding_jobs
+        if job.status == models.TranscodingJob.STATUS_FAILED
+    ]
 
     # Create thumbnail
     if not errors:
@@ -217,32 +749,81 @@ def _transcode_video(public_video_id, delete=True):
     processing_state.update(message="\n".join(errors))
     if errors:
         processing_state.update(status=models.ProcessingState.STATUS_FAILED)
-        if delete:
+        if video.processing_state.delete_on_failure:
             # In case of errors, wipe all data
             delete_video(public_video_id)
     else:
-        info = (backend.get().get_job_info(job) for job in jobs)
-        formats = backend.get().iter_formats(public_video_id)
+        info = (
+            job.job_info or backend.get().get_job_info(job.job)
+            for job in transcoding_jobs
+        )
+        formats = backend.get().iter_formats(
+            public_video_id, jobs=[job.job for job in transcoding_jobs]
+        )
 
         # Create video formats first so that they are available as soon as the
-        # video object becomes available from the API
-        for (format_name, bitrate), job_info in zip(formats, info):
-            models.VideoFormat.objects.create(
-                video=video,
-                name=format_name,
-                bitrate=bitrate,
-                width=job_info.width,
-                height=job_info.height,
-                duration_millis=job_info.duration_millis,
-                file_size=job_info.file_size,
-                frame_rate=job_info.frame_rate,
+        # video object becomes available from the API. Formats are created in
+        # bulk, without triggering the post_save receivers: the video snapshot
+        # is rebuilt once, when the cache is invalidated.
+        video_formats = []
+        for video_format, job_info in zip(formats, info):
+            video_format = backend.Format(*video_format)
+            video_formats.append(
+                models.VideoFormat(
+                    video=video,
+                    name=video_format.name,
+                    bitrate=video_format.bitrate,
+                    kind=video_format.kind,
+                    width=job_info.width,
+                    height=job_info.height,
+                    duration_millis=job_info.duration_millis,
+                    file_size=job_info.file_size,
+                    frame_rate=job_info.frame_rate,
+                )
             )
+        models.VideoFormat.objects.bulk_create(video_formats)
 
         processing_state.update(status=models.ProcessingState.STATUS_SUCCESS)
 
-    # If the video was deleted while the file was transcoding, wipe all data
-    if not models.Video.objects.filter(public_id=public_video_id).exists():
-        delete_video(public_video_id)
+    models.TranscodingJob.objects.filter(video=video).delete()
+    models.invalidate_cache(public_video_id, video.owner_id)
+
+
+@shared_task(
+    bind=True, name="check_transcoding_job", default_retry_delay=5, max_retries=None
+)
+def check_transcoding_job(self, job_id):
+    """
+    Check the progress of a transcoding job after its state was reported to
+    have changed by a backend notification. Transcoding is completed once all
+    jobs of the video are finished.
+
+    Args:
+        job_id (str): job identifier, as returned by the backend `get_job_id`
+    """
+    transcoding_job = (
+        models.TranscodingJob.objects.filter(job_id=job_id)
+        .select_related("video")
+        .first()
+    )
+    if transcoding_job is None:
+        # Unknown job, or transcoding is already complete. If the video was
+        # deleted during transcoding, the job outputs must be deleted.
+        for deletion_id in models.StorageDeletion.objects.filter(
+            job_id=job_id
+        ).values_list("id", flat=True):
+            send_task("delete_storage_assets", args=(deletion_id,))
+        return
+
+    public_video_id = transcoding_job.video.public_id
+    with Lock("TASK_LOCK_TRANSCODE_VIDEO:" + public_video_id, 3600) as lock:
+        if not lock.is_acquired:
+            # Jobs are still being created, or another notification is being
+            # processed: try again later
+            raise self.retry()
+        with monitor_transcoding(public_video_id, invalidate=False):
+            if _check_transcoding_jobs(public_video_id, job_ids=[job_id]):
+                _finish_transcoding(public_video_id)
 
 
 def upload_subtitle(public_video_id, subtitle_public_id, language_code, content):
@@ -302,18 +883,113 @@ def upload_thumbnail(public_video_id, file_object):
 
 
 def delete_video(public_video_id):
-    """ Delete all video assets """
-    backend.get().delete_video(public_video_id)
+    """
+    Schedule the deletion of all video assets. Assets are deleted by the
+    `delete_storage_assets` task, once the current transaction is committed.
+    """
+    deletion = models.StorageDeletion.objects.create(public_video_id=public_video_id)
+    _send_storage_deletion_task(deletion.id)
 
 
 def delete_subtitle(public_video_id, public_subtitle_id):
-    """ Delete subtitle associated to video"""
-    backend.get().delete_subtitle(public_video_id, public_subtitle_id)
+    """
+    Schedule the deletion of a subtitle associated to video.
+    """
+    deletion = models.StorageDeletion.objects.create(
+        public_video_id=public_video_id, public_subtitle_id=public_subtitle_id
+    )
+    _send_storage_deletion_task(deletion.id)
+
+
+def _send_storage_deletion_task(storage_deletion_id):
+    # The deletion must be committed before it is read by the task, and assets
+    # must not be deleted if the transaction is rolled back.
+    transaction.on_commit(
+        lambda: send_task("delete_storage_assets", args=(storage_deletion_id,))
+    )
+
+
+@shared_task(
+    bind=True, name="delete_storage_assets", default_retry_delay=10, max_retries=5
+)
+def delete_storage_assets(self, storage_deletion_id):
+    """
+    Delete video or subtitle assets from the storage. The deletion is retried
+    with an exponential backoff in case of failure. Deletions that still fail
+    after all retries are kept in the database and retried later by the
+    `sweep_storage_deletions` task.
+
+    The outputs of transcoding jobs are only deleted once the jobs are
+    finished: until then, the deletion is postponed to the next sweep.
+    """
+    deletion = models.StorageDeletion.objects.filter(id=storage_deletion_id).first()
+    if deletion is None:
+        # Already deleted
+        return
+
+    try:
+        if deletion.job is not None and not _is_job_finished(deletion.job):
+            models.StorageDeletion.objects.filter(id=storage_deletion_id).update(
+                attempted_at=now()
+            )
+            return
+        if deletion.public_subtitle_id:
+            backend.get().delete_subtitle(
+                deletion.public_video_id, deletion.public_subtitle_id
+            )
+        else:
+            backend.get().delete_video(deletion.public_video_id)
+    except Exception as error:
+        logger.exception("Failed to delete storage assets: %s", deletion)
+        models.StorageDeletion.objects.filter(id=storage_deletion_id).update(
+            attempted_at=now(), attempts=F("attempts") + 1, message=str(error)[:1024]
+        )
+        if self.request.is_eager:
+            # Eager retries would block the caller: the deletion will be
+            # retried by the sweep_storage_deletions task instead.
+            return
+        raise self.retry(
+            exc=error, countdown=self.default_retry_delay * 2 ** self.request.retries
+        )
+
+    models.StorageDeletion.objects.filter(id=storage_deletion_id).delete()
+
+
+def _is_job_finished(job):
+    try:
+        return backend.JobProgress(*backend.get().check_progress(job)).finished
+    except exceptions.TranscodingFailed:
+        return True
+
+
+@shared_task(name="sweep_storage_deletions")
+def sweep_storage_deletions():
+    """
+    Retry the storage deletions that were not performed, for instance because
+    all retries failed or because the deletion task was lost.
+    """
+    with Lock("TASK_LOCK_SWEEP_STORAGE_DELETIONS", 60) as lock:
+        if not lock.is_acquired:
+            return
+        deadline = now() - timedelta(seconds=settings.STORAGE_DELETION_SWEEP_DELAY)
+        deletions = models.StorageDeletion.objects.filter(
+            Q(attempted_at__lt=deadline)
+            | Q(attempted_at__isnull=True, created_at__lt=deadline)
+        )
+        for deletion_id in deletions.values_list("id", flat=True):
+            send_task("delete_storage_assets", args=(deletion_id,))
 
 
 @shared_task(name="clean_upload_urls")
 def clean_upload_urls():
     """
-    Remove video upload urls which cannot be used anymore.
+    Remove video upload urls which cannot be used anymore. Unfinished direct
+    uploads are aborted.
     """
-    models.VideoUploadUrl.objects.obsolete().delete()
+    obsolete = models.VideoUploadUrl.objects.obsolete()
+    for video_upload_url in obsolete.exclude(upload=""):
+        try:
+            backend.get().abort_upload(video_upload_url.storage_upload)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to abort upload: %s", video_upload_url)
+    obsolete.delete()
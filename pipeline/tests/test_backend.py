@@ -23,3 +23,20 @@ class PipelineBackendTests(TestCase):
 
         self.assertIsNotNone(dummy)
         self.assertEqual(42, dummy)
+
+    @override_settings(PLUGIN_BACKEND=object)
+    def test_backend_is_cached(self):
+        self.assertIs(backend.get(), backend.get())
+
+    @override_settings(PLUGIN_BACKEND=object)
+    def test_override_settings_resets_backend(self):
+        first = backend.get()
+        with override_settings(PLUGIN_BACKEND=lambda: 42):
+            self.assertEqual(42, backend.get())
+        self.assertIsNot(first, backend.get())
+
+    @override_settings(PLUGIN_BACKEND=object)
+    def test_reset(self):
+        first = backend.get()
+        backend.reset()
+        self.assertIsNot(first, backend.get())
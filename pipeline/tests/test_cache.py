@@ -0,0 +1,175 @@
+from time import time
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache as shared_cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from pipeline import cache
+from pipeline.tests import factories
+
+# Stand-in for a shared network cache, such as Redis
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "videofront_test_cache",
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VideoCacheTests(TestCase):
+    def setUp(self):
+        shared_cache.clear()
+        cache.local_cache.clear()
+
+    def test_get_missing(self):
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_set_get(self):
+        cache.set("videoid", {"id": "videoid"})
+        self.assertEqual({"id": "videoid"}, cache.get("videoid"))
+
+    def test_cache_hit_does_not_query_database(self):
+        cache.set("videoid", {"id": "videoid"})
+        with self.assertNumQueries(0):
+            self.assertEqual({"id": "videoid"}, cache.get("videoid"))
+
+    def test_get_from_shared_cache(self):
+        # Content cached by another process
+        cache.set("videoid", {"id": "videoid"})
+        cache.local_cache.clear()
+
+        self.assertEqual({"id": "videoid"}, cache.get("videoid"))
+        self.assertEqual(1, len(cache.local_cache))
+
+    def test_invalidate(self):
+        cache.set("videoid", {"id": "videoid"})
+        cache.invalidate("videoid")
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_invalidate_evicted_version(self):
+        version = cache.get_version("videoid")
+        cache.set("videoid", {"id": "videoid"}, version)
+        shared_cache.delete("VIDEO_VERSION:videoid")
+        cache.invalidate("videoid")
+
+        self.assertNotEqual(version, cache.get_version("videoid"))
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_set_invalidated_version(self):
+        # Video is modified while its content is computed
+        version = cache.get_version("videoid")
+        cache.invalidate("videoid")
+        cache.set("videoid", {"id": "videoid"}, version)
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_invalidate_on_video_save(self):
+        video = factories.VideoFactory(public_id="videoid")
+        cache.set("videoid", {"id": "videoid"})
+        video.title = "New title"
+        video.save()
+
+        self.assertIsNone(cache.get("videoid"))
+
+    def test_merge_progress(self):
+        cache.set_progress("videoid", 42)
+        video = {"id": "videoid", "processing": {"status": "processing", "progress": 0}}
+
+        videos = cache.merge_progress([video])
+
+        self.assertEqual(42, videos[0]["processing"]["progress"])
+        # Cached content is not modified
+        self.assertEqual(0, video["processing"]["progress"])
+
+    def test_merge_progress_of_processed_video(self):
+        cache.set_progress("videoid", 42)
+        video = {"id": "videoid", "processing": {"status": "success", "progress": 100}}
+
+        self.assertEqual([video], cache.merge_progress([video]))
+
+    def test_merge_missing_progress(self):
+        video = {"id": "videoid", "processing": {"status": "processing", "progress": 0}}
+
+        self.assertEqual([video], cache.merge_progress([video]))
+
+    def test_get_or_set(self):
+        compute = Mock(return_value={"id": "videoid"})
+
+        self.assertEqual({"id": "videoid"}, cache.get_or_set("videoid", compute))
+        self.assertEqual({"id": "videoid"}, cache.get_or_set("videoid", compute))
+        compute.assert_called_once_with()
+
+    def test_get_or_set_serves_stale_content_during_computation(self):
+        cache.get_or_set("videoid", lambda: {"title": "title1"})
+        cache.invalidate("videoid")
+        # Another process is computing the new content
+        key = cache._cache_key("videoid", cache.get_version("videoid"))
+        shared_cache.add(cache._lock_key(key), 1)
+        compute = Mock(return_value={"title": "title2"})
+
+        self.assertEqual({"title": "title1"}, cache.get_or_set("videoid", compute))
+        compute.assert_not_called()
+
+    @patch("pipeline.cache.VIDEO_CACHE_LOCK_WAIT", 0)
+    def test_get_or_set_without_stale_content_during_computation(self):
+        key = cache._cache_key("videoid", cache.get_version("videoid"))
+        shared_cache.add(cache._lock_key(key), 1)
+
+        self.assertEqual(
+            {"title": "title"}, cache.get_or_set("videoid", lambda: {"title": "title"})
+        )
+
+    def test_get_or_set_releases_lock_on_error(self):
+        compute = Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, cache.get_or_set, "videoid", compute)
+
+        key = cache._cache_key("videoid", cache.get_version("videoid"))
+        self.assertIsNone(shared_cache.get(cache._lock_key(key)))
+
+    def test_get_or_set_refreshes_expired_content(self):
+        cache.get_or_set("videoid", lambda: {"title": "title1"})
+        compute = Mock(return_value={"title": "title2"})
+
+        with patch("pipeline.cache.time", return_value=time() + 3600):
+            self.assertEqual({"title": "title2"}, cache.get_or_set("videoid", compute))
+        compute.assert_called_once_with()
+
+    def test_get_or_set_serves_expired_content_during_refresh(self):
+        cache.get_or_set("videoid", lambda: {"title": "title1"})
+        key = cache._cache_key("videoid", cache.get_version("videoid"))
+        shared_cache.add(cache._lock_key(key), 1)
+        compute = Mock(return_value={"title": "title2"})
+
+        with patch("pipeline.cache.time", return_value=time() + 3600):
+            self.assertEqual({"title": "title1"}, cache.get_or_set("videoid", compute))
+        compute.assert_not_called()
+
+    def test_early_refresh_probability(self):
+        entry = {"data": None, "delta": 1, "expires_at": time() + 1}
+
+        with patch("pipeline.cache.random.random", return_value=0):
+            self.assertFalse(cache._should_refresh(entry))
+        with patch("pipeline.cache.random.random", return_value=0.9):
+            self.assertTrue(cache._should_refresh(entry))
+
+
+class LocalCacheTests(TestCase):
+    def test_lru_eviction(self):
+        local_cache = cache.LocalCache(max_size=2)
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        local_cache.get("a")
+        local_cache.set("c", 3)
+
+        self.assertEqual(1, local_cache.get("a"))
+        self.assertIsNone(local_cache.get("b"))
+        self.assertEqual(3, local_cache.get("c"))
+
+    def test_disabled(self):
+        local_cache = cache.LocalCache(max_size=0)
+        local_cache.set("a", 1)
+
+        self.assertIsNone(local_cache.get("a"))
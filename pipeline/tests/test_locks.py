@@ -0,0 +1,144 @@
+import threading
+from time import sleep
+from unittest import skipUnless
+
+from django.core.cache import cache as shared_cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from pipeline import exceptions, locks, tasks
+from pipeline.tests.test_cache import LOCMEM_CACHES
+
+
+class LockBackendTestMixin(object):
+    def get_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.get_backend()
+        self.backend.release("dummylock")
+
+    def tearDown(self):
+        self.backend.release("dummylock")
+
+    def test_acquire_release_cycle(self):
+        self.assertTrue(self.backend.acquire("dummylock", "token1", 60))
+        self.assertFalse(self.backend.acquire("dummylock", "token2", 60))
+        self.assertTrue(self.backend.release("dummylock", "token1"))
+        self.assertTrue(self.backend.acquire("dummylock", "token2", 60))
+
+    def test_release_by_other_owner(self):
+        self.backend.acquire("dummylock", "token1", 60)
+
+        self.assertFalse(self.backend.release("dummylock", "token2"))
+        self.assertFalse(self.backend.acquire("dummylock", "token2", 60))
+
+    def test_release_for_all(self):
+        self.backend.acquire("dummylock", "token1", 60)
+
+        self.assertTrue(self.backend.release("dummylock"))
+        self.assertTrue(self.backend.acquire("dummylock", "token2", 60))
+
+    def test_extend(self):
+        self.backend.acquire("dummylock", "token1", 60)
+
+        self.assertTrue(self.backend.extend("dummylock", "token1", 60))
+        self.assertFalse(self.backend.extend("dummylock", "token2", 60))
+
+    def test_blocking_acquire(self):
+        self.backend.acquire("dummylock", "token1", 60)
+        acquired = []
+
+        def acquire():
+            acquired.append(
+                self.backend.acquire("dummylock", "token2", 60, blocking=True)
+            )
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        sleep(0.2)
+        self.assertEqual([], acquired)
+        self.backend.release("dummylock", "token1")
+        thread.join(5)
+
+        self.assertEqual([True], acquired)
+        self.assertFalse(self.backend.release("dummylock", "token1"))
+        self.assertTrue(self.backend.release("dummylock", "token2"))
+
+
+class MemoryLockBackendTests(LockBackendTestMixin, TestCase):
+    def get_backend(self):
+        return locks.MemoryLockBackend()
+
+    def test_expired_lock_is_not_released_by_former_owner(self):
+        self.backend.acquire("dummylock", "token1", 0)
+        self.assertTrue(self.backend.acquire("dummylock", "token2", 60))
+
+        self.assertFalse(self.backend.release("dummylock", "token1"))
+        self.assertFalse(self.backend.extend("dummylock", "token1", 60))
+        self.assertFalse(self.backend.acquire("dummylock", "token3", 60))
+
+    def test_blocking_acquire_of_expiring_lock(self):
+        self.backend.acquire("dummylock", "token1", 0.1)
+
+        self.assertTrue(self.backend.acquire("dummylock", "token2", 60, blocking=True))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheLockBackendTests(LockBackendTestMixin, TestCase):
+    def get_backend(self):
+        shared_cache.clear()
+        return locks.CacheLockBackend()
+
+
+@skipUnless(connection.vendor == "postgresql", "requires postgresql")
+class PostgresLockBackendTests(LockBackendTestMixin, TransactionTestCase):
+    def get_backend(self):
+        return locks.PostgresLockBackend()
+
+    def test_connection_is_reused(self):
+        self.backend.acquire("dummylock", "token1", 60)
+        connection = self.backend._get_connection()
+
+        # Locks are not re-entrant, although they are held by the same session
+        self.assertFalse(self.backend.acquire("dummylock", "token2", 60))
+        self.assertTrue(self.backend.release("dummylock", "token1"))
+        self.assertTrue(self.backend.acquire("dummylock", "token2", 60))
+        self.assertIs(connection, self.backend._get_connection())
+
+
+@override_settings(LOCK_BACKEND="pipeline.locks.MemoryLockBackend")
+class LockTests(TestCase):
+    def test_lock_is_released_by_owner_only(self):
+        with tasks.Lock("dummylock") as lock:
+            # Lock expired and was acquired by another process
+            tasks.release_lock("dummylock")
+            token = tasks.acquire_lock("dummylock")
+
+        self.assertRaises(exceptions.LockUnavailable, tasks.acquire_lock, "dummylock")
+        tasks.release_lock("dummylock", token)
+        self.assertFalse(lock.is_acquired)
+
+    def test_extend(self):
+        with tasks.Lock("dummylock", timeout=60) as lock:
+            self.assertTrue(lock.extend())
+            tasks.release_lock("dummylock")
+            self.assertFalse(lock.extend())
+
+        self.assertFalse(lock.extend())
+
+    def test_wait(self):
+        token = tasks.acquire_lock("dummylock")
+        threading.Timer(0.1, tasks.release_lock, ["dummylock", token]).start()
+
+        with tasks.Lock("dummylock", wait=True) as lock:
+            self.assertFalse(lock.is_acquired)
+
+        # Lock was not acquired by the waiting context manager
+        self.assertTrue(tasks.acquire_lock("dummylock"))
+
+    def test_override_settings_resets_backend(self):
+        self.assertIsInstance(locks.get(), locks.MemoryLockBackend)
+        with override_settings(LOCK_BACKEND="pipeline.locks.CacheLockBackend"):
+            self.assertIsInstance(locks.get(), locks.CacheLockBackend)
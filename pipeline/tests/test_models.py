@@ -1,9 +1,14 @@
+import json
+from io import StringIO
 from time import time
+from unittest.mock import Mock
 
+from django.core.management import call_command
 from django.test import TestCase
 
 from pipeline import models
 from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend
 
 
 class VideoUploadUrlTests(TestCase):
@@ -29,3 +34,43 @@ class VideoUploadUrlTests(TestCase):
         self.assertIn("almost_expired", available_video_ids)
         self.assertNotIn("used", available_video_ids)
         self.assertNotIn("expired", available_video_ids)
+
+
+class VideoSnapshotTests(TestCase):
+    def test_snapshot_created_with_video(self):
+        factories.VideoFactory(public_id="videoid", title="title")
+
+        snapshot = json.loads(models.Video.objects.get().snapshot)
+
+        self.assertEqual("videoid", snapshot["id"])
+        self.assertEqual("title", snapshot["title"])
+        self.assertEqual("pending", snapshot["processing"]["status"])
+
+    def test_snapshot_updated_with_related_objects(self):
+        video = factories.VideoFactory(public_id="videoid")
+        video.subtitles.create(language="fr", public_id="subid")
+
+        snapshot = json.loads(models.Video.objects.get().snapshot)
+
+        self.assertEqual(["subid"], [sub["id"] for sub in snapshot["subtitles"]])
+
+    @override_plugin_backend(thumbnail_url=Mock(side_effect=ValueError))
+    def test_snapshot_failure(self):
+        factories.VideoFactory(public_id="videoid", title="title")
+
+        self.assertEqual("", models.Video.objects.get().snapshot)
+
+    def test_rebuild_snapshots_command(self):
+        factories.VideoFactory(public_id="videoid1", title="title1")
+        factories.VideoFactory(public_id="videoid2", title="title2")
+        models.Video.objects.update(snapshot="")
+        stdout = StringIO()
+
+        call_command("rebuild-video-snapshots", "--batch-size=1", stdout=stdout)
+
+        snapshots = [
+            json.loads(snapshot)
+            for snapshot in models.Video.objects.values_list("snapshot", flat=True)
+        ]
+        self.assertEqual(["title1", "title2"], [s["title"] for s in snapshots])
+        self.assertIn("Rebuilt 2 video snapshots.", stdout.getvalue())
@@ -1,14 +1,19 @@
+import json
 import os
+from datetime import timedelta
 from time import time
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.test import TestCase, TransactionTestCase
 from django.test.utils import override_settings
+from django.utils.timezone import now
 
-from pipeline import exceptions, models, tasks
+from pipeline import backend, cache, exceptions, models, tasks
 from pipeline.tests import factories
+from pipeline.tests.utils import override_plugin_backend, run_on_commit_callbacks
 from videofront.celery_videofront import send_task
 
 
@@ -108,6 +113,7 @@ class TasksTests(TestCase):
             return_value=Mock(
                 start_transcoding=Mock(return_value=["job1"]),
                 check_progress=Mock(return_value=(42, True)),
+                get_job_info=Mock(return_value=backend.JobInfo()),
                 iter_formats=Mock(return_value=[("SD", 128)]),
                 create_thumbnail=Mock(),
             )
@@ -133,6 +139,50 @@ class TasksTests(TestCase):
         self.assertEqual("SD", video_format.name)
         self.assertEqual(128, video_format.bitrate)
 
+    def test_transcode_video_job_info_from_check_progress(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(
+                    return_value=backend.JobProgress(
+                        100, True, backend.JobInfo(width=320, frame_rate="25")
+                    )
+                ),
+                get_job_info=Mock(),
+                iter_formats=Mock(return_value=[("SD", 128)]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid")
+
+        mock_backend.return_value.get_job_info.assert_not_called()
+        video_format = models.VideoFormat.objects.get()
+        self.assertEqual(320, video_format.width)
+        self.assertEqual("25", video_format.frame_rate)
+
+    def test_transcode_video_with_streaming_format(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1", "job2"]),
+                check_progress=Mock(return_value=(100, True)),
+                get_job_info=Mock(return_value=backend.JobInfo()),
+                iter_formats=Mock(
+                    return_value=[("SD", 128), backend.Format("HLS", 2000, "hls")]
+                ),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid")
+
+        self.assertEqual(
+            [("SD", "file"), ("HLS", "hls")],
+            list(models.VideoFormat.objects.values_list("name", "kind")),
+        )
+
     def test_transcode_video_failure(self):
         factories.VideoFactory(public_id="videoid")
 
@@ -253,7 +303,9 @@ class TasksTests(TestCase):
         with override_settings(PLUGIN_BACKEND=mock_backend):
             tasks.transcode_video_restart()
 
-        mock_backend.return_value.start_transcoding.assert_called_once_with("videoid")
+        mock_backend.return_value.start_transcoding.assert_called_once_with(
+            "videoid", ""
+        )
         self.assertEqual(
             models.ProcessingState.STATUS_SUCCESS,
             models.ProcessingState.objects.get(video=video).status,
@@ -297,10 +349,42 @@ class TasksTests(TestCase):
         self.assertEqual(models.ProcessingState.STATUS_FAILED, processing_state.status)
         self.assertEqual("thumbnail creation: description", processing_state.message)
 
+    def test_finish_transcoding_rebuilds_snapshot_once(self):
+        video = factories.VideoFactory(public_id="videoid")
+        for job_id in ["job1", "job2", "job3"]:
+            models.TranscodingJob.objects.create(
+                video=video,
+                job_id=job_id,
+                content=json.dumps(job_id),
+                status=models.TranscodingJob.STATUS_SUCCESS,
+            )
+        mock_backend = Mock(
+            return_value=Mock(
+                get_job_info=Mock(return_value=backend.JobInfo()),
+                iter_formats=Mock(
+                    return_value=[("SD", 128), ("HD", 256), ("FHD", 512)]
+                ),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch(
+                "pipeline.models.update_snapshot", wraps=models.update_snapshot
+            ) as update_snapshot:
+                tasks._finish_transcoding("videoid")
+
+        update_snapshot.assert_called_once_with("videoid")
+        self.assertEqual(3, models.VideoFormat.objects.count())
+        snapshot = json.loads(models.Video.objects.get().snapshot)
+        self.assertEqual(
+            ["SD", "HD", "FHD"],
+            [video_format["name"] for video_format in snapshot["formats"]],
+        )
+
     def test_video_is_deleted_during_transcoding(self):
         factories.VideoFactory(public_id="videoid")
 
-        def start_transcoding(video_id):
+        def start_transcoding(video_id, video_path):
             models.Video.objects.filter(public_id="videoid").delete()
             return []
 
@@ -311,12 +395,403 @@ class TasksTests(TestCase):
         )
 
         with override_settings(PLUGIN_BACKEND=mock_backend):
-            tasks.transcode_video("videoid")
+            with run_on_commit_callbacks():
+                tasks.transcode_video("videoid")
 
         self.assertEqual(0, models.Video.objects.count())
         self.assertEqual(0, models.ProcessingState.objects.count())
         mock_backend.return_value.delete_video.assert_called_once()
 
+    @override_settings(
+        CELERY_TASK_ALWAYS_EAGER=True,
+        TRANSCODING_POLL_INTERVAL=1,
+        TRANSCODING_POLL_MAX_INTERVAL=10,
+    )
+    def test_poll_transcode_jobs_until_finished(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(side_effect=[(10, False)] * 300 + [(100, True)]),
+                get_job_info=Mock(return_value=backend.JobInfo()),
+                iter_formats=Mock(return_value=[("SD", 128)]),
+            )
+        )
+
+        # Eager polls ignore countdowns: they sleep instead of recursing
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch("pipeline.tasks.sleep") as mock_sleep:
+                tasks.transcode_video("videoid")
+
+        self.assertEqual(301, mock_backend.return_value.check_progress.call_count)
+        self.assertEqual(300, mock_sleep.call_count)
+        self.assertEqual(
+            [2, 4, 8, 10], [call[0][0] for call in mock_sleep.call_args_list[:4]]
+        )
+        self.assertEqual(
+            models.ProcessingState.STATUS_SUCCESS,
+            models.ProcessingState.objects.get().status,
+        )
+        self.assertEqual(1, models.VideoFormat.objects.count())
+
+    @override_settings(
+        CELERY_TASK_ALWAYS_EAGER=False,
+        TRANSCODING_POLL_INTERVAL=1,
+        TRANSCODING_POLL_MAX_INTERVAL=10,
+    )
+    def test_poll_transcode_jobs_backoff(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(return_value=(0, False)),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch("pipeline.tasks.send_task") as mock_send_task:
+                tasks.transcode_video("videoid")
+                chain = mock_send_task.call_args[1]["kwargs"]["chain"]
+                mock_send_task.assert_called_once_with(
+                    "poll_transcode_jobs",
+                    args=("videoid",),
+                    kwargs={"chain": chain},
+                    countdown=1,
+                )
+
+                mock_send_task.reset_mock()
+                tasks.poll_transcode_jobs("videoid", chain=chain)
+                mock_send_task.assert_called_once_with(
+                    "poll_transcode_jobs",
+                    args=("videoid",),
+                    kwargs={"attempt": 1, "chain": chain},
+                    countdown=2,
+                )
+
+                mock_send_task.reset_mock()
+                tasks.poll_transcode_jobs("videoid", attempt=5, chain=chain)
+                mock_send_task.assert_called_once_with(
+                    "poll_transcode_jobs",
+                    args=("videoid",),
+                    kwargs={"attempt": 6, "chain": chain},
+                    countdown=10,
+                )
+
+        self.assertEqual(
+            models.ProcessingState.STATUS_PROCESSING,
+            models.ProcessingState.objects.get().status,
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_poll_transcode_jobs_progress_does_not_invalidate_cache(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                check_progress=Mock(side_effect=[(10, False), (20, False)]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch("pipeline.tasks.send_task"):
+                tasks.transcode_video("videoid")
+                # Status changes to "processing"
+                tasks.poll_transcode_jobs("videoid")
+                version = cache.get_version("videoid")
+                tasks.poll_transcode_jobs("videoid")
+
+        self.assertEqual(version, cache.get_version("videoid"))
+        self.assertEqual(20, models.ProcessingState.objects.get().progress)
+        self.assertEqual(
+            [{"id": "videoid", "processing": {"status": "processing", "progress": 20}}],
+            cache.merge_progress(
+                [
+                    {
+                        "id": "videoid",
+                        "processing": {"status": "processing", "progress": 10},
+                    }
+                ]
+            ),
+        )
+
+    def test_poll_transcode_jobs_after_completion(self):
+        video = factories.VideoFactory(public_id="videoid")
+        models.ProcessingState.objects.filter(video=video).update(
+            status=models.ProcessingState.STATUS_SUCCESS
+        )
+        models.TranscodingJob.objects.create(video=video, job_id="job1", content="{}")
+        mock_backend = Mock(return_value=Mock(check_progress=Mock()))
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.poll_transcode_jobs("videoid")
+
+        mock_backend.return_value.check_progress.assert_not_called()
+
+    def test_resume_transcode_jobs(self):
+        video = factories.VideoFactory(public_id="videoid")
+        models.ProcessingState.objects.filter(video=video).update(
+            status=models.ProcessingState.STATUS_PROCESSING
+        )
+        models.TranscodingJob.objects.create(
+            video=video, job_id="job1", content='"job1"'
+        )
+        mock_backend = Mock(
+            return_value=Mock(
+                check_progress=Mock(return_value=(100, True)),
+                get_job_info=Mock(return_value=backend.JobInfo()),
+                iter_formats=Mock(return_value=[("SD", 128)]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            # Jobs were checked recently
+            tasks.resume_transcode_jobs()
+            mock_backend.return_value.check_progress.assert_not_called()
+
+            # Jobs were not checked for a long time
+            models.TranscodingJob.objects.update(checked_at=now() - timedelta(days=1))
+            tasks.resume_transcode_jobs()
+            mock_backend.return_value.check_progress.assert_called_once_with("job1")
+
+        self.assertEqual(
+            models.ProcessingState.STATUS_SUCCESS,
+            models.ProcessingState.objects.get().status,
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_resume_transcode_jobs_supersedes_previous_polls(self):
+        video = factories.VideoFactory(public_id="videoid")
+        models.ProcessingState.objects.filter(video=video).update(
+            status=models.ProcessingState.STATUS_PROCESSING
+        )
+        models.TranscodingJob.objects.create(
+            video=video, job_id="job1", content='"job1"'
+        )
+        models.TranscodingJob.objects.update(checked_at=now() - timedelta(days=1))
+        mock_backend = Mock(
+            return_value=Mock(check_progress=Mock(return_value=(10, False)))
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            with patch("pipeline.tasks.send_task") as send_task:
+                # Polls are resumed twice before the first poll is executed
+                tasks.resume_transcode_jobs()
+                tasks.resume_transcode_jobs()
+                chains = [
+                    call[1]["kwargs"]["chain"] for call in send_task.call_args_list
+                ]
+                self.assertEqual(2, len(set(chains)))
+
+                tasks.poll_transcode_jobs("videoid", chain=chains[0])
+                mock_backend.return_value.check_progress.assert_not_called()
+                tasks.poll_transcode_jobs("videoid", chain=chains[1])
+                mock_backend.return_value.check_progress.assert_called_once_with("job1")
+
+        # Only the latest chain is rescheduled
+        self.assertEqual(3, send_task.call_count)
+        self.assertEqual(chains[1], send_task.call_args[1]["kwargs"]["chain"])
+
+    @override_settings(
+        TRANSCODING_MONITORING="periodic", TRANSCODING_POLL_RATE_LIMIT=None
+    )
+    def test_poll_all_transcode_jobs(self):
+        factories.VideoFactory(public_id="videoid1")
+        factories.VideoFactory(public_id="videoid2")
+
+        def start_transcoding(video_id, video_path):
+            return [video_id + "-job1", video_id + "-job2"]
+
+        def check_progress(job):
+            if job == "videoid1-job1":
+                raise exceptions.TranscodingFailed("error message")
+            if job.startswith("videoid1"):
+                return 100, True
+            return 30, False
+
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=start_transcoding,
+                get_job_id=lambda job: job,
+                check_progress=Mock(side_effect=check_progress),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid1", delete=False)
+            tasks.transcode_video("videoid2")
+            mock_backend.return_value.check_progress.assert_not_called()
+
+            tasks.poll_all_transcode_jobs()
+
+        self.assertEqual(4, mock_backend.return_value.check_progress.call_count)
+        processing_state1 = models.ProcessingState.objects.get(
+            video__public_id="videoid1"
+        )
+        processing_state2 = models.ProcessingState.objects.get(
+            video__public_id="videoid2"
+        )
+        self.assertEqual(models.ProcessingState.STATUS_FAILED, processing_state1.status)
+        self.assertEqual("error message", processing_state1.message)
+        self.assertEqual(
+            models.ProcessingState.STATUS_PROCESSING, processing_state2.status
+        )
+        self.assertEqual(30, processing_state2.progress)
+        self.assertEqual(
+            2, models.TranscodingJob.objects.filter(video__public_id="videoid2").count()
+        )
+
+    @override_settings(
+        TRANSCODING_MONITORING="periodic",
+        TRANSCODING_POLL_RATE_LIMIT=None,
+        LOCK_BACKEND="pipeline.locks.MemoryLockBackend",
+    )
+    def test_poll_all_transcode_jobs_lock_is_lost(self):
+        factories.VideoFactory(public_id="videoid")
+
+        def check_progress(job):
+            # Lock expired and was acquired by another call
+            tasks.release_lock("TASK_LOCK_POLL_ALL_TRANSCODE_JOBS")
+            tasks.acquire_lock("TASK_LOCK_POLL_ALL_TRANSCODE_JOBS")
+            return 100, True
+
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1", "job2"]),
+                get_job_id=lambda job: job,
+                check_progress=Mock(side_effect=check_progress),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid")
+            tasks.poll_all_transcode_jobs()
+
+        # Job states are not overwritten
+        self.assertEqual(
+            [models.TranscodingJob.STATUS_PENDING] * 2,
+            list(models.TranscodingJob.objects.values_list("status", flat=True)),
+        )
+        self.assertEqual(
+            models.ProcessingState.STATUS_PENDING,
+            models.ProcessingState.objects.get().status,
+        )
+
+    def test_poll_all_transcode_jobs_with_polling(self):
+        video = factories.VideoFactory(public_id="videoid")
+        models.TranscodingJob.objects.create(video=video, job_id="job1", content="{}")
+        mock_backend = Mock(return_value=Mock(check_progress=Mock()))
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.poll_all_transcode_jobs()
+
+        mock_backend.return_value.check_progress.assert_not_called()
+
+    @override_settings(TRANSCODING_MONITORING="notifications")
+    def test_transcode_video_with_notifications(self):
+        factories.VideoFactory(public_id="videoid", public_thumbnail_id="thumbid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1", "job2"]),
+                get_job_id=lambda job: job,
+                check_progress=Mock(return_value=(100, True)),
+                get_job_info=Mock(return_value=backend.JobInfo()),
+                iter_formats=Mock(return_value=[("SD", 128), ("HD", 256)]),
+                create_thumbnail=Mock(),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid")
+
+            # Jobs were started, but not checked
+            mock_backend.return_value.check_progress.assert_not_called()
+            self.assertEqual(2, models.TranscodingJob.objects.count())
+            self.assertEqual(
+                models.ProcessingState.STATUS_PENDING,
+                models.ProcessingState.objects.get().status,
+            )
+
+            # First job is finished
+            tasks.check_transcoding_job("job1")
+            mock_backend.return_value.check_progress.assert_called_once_with("job1")
+            processing_state = models.ProcessingState.objects.get()
+            self.assertEqual(
+                models.ProcessingState.STATUS_PROCESSING, processing_state.status
+            )
+            self.assertEqual(50, processing_state.progress)
+            mock_backend.return_value.create_thumbnail.assert_not_called()
+
+            # Second job is finished
+            tasks.check_transcoding_job("job2")
+
+        processing_state = models.ProcessingState.objects.get()
+        self.assertEqual(models.ProcessingState.STATUS_SUCCESS, processing_state.status)
+        self.assertEqual(100, processing_state.progress)
+        mock_backend.return_value.create_thumbnail.assert_called_once_with(
+            "videoid", "thumbid"
+        )
+        self.assertEqual(2, models.VideoFormat.objects.count())
+        self.assertEqual(0, models.TranscodingJob.objects.count())
+
+    @override_settings(TRANSCODING_MONITORING="notifications")
+    def test_transcode_video_with_notifications_failure(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                get_job_id=lambda job: job,
+                check_progress=Mock(
+                    side_effect=exceptions.TranscodingFailed("error message")
+                ),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid", delete=False)
+            tasks.check_transcoding_job("job1")
+
+        processing_state = models.ProcessingState.objects.get()
+        self.assertEqual(models.ProcessingState.STATUS_FAILED, processing_state.status)
+        self.assertEqual("error message", processing_state.message)
+        mock_backend.return_value.delete_video.assert_not_called()
+
+    @override_settings(TRANSCODING_MONITORING="notifications")
+    def test_video_is_deleted_during_transcoding_with_notifications(self):
+        factories.VideoFactory(public_id="videoid")
+        mock_backend = Mock(
+            return_value=Mock(
+                start_transcoding=Mock(return_value=["job1"]),
+                get_job_id=lambda job: job,
+                check_progress=Mock(side_effect=[(50, False), (100, True)]),
+            )
+        )
+
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.transcode_video("videoid")
+            models.Video.objects.get(public_id="videoid").delete()
+            self.assertEqual(0, models.TranscodingJob.objects.count())
+
+            # Job is still running: outputs are not deleted yet
+            tasks.check_transcoding_job("job1")
+            mock_backend.return_value.delete_video.assert_not_called()
+            deletion = models.StorageDeletion.objects.get()
+            self.assertEqual("job1", deletion.job_id)
+            self.assertEqual("job1", deletion.job)
+            self.assertIsNotNone(deletion.attempted_at)
+
+            # Job is finished
+            tasks.check_transcoding_job("job1")
+
+        mock_backend.return_value.delete_video.assert_called_once_with("videoid")
+        self.assertEqual(0, models.StorageDeletion.objects.count())
+
+    def test_check_unknown_transcoding_job(self):
+        mock_backend = Mock(return_value=Mock(check_progress=Mock()))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.check_transcoding_job("unknownjob")
+
+        mock_backend.return_value.check_progress.assert_not_called()
+
 
 class SubtitleTasksTest(TestCase):
     def test_upload_subtitle(self):
@@ -365,6 +840,79 @@ Also I have utf8 characters: é û ë ï 你好.
             )
 
 
+class StorageDeletionTasksTests(TransactionTestCase):
+    def test_delete_video(self):
+        mock_backend = Mock(return_value=Mock(delete_video=Mock()))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.delete_video("videoid")
+
+        mock_backend.return_value.delete_video.assert_called_once_with("videoid")
+        self.assertEqual(0, models.StorageDeletion.objects.count())
+
+    def test_delete_video_is_rolled_back(self):
+        mock_backend = Mock(return_value=Mock(delete_video=Mock()))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            try:
+                with transaction.atomic():
+                    tasks.delete_video("videoid")
+                    raise ValueError
+            except ValueError:
+                pass
+
+        mock_backend.return_value.delete_video.assert_not_called()
+        self.assertEqual(0, models.StorageDeletion.objects.count())
+
+    def test_delete_subtitle(self):
+        mock_backend = Mock(return_value=Mock(delete_subtitle=Mock()))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.delete_subtitle("videoid", "subid")
+
+        mock_backend.return_value.delete_subtitle.assert_called_once_with(
+            "videoid", "subid"
+        )
+        self.assertEqual(0, models.StorageDeletion.objects.count())
+
+    def test_delete_video_failure(self):
+        mock_backend = Mock(
+            return_value=Mock(
+                delete_video=Mock(side_effect=exceptions.StorageDeletionFailed("err"))
+            )
+        )
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.delete_video("videoid")
+
+        mock_backend.return_value.delete_video.assert_called_once_with("videoid")
+        deletion = models.StorageDeletion.objects.get()
+        self.assertEqual("videoid", deletion.public_video_id)
+        self.assertEqual(1, deletion.attempts)
+        self.assertEqual("err", deletion.message)
+        self.assertIsNotNone(deletion.attempted_at)
+
+    def test_sweep_storage_deletions(self):
+        old_deletion = models.StorageDeletion.objects.create(
+            public_video_id="oldvideoid", attempted_at=now() - timedelta(days=1)
+        )
+        models.StorageDeletion.objects.filter(id=old_deletion.id).update(
+            created_at=now() - timedelta(days=2)
+        )
+        models.StorageDeletion.objects.create(
+            public_video_id="recentvideoid", attempted_at=now()
+        )
+        models.StorageDeletion.objects.create(public_video_id="newvideoid")
+
+        mock_backend = Mock(return_value=Mock(delete_video=Mock()))
+        with override_settings(PLUGIN_BACKEND=mock_backend):
+            tasks.sweep_storage_deletions()
+
+        mock_backend.return_value.delete_video.assert_called_once_with("oldvideoid")
+        self.assertEqual(
+            ["recentvideoid", "newvideoid"],
+            list(
+                models.StorageDeletion.objects.values_list("public_video_id", flat=True)
+            ),
+        )
+
+
 class UploadUrlsTasksTests(TestCase):
     def test_clean_upload_urls(self):
         factories.VideoUploadUrlFactory(
@@ -386,6 +934,20 @@ class UploadUrlsTasksTests(TestCase):
         self.assertIn("expired_used", upload_url_ids)
         self.assertEqual(2, len(upload_url_ids))
 
+    def test_clean_upload_urls_aborts_direct_uploads(self):
+        factories.VideoUploadUrlFactory(
+            public_video_id="expired",
+            expires_at=time() - 10000,
+            was_used=False,
+            upload='{"id": "uploadid"}',
+        )
+        abort_upload = Mock()
+        with override_plugin_backend(abort_upload=abort_upload):
+            send_task("clean_upload_urls")
+
+        abort_upload.assert_called_once_with({"id": "uploadid"})
+        self.assertEqual(0, models.VideoUploadUrl.objects.count())
+
 
 class UploadThumbnailTests(TestCase):
     def test_upload_thumbnail(self):
@@ -1,5 +1,6 @@
 import os
 from tempfile import NamedTemporaryFile
+from unittest.mock import patch
 
 from django.test import TestCase
 from PIL import Image
@@ -39,3 +40,23 @@ class UtilsTests(TestCase):
 
         resized_image = Image.open(out_img.name)
         self.assertEqual((576, 1024), resized_image.size)
+
+    @patch("pipeline.utils.sleep")
+    @patch("pipeline.utils.monotonic", return_value=10)
+    def test_rate_limiter(self, mock_monotonic, mock_sleep):
+        rate_limiter = utils.RateLimiter(4)
+
+        rate_limiter.wait()
+        mock_sleep.assert_not_called()
+        rate_limiter.wait()
+        mock_sleep.assert_called_once_with(0.25)
+        rate_limiter.wait()
+        mock_sleep.assert_called_with(0.5)
+
+    @patch("pipeline.utils.sleep")
+    def test_rate_limiter_disabled(self, mock_sleep):
+        rate_limiter = utils.RateLimiter(None)
+
+        rate_limiter.wait()
+        rate_limiter.wait()
+        mock_sleep.assert_not_called()
@@ -1,3 +1,6 @@
+import os
+from unittest.mock import patch
+
 from django.test.utils import override_settings
 
 import pipeline.backend
@@ -23,6 +26,38 @@ class TestPluginBackend(pipeline.backend.BaseBackend):
     pass
 
 
+# pylint: disable=abstract-method
+class LocalUploadBackend(TestPluginBackend):
+    """
+    Test plugin backend that stores multipart uploads in a local directory.
+    Each part is stored in a separate file, and parts are concatenated on
+    upload completion.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def create_upload(self, video_id, file_name):
+        return {"path": os.path.join(self.directory, video_id + "-" + file_name)}
+
+    def upload_part(self, upload, part_number, file_object, size):
+        with open("{}.{}".format(upload["path"], part_number), "wb") as part_file:
+            part_file.write(file_object.read(size))
+
+    def complete_upload(self, upload):
+        part_number = 1
+        with open(upload["path"], "wb") as uploaded_file:
+            while os.path.exists("{}.{}".format(upload["path"], part_number)):
+                part_path = "{}.{}".format(upload["path"], part_number)
+                with open(part_path, "rb") as part_file:
+                    uploaded_file.write(part_file.read())
+                os.remove(part_path)
+                part_number += 1
+
+    def abort_upload(self, upload):
+        pass
+
+
 def override_plugin_backend(**kwargs):
     """
     Override a selection of methods of the plugin backend, for test purposes.
@@ -30,3 +65,13 @@ def override_plugin_backend(**kwargs):
     Example: @override_plugin_backend(upload_video=lambda x: 42)
     """
     return override_settings(PLUGIN_BACKEND=TestPluginBackendFactory(**kwargs))
+
+
+def run_on_commit_callbacks():
+    """
+    Execute `transaction.on_commit` callbacks immediately. This is required in
+    TestCase tests, which run inside transactions that are never committed.
+    """
+    return patch(
+        "django.db.transaction.on_commit", side_effect=lambda func, using=None: func()
+    )
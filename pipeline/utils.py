@@ -1,7 +1,9 @@
 import os
 import random
 import string
+import threading
 from tempfile import NamedTemporaryFile
+from time import monotonic, sleep
 
 from django.conf import settings
 from PIL import Image
@@ -53,3 +55,28 @@ def resize_image(in_path, out_path, max_size):
         (round(in_img.size[0] * ratio), round(in_img.size[1] * ratio))
     )
     out_img.save(out_path)
+
+
+class RateLimiter(object):
+    """
+    Thread-safe rate limiter. Calls to `wait` block such that they do not
+    return more than `rate` times per second.
+    """
+
+    def __init__(self, rate):
+        """
+        Args:
+            rate (float): maximum number of calls per second. Set to None to
+            disable rate limiting.
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self._next_call = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            current_time = monotonic()
+            delay = self._next_call - current_time
+            self._next_call = max(current_time, self._next_call) + self.interval
+        if delay > 0:
+            sleep(delay)
@@ -1,7 +1,6 @@
 """
 A backend for AWS to add extra transcoding formats
 """
-from botocore.exceptions import ClientError
 from django.conf import settings
 
 from contrib.plugins.aws.backend import Backend as AwsBackend
@@ -33,13 +32,7 @@ class AwsExtraBackend(AwsBackend):
             jobs.append(job["Job"])
         return jobs
 
-    def iter_new_formats(self, public_video_id):
-        for resolution, _preset_id, bitrate in settings.ELASTIC_TRANSCODER_NEW_PRESETS:
-            try:
-                self.s3_client.head_object(
-                    Bucket=settings.S3_BUCKET,
-                    Key=self.get_video_key(public_video_id, resolution),
-                )
-            except ClientError:
-                continue
-            yield resolution, bitrate
+    def iter_new_formats(self, public_video_id, jobs=None):
+        return self.iter_preset_formats(
+            public_video_id, settings.ELASTIC_TRANSCODER_NEW_PRESETS, jobs=jobs
+        )
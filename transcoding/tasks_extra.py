@@ -11,6 +11,7 @@ but instead, we are adding an extra video format.
 from django.utils.timezone import now
 
 from pipeline import exceptions, models
+from pipeline.backend import JobProgress
 from pipeline.tasks import Lock
 from transcoding.backend_extra import AwsExtraBackend
 
@@ -48,7 +49,8 @@ def _apply_new_transcoding(public_video_id):
         progress=0, status=models.ProcessingState.STATUS_PENDING, started_at=now()
     )
 
-    jobs = AwsExtraBackend().apply_new_transcoding(public_video_id)
+    backend = AwsExtraBackend()
+    jobs = backend.apply_new_transcoding(public_video_id)
     success_job_indexes = []
     error_job_indexes = []
     errors = []
@@ -60,10 +62,9 @@ def _apply_new_transcoding(public_video_id):
                 and job_index not in error_job_indexes
             ):
                 try:
-                    jobs_progress[
-                        job_index
-                    ], finished = AwsExtraBackend().check_progress(job)
-                    if finished:
+                    job_progress = JobProgress(*backend.check_progress(job))
+                    jobs_progress[job_index] = job_progress.progress
+                    if job_progress.finished:
                         success_job_indexes.append(job_index)
                 except exceptions.TranscodingFailed as e:
                     error_job_indexes.append(job_index)
@@ -85,7 +86,7 @@ def _apply_new_transcoding(public_video_id):
     else:
         # Create video formats first so that they are available as soon as the
         # video object becomes available from the API
-        for format_name, bitrate in AwsExtraBackend().iter_new_formats(public_video_id):
+        for format_name, bitrate in backend.iter_new_formats(public_video_id, jobs):
             models.VideoFormat.objects.create(
                 video=video, name=format_name, bitrate=bitrate
             )
@@ -4,6 +4,7 @@ Configure Celery to discover tasks from the videofront code base
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
@@ -20,6 +21,19 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@worker_process_init.connect
+def reset_plugin_backend(**kwargs):
+    """
+    Connections from the parent process should not be shared with forked worker
+    processes.
+    """
+    import pipeline.backend
+    import pipeline.locks
+
+    pipeline.backend.reset()
+    pipeline.locks.reset()
+
+
 def send_task(name, args=None, kwargs=None, **opts):
     """
     Send a task by name. Contrary to app.send_task, this function respects the
@@ -32,4 +46,4 @@ def send_task(name, args=None, kwargs=None, **opts):
         ]  # Raises a NotRegistered exception for unregistered tasks
         return task.apply(args=args, kwargs=kwargs, **opts)
 
-    return app.send_task(name, args=args, kwargs=kwargs)
+    return app.send_task(name, args=args, kwargs=kwargs, **opts)
@@ -7,3 +7,13 @@ from .production import *  # noqa isort:skip
 
 DEBUG = True
 CELERY_ALWAYS_EAGER = True
+
+# Development does not require a Redis server
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "videofront_default_cache"),
+    }
+}
@@ -32,12 +32,34 @@ S3_BUCKET = os.environ.get("DJANGO_S3_BUCKET")
 # S3_BUCKET.
 S3_PRIVATE_BUCKET = os.environ.get("DJANGO_S3_PRIVATE_BUCKET")
 
+# Source video files are uploaded to S3 in parts of this size, in bytes, with
+# at most S3_UPLOAD_CONCURRENCY parts uploaded at the same time.
+S3_UPLOAD_PART_SIZE = 1024 * 1024 * 16  # 16 Mb
+S3_UPLOAD_CONCURRENCY = 8
+# Maximum number of attempts of each AWS request (e.g: upload of a file part)
+AWS_MAX_ATTEMPTS = 5
+
 # Eventually use a cloudfront distribution to stream and download objects
 _cf = os.getenv("DJANGO_CLOUDFRONT_DOMAIN_NAME")
 
 if _cf:
     CLOUDFRONT_DOMAIN_NAME = _cf
 
+# Playback urls served by the api are signed and time-limited when either:
+# - CLOUDFRONT_KEY_PAIR_ID and CLOUDFRONT_PRIVATE_KEY_FILE (path to the pem
+#   private key of a CloudFront key pair) are defined, along with
+#   CLOUDFRONT_DOMAIN_NAME (requires cryptography)
+# - or S3_SIGNED_URLS is True: urls are then presigned S3 urls
+# Signed urls are valid for SIGNED_URL_TIMEOUT to 2 * SIGNED_URL_TIMEOUT
+# seconds. They are cached in the memory of each process, with at most
+# SIGNED_URL_CACHE_SIZE urls per process. Signed urls cannot be combined with
+# ELASTIC_TRANSCODER_STREAMING_PRESETS.
+CLOUDFRONT_KEY_PAIR_ID = os.getenv("DJANGO_CLOUDFRONT_KEY_PAIR_ID")
+CLOUDFRONT_PRIVATE_KEY_FILE = os.getenv("DJANGO_CLOUDFRONT_PRIVATE_KEY_FILE")
+S3_SIGNED_URLS = os.getenv("DJANGO_S3_SIGNED_URLS") == "yes"
+SIGNED_URL_TIMEOUT = 3600
+SIGNED_URL_CACHE_SIZE = 10000
+
 # Presets are of the form: (name, ID, bitrate)
 ELASTIC_TRANSCODER_PRESETS = [
     ("LD", "1351620000001-000030", 900),  # System preset: Generic 480p 4:3
@@ -45,7 +67,88 @@ ELASTIC_TRANSCODER_PRESETS = [
     ("HD", "1351620000001-000001", 5400),  # System preset: Generic 1080p
 ]
 ELASTIC_TRANSCODER_THUMBNAILS_PRESET = "1351620000001-000001"
+# Adaptive streaming formats, which are transcoded in addition to the
+# progressive video files of ELASTIC_TRANSCODER_PRESETS. Each kind ("hls" or
+# "dash") is transcoded by a single job, which produces a segmented rendition
+# per preset, of the form (name, ID, bitrate), and a master playlist. Segments
+# are ELASTIC_TRANSCODER_SEGMENT_DURATION seconds long. For instance:
+# ELASTIC_TRANSCODER_STREAMING_PRESETS = {
+#     "hls": [
+#         ("400k", "1351620000001-200050", 400),  # System preset: HLS 400k
+#         ("1M", "1351620000001-200030", 1000),  # System preset: HLS 1M
+#         ("2M", "1351620000001-200010", 2000),  # System preset: HLS 2M
+#     ]
+# }
+ELASTIC_TRANSCODER_STREAMING_PRESETS = {}
+ELASTIC_TRANSCODER_SEGMENT_DURATION = "6"
+# Transcoded formats are derived from the transcoding jobs. Set this to True to
+# also check that the transcoded files exist, with a listing of the video folder.
+ELASTIC_TRANSCODER_VERIFY_OUTPUTS = False
 ELASTIC_TRANSCODER_PIPELINE_ID = os.environ.get("DJANGO_ELASTIC_TRANSCODER_PIPELINE_ID")
+# SNS topic to which the Elastic Transcoder pipeline sends job notifications.
+# Notifications from other topics are ignored, and subscription confirmation
+# requests are only confirmed when this setting is defined.
+ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN = os.environ.get(
+    "DJANGO_ELASTIC_TRANSCODER_NOTIFICATIONS_TOPIC_ARN"
+)
+
+# Local storage and ffmpeg transcoding (contrib.plugins.local.backend.Backend)
+
+# Transcoded files, subtitles and thumbnails are stored in LOCAL_STORAGE_ROOT,
+# which must be served at LOCAL_STORAGE_URL. Source files and transcoding
+# progress files are stored in LOCAL_PRIVATE_STORAGE_ROOT, which should not be
+# served. With multiple hosts, both folders must be on a shared filesystem, such
+# as NFS.
+LOCAL_STORAGE_ROOT = os.getenv(
+    "DJANGO_LOCAL_STORAGE_ROOT", os.path.join(BASE_DIR, "storage", "public")
+)
+LOCAL_STORAGE_URL = os.getenv("DJANGO_LOCAL_STORAGE_URL", "/storage")
+LOCAL_PRIVATE_STORAGE_ROOT = os.getenv(
+    "DJANGO_LOCAL_PRIVATE_STORAGE_ROOT", os.path.join(BASE_DIR, "storage", "private")
+)
+FFMPEG_BINARY = os.getenv("DJANGO_FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("DJANGO_FFPROBE_BINARY", "ffprobe")
+# Maximum duration of ffprobe calls and thumbnail extractions, in seconds
+FFPROBE_TIMEOUT = 60
+# Presets are of the form: (name, ffmpeg output options, bitrate)
+LOCAL_TRANSCODING_PRESETS = [
+    (
+        "LD",
+        ["-vf", "scale=-2:480", "-c:v", "libx264", "-b:v", "800k"]
+        + ["-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"],
+        900,
+    ),
+    (
+        "SD",
+        ["-vf", "scale=-2:720", "-c:v", "libx264", "-b:v", "2200k"]
+        + ["-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+        2400,
+    ),
+    (
+        "HD",
+        ["-vf", "scale=-2:1080", "-c:v", "libx264", "-b:v", "5000k"]
+        + ["-c:a", "aac", "-b:a", "160k", "-movflags", "+faststart"],
+        5400,
+    ),
+]
+# Maximum number of concurrent ffmpeg processes per worker process
+LOCAL_TRANSCODING_CONCURRENCY = int(
+    os.getenv("DJANGO_LOCAL_TRANSCODING_CONCURRENCY", "2")
+)
+# Transcoding jobs fail when ffmpeg does not report any progress for this
+# duration, in seconds, e.g: when their worker was killed. Queued jobs fail
+# when their worker is killed, queued chunks when no chunk of their video was
+# transcoded for this duration, and transcoded chunks when their concatenation
+# does not start within this duration.
+LOCAL_TRANSCODING_STALL_TIMEOUT = 600
+# Videos that are longer than twice LOCAL_TRANSCODING_CHUNK_DURATION seconds
+# are split into chunks of this duration, at most LOCAL_TRANSCODING_MAX_CHUNKS,
+# which are transcoded in parallel by celery workers. Set to 0 to transcode all
+# videos in one piece.
+LOCAL_TRANSCODING_CHUNK_DURATION = int(
+    os.getenv("DJANGO_LOCAL_TRANSCODING_CHUNK_DURATION", "0")
+)
+LOCAL_TRANSCODING_MAX_CHUNKS = 64
 
 # Application definition
 
@@ -66,6 +169,7 @@ INSTALLED_APPS = [
     # Local apps
     "api",
     "contrib.plugins.aws",  # This is only useful for storing videos on S3
+    "contrib.plugins.local",  # Celery tasks of chunked ffmpeg transcoding
     "pipeline",
 ]
 
@@ -106,12 +210,18 @@ WSGI_APPLICATION = "videofront.wsgi.application"
 DATABASES = {"default": dj_database_url.config("DJANGO_DATABASE_URL")}
 
 # Caching
-# https://docs.djangoproject.com/en/1.9/topics/cache/#database-caching
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+# The default cache must be shared by all processes: it stores the versions of
+# cached api results, which are checked on every hit of the per-process cache.
+# It is stored in Redis by default. It may also be stored in the database, at
+# the cost of a query per cache hit:
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+# DJANGO_CACHE_LOCATION=videofront_default_cache
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "videofront_default_cache",
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django_redis.cache.RedisCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "redis://127.0.0.1:6379/1"),
     }
 }
 
@@ -154,9 +264,9 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         # It is important to have BasicAuthentication as the first auth class
         # in order to prompt the user for a login/password from the GUI.
-        "rest_framework.authentication.BasicAuthentication",
+        "api.v1.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "api.v1.authentication.CachedTokenAuthentication",
     )
 }
 
@@ -213,6 +323,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "transcode_video_restart",
         "schedule": timedelta(seconds=5),
     },
+    "resume_transcode_jobs": {
+        "task": "resume_transcode_jobs",
+        "schedule": timedelta(minutes=5),
+    },
+    "poll_all_transcode_jobs": {
+        "task": "poll_all_transcode_jobs",
+        "schedule": timedelta(seconds=30),
+    },
+    "sweep_storage_deletions": {
+        "task": "sweep_storage_deletions",
+        "schedule": timedelta(minutes=15),
+    },
 }
 
 # Swagger documentation
@@ -240,8 +362,72 @@ if os.getenv("SENTRY_DSN"):
 # Maximum size of subtitle files
 SUBTITLES_MAX_BYTES = 1024 * 1024 * 5  # 5 Mb
 
+# Files uploaded directly to the storage are split in parts of this size, in
+# bytes. There can be at most 10000 parts per file.
+DIRECT_UPLOAD_PART_SIZE = 1024 * 1024 * 64  # 64 Mb
+
+# All chunks of resumable uploads, except the last one, must be at least this
+# large, in bytes. Each chunk is stored as a part of a storage-side multipart
+# upload.
+RESUMABLE_UPLOAD_MIN_CHUNK_SIZE = 1024 * 1024 * 5  # 5 Mb
+
+# Files sent to the upload endpoint are streamed to the storage backend in parts
+# of this size, in bytes, instead of being written to a local temporary file.
+# This is also the maximum amount of memory used to buffer each upload.
+STREAMING_UPLOAD_PART_SIZE = 1024 * 1024 * 8  # 8 Mb
+
+# Maximum number of video api results that are cached in the memory of each
+# process, in front of the shared cache. Set to 0 to disable local caching.
+VIDEO_CACHE_LOCAL_SIZE = 1000
+
+# Verified api credentials are cached for this duration, in seconds: basic
+# authentication credentials in the shared cache, and the users of at most
+# AUTHENTICATION_TOKEN_CACHE_SIZE tokens in the memory of each process. Deleted
+# tokens remain valid in other processes until their entry expires.
+AUTHENTICATION_CACHE_TIMEOUT = 60
+AUTHENTICATION_TOKEN_CACHE_SIZE = 1000
+
+# Backend of the locks that prevent concurrent execution of tasks:
+# - "pipeline.locks.CacheLockBackend": locks are stored in the default cache
+# - "pipeline.locks.PostgresLockBackend": Postgres advisory locks
+# - "pipeline.locks.RedisLockBackend": Redis locks, stored in the LOCK_REDIS_URL
+#   server (requires redis)
+# - "pipeline.locks.MemoryLockBackend": per-process locks, for tests only
+LOCK_BACKEND = os.getenv("DJANGO_LOCK_BACKEND", "pipeline.locks.CacheLockBackend")
+LOCK_REDIS_URL = os.getenv("DJANGO_LOCK_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Serializer of the video snapshots, which are served by the video api. Run
+# `./manage.py rebuild-video-snapshots` after modifying this setting, or the
+# settings that affect video urls.
+VIDEO_SNAPSHOT_SERIALIZER = "api.v1.serializers.VideoSerializer"
+
 # Override this setting to provide your own custom implementation of pipeline tasks.
-PLUGIN_BACKEND = "contrib.plugins.aws.backend.Backend"
+# Available backends:
+# - "contrib.plugins.aws.backend.Backend": S3 storage and Elastic Transcoder
+# - "contrib.plugins.local.backend.Backend": local storage and ffmpeg
+PLUGIN_BACKEND = os.getenv(
+    "DJANGO_PLUGIN_BACKEND", "contrib.plugins.aws.backend.Backend"
+)
+
+# How the progress of transcoding jobs is monitored:
+# - "polling": the poll_transcode_jobs task checks the progress of each job; it
+#   is re-enqueued with an exponential backoff, starting at
+#   TRANSCODING_POLL_INTERVAL and up to TRANSCODING_POLL_MAX_INTERVAL seconds
+# - "notifications": jobs are checked whenever the transcoding service posts a
+#   notification to /api/v1/transcodingnotifications/
+# - "periodic": the jobs of all videos are checked by a single periodic
+#   poll_all_transcode_jobs task, with at most TRANSCODING_POLL_CONCURRENCY
+#   concurrent requests and TRANSCODING_POLL_RATE_LIMIT requests per second
+TRANSCODING_MONITORING = os.getenv("DJANGO_TRANSCODING_MONITORING", "polling")
+TRANSCODING_POLL_INTERVAL = 5
+TRANSCODING_POLL_MAX_INTERVAL = 120
+TRANSCODING_POLL_CONCURRENCY = 4
+TRANSCODING_POLL_RATE_LIMIT = 4
+
+# Video and subtitle assets are deleted asynchronously from the storage. Failed
+# deletions are retried by the sweep_storage_deletions task when their last
+# attempt is older than this delay, in seconds.
+STORAGE_DELETION_SWEEP_DELAY = 3600
 
 # Maximum of width and height size for video thumbnails
 THUMBNAILS_SIZE = 1024